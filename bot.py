@@ -14,28 +14,38 @@ import os
 import sys
 import time
 import random
+import atexit
+import signal
 import argparse
+import threading
+import importlib.util
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 # Añadir src al path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from loguru import logger
 
+# Solo config se importa al arrancar: el resto de módulos (Playwright,
+# moviepy, OpenAI...) se cargan al crear el bot para que --check,
+# --config y --help arranquen rápido
 from config import load_config, print_config
-from twitter_monitor import TwitterMonitor
-from video_downloader import VideoDownloader, check_ytdlp_installed
+from rate_limiter import RateLimiter
 
-# Intentar importar el monitor con API oficial
-try:
-    from twitter_api import TwitterMonitorAPI
-    TWITTER_API_AVAILABLE = True
-except ImportError:
-    TWITTER_API_AVAILABLE = False
-from video_editor import VideoEditor, check_ffmpeg_installed
-from text_rewriter import TextRewriter
-from tiktok_uploader import TikTokUploader, PLAYWRIGHT_AVAILABLE
+if TYPE_CHECKING:
+    from video_downloader import VideoDownloadResult
+
+# Hilos para edición y reformulación en paralelo a descargas y publicación
+PIPELINE_WORKERS = 2
+
+# Cada cuánto se mantiene viva la sesión del navegador mientras se espera
+KEEPALIVE_INTERVAL = 5 * 60
+
+# Separación mínima entre publicaciones en TikTok (segundos)
+UPLOAD_INTERVAL = 5
 
 
 class SucesosBot:
@@ -43,55 +53,94 @@ class SucesosBot:
 
     def __init__(self, test_mode: bool = False):
         self.config = load_config()
+        self.config.bot.ensure_dirs()
         self.test_mode = test_mode
 
+        # Se activa para detener el bucle principal (SIGTERM, stop())
+        self._stop_event = threading.Event()
+
+        # Generador propio para los intervalos aleatorios (no comparte
+        # estado con el módulo random global)
+        self._rng = random.Random(os.urandom(8))
+
+        # Ritmo de publicación: se frena si TikTok limita y se recupera
+        # con las publicaciones correctas
+        self._limiter = RateLimiter(max_rate=1, time_period=UPLOAD_INTERVAL)
+
+        # IDs publicados pendientes de guardar en seen_tweets.log
+        self._pending_seen = set()
+        atexit.register(self._flush_seen)
+
         # Configurar logging
         self._setup_logging()
 
         # Inicializar componentes
         logger.info("Inicializando componentes...")
 
+        from twitter_monitor import TwitterMonitor
+        from video_downloader import VideoDownloader
+        from video_editor import VideoEditor
+        from text_rewriter import TextRewriter
+
+        # Intentar importar el monitor con API oficial
+        try:
+            from twitter_api import TwitterMonitorAPI
+            twitter_api_available = True
+        except ImportError:
+            twitter_api_available = False
+
         # Usar API oficial si está configurada, sino scraping
-        if self.config.twitter.has_api_credentials and TWITTER_API_AVAILABLE:
+        if self.config.twitter.has_api_credentials and twitter_api_available:
             logger.info("Usando API oficial de Twitter/X")
             self.monitor = TwitterMonitorAPI(
                 username=self.config.twitter.username,
                 bearer_token=self.config.twitter.bearer_token,
-                data_dir=str(self.config.bot.data_dir)
+                data_dir=self.config.bot.data_dir
             )
         else:
             logger.info("Usando scraping para Twitter/X (API no configurada)")
             self.monitor = TwitterMonitor(
                 username=self.config.twitter.username,
-                data_dir=str(self.config.bot.data_dir)
+                data_dir=self.config.bot.data_dir
             )
 
         self.downloader = VideoDownloader(
-            download_dir=str(self.config.bot.downloads_dir)
+            download_dir=self.config.bot.downloads_dir
         )
 
         self.editor = VideoEditor(
-            output_dir=str(self.config.bot.processed_dir),
+            output_dir=self.config.bot.processed_dir,
             min_duration=self.config.video.min_duration,
-            max_duration=self.config.video.max_duration
+            max_duration=self.config.video.max_duration,
+            hwaccel=self.config.video.hwaccel,
+            encoder=self.config.video.encoder
         )
 
         self.rewriter = TextRewriter(
-            openai_api_key=self.config.bot.openai_api_key
+            openai_api_key=self.config.bot.openai_api_key,
+            cache_file=self.config.bot.data_dir / "ai_cache.jsonl"
         )
 
         if not test_mode:
+            from tiktok_uploader import TikTokUploader
             self.uploader = TikTokUploader(
                 cookies_file=self.config.tiktok.cookies_file,
                 headless=True  # Sin ventana en producción
             )
+            # Abrir el navegador antes de que lleguen tweets
+            self.uploader.warmup()
         else:
             self.uploader = None
 
         logger.success("Bot inicializado correctamente")
 
     def _setup_logging(self):
-        """Configura el sistema de logging"""
+        """
+        Configura el sistema de logging
+
+        Los sinks usan enqueue=True: los mensajes se escriben desde un hilo
+        propio de loguru y el pipeline no se bloquea esperando al disco
+        """
         logger.remove()
 
         # Log a consola
@@ -99,7 +148,9 @@ class SucesosBot:
         logger.add(
             sys.stderr,
             level=log_level,
-            format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
+            format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+            enqueue=True,
+            backtrace=self.config.bot.debug
         )
 
         # Log a archivo
@@ -109,98 +160,153 @@ class SucesosBot:
             rotation="1 day",
             retention="7 days",
             level="DEBUG",
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}"
+            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
+            enqueue=True,
+            backtrace=self.config.bot.debug
         )
 
-    def process_tweet(self, tweet: dict) -> bool:
+    def _download_batch(self, tweets: list, download_futures: list):
+        """
+        Etapa 1 en lote: descarga todos los tweets con una sola sesión de
+        yt-dlp, resolviendo el future de cada tweet en cuanto termina
         """
-        Procesa un tweet: descarga, edita, reformula y publica
+        results = self.downloader.iter_download_batch(
+            [tweet.get('url') for tweet in tweets],
+            [f"tweet_{tweet.get('id')}" for tweet in tweets]
+        )
 
-        Args:
-            tweet: Diccionario con info del tweet
+        try:
+            for tweet, future in zip(tweets, download_futures):
+                logger.info(f"Procesando tweet: {tweet.get('id')}")
+                logger.debug("URL: {}", tweet.get('url'))
+                logger.opt(lazy=True).debug("Texto: {}...", lambda: tweet.get('text', '')[:100])
+                logger.info(f"[{tweet.get('id')}] Paso 1/4: Descargando video...")
 
-        Returns:
-            True si se procesó correctamente
-        """
+                future.set_result(self._downloaded_path(tweet, next(results)))
+        except Exception as e:
+            for future in download_futures:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _downloaded_path(self, tweet: dict, download_result: Optional['VideoDownloadResult']) -> Optional[str]:
+        """Extrae la ruta del video de un resultado de descarga"""
         tweet_id = tweet.get('id')
-        tweet_url = tweet.get('url')
-        tweet_text = tweet.get('text', '')
 
-        logger.info(f"Procesando tweet: {tweet_id}")
-        logger.debug(f"URL: {tweet_url}")
-        logger.debug(f"Texto: {tweet_text[:100]}...")
+        if not download_result:
+            logger.error(f"[{tweet_id}] Error descargando video")
+            return None
 
-        try:
-            # 1. Descargar video
-            logger.info("Paso 1/4: Descargando video...")
-            download_result = self.downloader.download_twitter_video(
-                tweet_url,
-                output_name=f"tweet_{tweet_id}"
-            )
+        video_path = download_result.file_path
+        logger.success(f"[{tweet_id}] Video descargado: {video_path}")
+        return video_path
 
-            if not download_result:
-                logger.error("Error descargando video")
-                return False
+    def _edit(self, tweet: dict, video_path: str) -> Optional[str]:
+        """Etapa 2: edita el video descargado"""
+        tweet_id = tweet.get('id')
 
-            video_path = download_result['file_path']
-            logger.success(f"Video descargado: {video_path}")
+        logger.info(f"[{tweet_id}] Paso 2/4: Editando video...")
+        edit_result = self.editor.process_video(
+            video_path,
+            output_name=f"processed_{tweet_id}",
+            force_vertical=self.config.video.force_vertical
+        )
 
-            # 2. Editar video
-            logger.info("Paso 2/4: Editando video...")
-            edit_result = self.editor.process_video(
-                video_path,
-                output_name=f"processed_{tweet_id}",
-                force_vertical=self.config.video.force_vertical
-            )
+        if not edit_result:
+            logger.error(f"[{tweet_id}] Error editando video")
+            return None
 
-            if not edit_result:
-                logger.error("Error editando video")
-                return False
+        processed_path = edit_result['processed_path']
+        logger.success(f"[{tweet_id}] Video editado: {processed_path}")
+        logger.info(f"[{tweet_id}] Segmento seleccionado: {edit_result['segment']['start']:.1f}s - {edit_result['segment']['end']:.1f}s")
+        return processed_path
 
-            processed_path = edit_result['processed_path']
-            logger.success(f"Video editado: {processed_path}")
-            logger.info(f"Segmento seleccionado: {edit_result['segment']['start']:.1f}s - {edit_result['segment']['end']:.1f}s")
+    def _rewrite_batch(self, tweets: list, caption_futures: list):
+        """
+        Etapa 3 en lote: reformula todos los tweets a la vez (las peticiones
+        a OpenAI van en paralelo) y resuelve el future de cada uno
+        """
+        try:
+            for tweet in tweets:
+                logger.info(f"[{tweet.get('id')}] Paso 3/4: Reformulando texto...")
 
-            # 3. Reformular texto
-            logger.info("Paso 3/4: Reformulando texto...")
-            caption = self.rewriter.generate_caption(
-                tweet_text,
+            captions = self.rewriter.generate_captions(
+                [tweet.get('text', '') for tweet in tweets],
                 include_hashtags=True
             )
-            logger.success(f"Caption generado: {caption[:80]}...")
 
-            # 4. Publicar en TikTok
-            if self.test_mode:
-                logger.warning("MODO TEST: No se publicará en TikTok")
-                logger.info(f"Video que se publicaría: {processed_path}")
-                logger.info(f"Caption: {caption}")
+            for tweet, future, caption in zip(tweets, caption_futures, captions):
+                logger.success(f"[{tweet.get('id')}] Caption generado: {caption[:80]}...")
+                future.set_result(caption)
+        except Exception as e:
+            for future in caption_futures:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _upload(self, tweet: dict, processed_path: str, caption: str) -> bool:
+        """Etapa 4: publica en TikTok y marca el tweet como procesado"""
+        tweet_id = tweet.get('id')
+
+        if self.test_mode:
+            logger.warning("MODO TEST: No se publicará en TikTok")
+            logger.info(f"Video que se publicaría: {processed_path}")
+            logger.info(f"Caption: {caption}")
+        else:
+            # Solo se espera si la publicación anterior fue hace poco
+            if not self._limiter.acquire(sleep=self._stop_event.wait):
+                return False
+
+            logger.info(f"[{tweet_id}] Paso 4/4: Publicando en TikTok...")
+            upload_result = self.uploader.upload_video(
+                processed_path,
+                caption
+            )
+
+            if upload_result.get('rate_limited'):
+                self._limiter.backoff()
+            elif upload_result['success']:
+                self._limiter.relax()
+
+            if upload_result['success']:
+                logger.success(f"Video publicado: {upload_result.get('url', 'OK')}")
             else:
-                logger.info("Paso 4/4: Publicando en TikTok...")
-                upload_result = self.uploader.upload_video(
-                    processed_path,
-                    caption
-                )
+                logger.error(f"Error publicando: {upload_result.get('error')}")
+                return False
 
-                if upload_result['success']:
-                    logger.success(f"Video publicado: {upload_result.get('url', 'OK')}")
-                else:
-                    logger.error(f"Error publicando: {upload_result.get('error')}")
-                    return False
+        # Marcar tweet como procesado (se guarda al final de la iteración)
+        self._pending_seen.add(tweet_id)
+        logger.success(f"Tweet {tweet_id} procesado completamente")
 
-            # Marcar tweet como procesado
-            self.monitor.mark_as_seen(tweet_id)
-            logger.success(f"Tweet {tweet_id} procesado completamente")
+        return True
 
-            return True
+    def _download_and_edit(self, tweet: dict, download_future: Future) -> Optional[str]:
+        """Espera a la descarga del tweet y edita el video resultante"""
+        video_path = download_future.result()
+        if not video_path:
+            return None
+        return self._edit(tweet, video_path)
 
+    def _flush_seen(self):
+        """Guarda de una vez los tweets publicados pendientes"""
+        if not self._pending_seen:
+            return
+
+        try:
+            self.monitor.mark_as_seen_bulk(self._pending_seen)
+            self._pending_seen.clear()
         except Exception as e:
-            logger.exception(f"Error procesando tweet {tweet_id}: {e}")
-            return False
+            logger.error(f"Error guardando tweets vistos: {e}")
 
     def run_once(self) -> int:
         """
         Ejecuta una iteración del bot
 
+        Los tweets se procesan en pipeline: mientras se publica un tweet,
+        el siguiente ya se está descargando y editando. Las descargas van
+        en un hilo propio (en orden y con una única sesión de yt-dlp), la
+        edición y la reformulación en un pool aparte, y la publicación se
+        queda en el hilo principal porque la API síncrona de Playwright no
+        puede cambiar de hilo.
+
         Returns:
             Número de tweets procesados
         """
@@ -215,18 +321,66 @@ class SucesosBot:
         logger.info(f"Encontrados {len(tweets)} tweets nuevos con video")
 
         processed = 0
-        for tweet in tweets:
-            if self.process_tweet(tweet):
-                processed += 1
-            else:
-                # Si falla, no marcar como visto para reintentar
-                logger.warning(f"Tweet {tweet.get('id')} fallido, se reintentará")
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="download") as download_pool, \
+                ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="edit") as work_pool:
 
-            # Pequeña pausa entre procesados
-            time.sleep(5)
+            # Todas las descargas comparten una instancia de yt-dlp
+            download_futures = [Future() for _ in tweets]
+            download_pool.submit(self._download_batch, tweets, download_futures)
+
+            # Los captions se generan de una vez, antes de que acaben las descargas
+            caption_futures = [Future() for _ in tweets]
+            work_pool.submit(self._rewrite_batch, tweets, caption_futures)
+
+            stages = []
+            for tweet, download_future, caption_future in zip(tweets, download_futures, caption_futures):
+                edit_future = work_pool.submit(self._download_and_edit, tweet, download_future)
+                stages.append((tweet, edit_future, caption_future))
+
+            try:
+                for tweet, edit_future, caption_future in stages:
+                    tweet_id = tweet.get('id')
+                    try:
+                        processed_path = edit_future.result()
+                        if processed_path and self._upload(tweet, processed_path, caption_future.result()):
+                            processed += 1
+                        else:
+                            # Si falla, no marcar como visto para reintentar
+                            logger.warning(f"Tweet {tweet_id} fallido, se reintentará")
+                    except Exception as e:
+                        logger.exception(f"Error procesando tweet {tweet_id}: {e}")
+                        logger.warning(f"Tweet {tweet_id} fallido, se reintentará")
+            finally:
+                # Una sola escritura de seen_tweets.log por iteración
+                self._flush_seen()
 
         return processed
 
+    def stop(self):
+        """Pide al bucle principal que termine en cuanto pueda"""
+        self._stop_event.set()
+
+    def _wait(self, seconds: float) -> bool:
+        """
+        Espera hasta la próxima comprobación sin bloquear señales.
+        Mientras espera mantiene viva la sesión de TikTok.
+
+        Returns:
+            False si se pidió detener el bot durante la espera
+        """
+        deadline = time.monotonic() + seconds
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+
+            if self._stop_event.wait(min(remaining, KEEPALIVE_INTERVAL)):
+                return False
+
+            if self.uploader:
+                self.uploader.keepalive()
+
     def run_forever(self):
         """Ejecuta el bot en bucle infinito con intervalos aleatorios"""
         logger.info("="*50)
@@ -235,15 +389,20 @@ class SucesosBot:
         logger.info("Intervalo: 1-60 minutos (aleatorio)")
         logger.info("="*50)
 
-        while True:
+        # Parar de forma ordenada con SIGTERM (systemd, docker stop...)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        while not self._stop_event.is_set():
             try:
                 self.run_once()
 
                 # Intervalo aleatorio entre 1 y 60 minutos para evitar deteccion
-                wait_minutes = random.uniform(1, 60)
+                wait_minutes = self._rng.uniform(1, 60)
                 wait_seconds = int(wait_minutes * 60)
                 logger.info(f"Proxima comprobacion en {wait_minutes:.1f} minutos...")
-                time.sleep(wait_seconds)
+                if not self._wait(wait_seconds):
+                    logger.info("Bot detenido")
+                    break
 
             except KeyboardInterrupt:
                 logger.info("Bot detenido por el usuario")
@@ -251,9 +410,10 @@ class SucesosBot:
             except Exception as e:
                 logger.exception(f"Error en bucle principal: {e}")
                 # Espera aleatoria tambien en caso de error
-                wait_error = random.randint(30, 120)
+                wait_error = self._rng.randint(30, 120)
                 logger.info(f"Reintentando en {wait_error} segundos...")
-                time.sleep(wait_error)
+                if not self._wait(wait_error):
+                    break
 
         # Limpieza
         if self.uploader:
@@ -262,35 +422,64 @@ class SucesosBot:
         logger.info("Bot finalizado")
 
 
-def check_dependencies() -> bool:
-    """Verifica que todas las dependencias estén instaladas"""
-    all_ok = True
+def playwright_installed() -> bool:
+    """Comprueba si Playwright está instalado sin importarlo"""
+    return importlib.util.find_spec("playwright") is not None
+
+
+def check_dependencies(refresh: bool = False) -> bool:
+    """
+    Verifica que todas las dependencias estén instaladas
+
+    Los resultados de yt-dlp y ffmpeg se guardan en data/.deps_cache.json
+    y solo se vuelven a comprobar si cambian los binarios
+
+    Args:
+        refresh: Ignorar la caché y comprobar de nuevo (--check)
+    """
+    from deps_cache import probe_cached
+    from video_downloader import check_ytdlp_installed
+    from video_editor import check_ffmpeg_installed
+
+    cache_file = load_config().bot.data_dir / ".deps_cache.json"
+
+    # Las comprobaciones son independientes (subprocesos): van en paralelo
+    # y se muestran en orden al terminar todas
+    checks = [
+        lambda: probe_cached('yt-dlp', check_ytdlp_installed,
+                             cache_file=cache_file, refresh=refresh),
+        lambda: probe_cached('ffmpeg', check_ffmpeg_installed, binaries=['ffmpeg', 'ffprobe'],
+                             cache_file=cache_file, refresh=refresh),
+        # Playwright: sin importarlo, solo se comprueba que exista
+        playwright_installed,
+    ]
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        ytdlp_ok, ffmpeg_ok, playwright_ok = executor.map(lambda check: check(), checks)
 
     print("\n=== Verificando dependencias ===\n")
 
     # yt-dlp
-    if check_ytdlp_installed():
+    if ytdlp_ok:
         print("[OK] yt-dlp instalado")
     else:
         print("[X] yt-dlp NO instalado")
         print("    Instalar con: pip install yt-dlp")
-        all_ok = False
 
     # ffmpeg
-    if check_ffmpeg_installed():
+    if ffmpeg_ok:
         print("[OK] ffmpeg instalado")
     else:
         print("[X] ffmpeg NO instalado")
         print("    Descargar de: https://ffmpeg.org/download.html")
-        all_ok = False
 
     # Playwright
-    if PLAYWRIGHT_AVAILABLE:
+    if playwright_ok:
         print("[OK] Playwright instalado")
     else:
         print("[X] Playwright NO instalado")
         print("    Instalar con: pip install playwright && playwright install chromium")
-        all_ok = False
+
+    all_ok = ytdlp_ok and ffmpeg_ok and playwright_ok
 
     print()
     return all_ok
@@ -300,20 +489,20 @@ def setup_tiktok():
     """Configura TikTok (login manual)"""
     print("\n=== Configuración de TikTok ===\n")
 
-    if not PLAYWRIGHT_AVAILABLE:
+    if not playwright_installed():
         print("Primero instala Playwright:")
         print("  pip install playwright")
         print("  playwright install chromium")
         return
 
+    from tiktok_uploader import TikTokUploader
+
     config = load_config()
-    uploader = TikTokUploader(
+    with TikTokUploader(
         cookies_file=config.tiktok.cookies_file,
         headless=False
-    )
-
-    success = uploader.login_manual()
-    uploader.close()
+    ) as uploader:
+        success = uploader.login_manual()
 
     if success:
         print("\nConfiguración completada. Puedes ejecutar el bot.")
@@ -350,7 +539,7 @@ Ejemplos:
 
     # Verificar dependencias
     if args.check:
-        check_dependencies()
+        check_dependencies(refresh=True)
         return
 
     # Mostrar configuración
@@ -3,34 +3,62 @@ Configuración central del bot
 """
 
 import os
+import functools
+from types import MappingProxyType
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Optional
 
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Copia inmutable del entorno tomada una sola vez, tras cargar el .env
+_ENV = MappingProxyType(dict(os.environ))
 
-@dataclass
+
+def _env_default(name: str, default=None, cast=None):
+    """Factory para un campo que se lee del entorno (con conversión opcional)"""
+    def factory():
+        value = _ENV.get(name)
+        if value is None:
+            return default
+        return cast(value) if cast else value
+    return field(default_factory=factory)
+
+
+def _env_flag(value: str) -> bool:
+    return value.lower() in ('true', '1', 'yes')
+
+
+def _env_path(name: str, default: str):
+    """Factory para un directorio configurable (vacío = valor por defecto)"""
+    return field(default_factory=lambda: Path(_ENV.get(name) or default))
+
+
+def _default_hashtags() -> list[str]:
+    if _ENV.get('DEFAULT_HASHTAGS'):
+        return _ENV['DEFAULT_HASHTAGS'].split()
+    return [
+        "#sucesoshoy",
+        "#madrid",
+        "#emergencias",
+        "#ultimahora",
+        "#noticias"
+    ]
+
+
+@dataclass(frozen=True, slots=True)
 class TwitterConfig:
     """Configuración de Twitter/X"""
-    username: str = "EmergenciasMad"
+    username: str = _env_default('TWITTER_USERNAME', "EmergenciasMad")
     # API de Twitter (opcional pero recomendado)
-    api_key: Optional[str] = None
-    api_secret: Optional[str] = None
-    access_token: Optional[str] = None
-    access_token_secret: Optional[str] = None
-    bearer_token: Optional[str] = None
-
-    def __post_init__(self):
-        self.username = os.getenv('TWITTER_USERNAME', self.username)
-        self.api_key = os.getenv('TWITTER_API_KEY')
-        self.api_secret = os.getenv('TWITTER_API_SECRET')
-        self.access_token = os.getenv('TWITTER_ACCESS_TOKEN')
-        self.access_token_secret = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
-        self.bearer_token = os.getenv('TWITTER_BEARER_TOKEN')
+    api_key: Optional[str] = _env_default('TWITTER_API_KEY')
+    api_secret: Optional[str] = _env_default('TWITTER_API_SECRET')
+    access_token: Optional[str] = _env_default('TWITTER_ACCESS_TOKEN')
+    access_token_secret: Optional[str] = _env_default('TWITTER_ACCESS_TOKEN_SECRET')
+    bearer_token: Optional[str] = _env_default('TWITTER_BEARER_TOKEN')
 
     @property
     def has_api_credentials(self) -> bool:
@@ -43,89 +71,58 @@ class TwitterConfig:
         ])
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TikTokConfig:
     """Configuración de TikTok"""
-    session_id: Optional[str] = None
-    username: Optional[str] = None
-    password: Optional[str] = None
+    session_id: Optional[str] = _env_default('TIKTOK_SESSION_ID')
+    username: Optional[str] = _env_default('TIKTOK_USERNAME')
+    password: Optional[str] = _env_default('TIKTOK_PASSWORD')
     cookies_file: str = "./data/tiktok_cookies.json"
 
-    def __post_init__(self):
-        self.session_id = os.getenv('TIKTOK_SESSION_ID')
-        self.username = os.getenv('TIKTOK_USERNAME')
-        self.password = os.getenv('TIKTOK_PASSWORD')
-
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class VideoConfig:
     """Configuración de procesamiento de video"""
-    min_duration: int = 15
-    max_duration: int = 60
+    min_duration: int = _env_default('MIN_CLIP_DURATION', 15, int)
+    max_duration: int = _env_default('MAX_CLIP_DURATION', 60, int)
     force_vertical: bool = True
     target_width: int = 1080
     target_height: int = 1920
+    # Aceleración por hardware de ffmpeg ("cuda", "auto" o "none") y codificador
+    # de video ("auto" elige NVENC, VideoToolbox o QSV si están disponibles)
+    hwaccel: str = _env_default('FFMPEG_HWACCEL', "none", str.lower)
+    encoder: str = _env_default('FFMPEG_ENCODER', "libx264")
 
-    def __post_init__(self):
-        self.min_duration = int(os.getenv('MIN_CLIP_DURATION', self.min_duration))
-        self.max_duration = int(os.getenv('MAX_CLIP_DURATION', self.max_duration))
 
-
-@dataclass
+@dataclass(frozen=True, slots=True)
 class BotConfig:
     """Configuración general del bot"""
     # Intervalos
-    check_interval: int = 60  # segundos entre comprobaciones
+    check_interval: int = _env_default('CHECK_INTERVAL', 60, int)  # segundos entre comprobaciones
 
     # Directorios
     base_dir: Path = field(default_factory=lambda: Path(__file__).parent.parent)
-    downloads_dir: Path = field(default_factory=lambda: Path("./downloads"))
-    processed_dir: Path = field(default_factory=lambda: Path("./processed"))
-    logs_dir: Path = field(default_factory=lambda: Path("./logs"))
+    downloads_dir: Path = _env_path('DOWNLOADS_DIR', "./downloads")
+    processed_dir: Path = _env_path('PROCESSED_DIR', "./processed")
+    logs_dir: Path = _env_path('LOGS_DIR', "./logs")
     data_dir: Path = field(default_factory=lambda: Path("./data"))
 
     # Hashtags por defecto
-    default_hashtags: List[str] = field(default_factory=lambda: [
-        "#sucesoshoy",
-        "#madrid",
-        "#emergencias",
-        "#ultimahora",
-        "#noticias"
-    ])
+    default_hashtags: list[str] = field(default_factory=_default_hashtags)
 
     # OpenAI
-    openai_api_key: Optional[str] = None
+    openai_api_key: Optional[str] = _env_default('OPENAI_API_KEY')
 
     # Modo debug
-    debug: bool = False
-
-    def __post_init__(self):
-        self.check_interval = int(os.getenv('CHECK_INTERVAL', self.check_interval))
-
-        # Configurar directorios
-        if os.getenv('DOWNLOADS_DIR'):
-            self.downloads_dir = Path(os.getenv('DOWNLOADS_DIR'))
-        if os.getenv('PROCESSED_DIR'):
-            self.processed_dir = Path(os.getenv('PROCESSED_DIR'))
-        if os.getenv('LOGS_DIR'):
-            self.logs_dir = Path(os.getenv('LOGS_DIR'))
+    debug: bool = _env_default('DEBUG', False, _env_flag)
 
-        # Crear directorios
+    def ensure_dirs(self):
+        """Crea los directorios de trabajo si no existen"""
         for dir_path in [self.downloads_dir, self.processed_dir, self.logs_dir, self.data_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
 
-        # Hashtags
-        if os.getenv('DEFAULT_HASHTAGS'):
-            self.default_hashtags = os.getenv('DEFAULT_HASHTAGS').split()
-
-        # OpenAI
-        self.openai_api_key = os.getenv('OPENAI_API_KEY')
-
-        # Debug
-        self.debug = os.getenv('DEBUG', '').lower() in ('true', '1', 'yes')
-
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     """Configuración completa"""
     twitter: TwitterConfig = field(default_factory=TwitterConfig)
@@ -134,8 +131,9 @@ class Config:
     bot: BotConfig = field(default_factory=BotConfig)
 
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> Config:
-    """Carga y retorna la configuración"""
+    """Carga y retorna la configuración (se construye una sola vez por proceso)"""
     return Config()
 
 
@@ -154,6 +152,7 @@ def print_config(config: Config):
     print(f"  Duración mínima: {config.video.min_duration}s")
     print(f"  Duración máxima: {config.video.max_duration}s")
     print(f"  Formato vertical: {'Sí' if config.video.force_vertical else 'No'}")
+    print(f"  Aceleración ffmpeg: {config.video.hwaccel} ({config.video.encoder})")
 
     print("\nBot:")
     print(f"  Intervalo de comprobación: {config.bot.check_interval}s")
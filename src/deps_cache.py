@@ -0,0 +1,104 @@
+"""
+Caché en disco de las comprobaciones de dependencias
+Evita lanzar yt-dlp/ffmpeg en cada arranque si los binarios no han cambiado
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+from loguru import logger
+
+DEFAULT_CACHE_FILE = Path("./data/.deps_cache.json")
+
+# Las comprobaciones pueden ir en paralelo; el fichero se lee y escribe
+# de uno en uno para no perder entradas
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(binaries: Sequence[str]) -> Optional[str]:
+    """
+    Huella de los binarios: PATH + ruta y fecha de modificación de cada uno
+
+    Returns:
+        None si alguno no está en el PATH (no se puede cachear)
+    """
+    parts = [hashlib.sha1(os.environ.get('PATH', '').encode()).hexdigest()]
+
+    for binary in binaries:
+        path = shutil.which(binary)
+        if not path:
+            return None
+        try:
+            parts.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        except OSError:
+            return None
+
+    return "|".join(parts)
+
+
+def _load(cache_file: Path) -> dict:
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.debug(f"Caché de dependencias inválida: {e}")
+    return {}
+
+
+def _save(cache_file: Path, cache: dict):
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        logger.debug(f"No se pudo guardar la caché de dependencias: {e}")
+
+
+def probe_cached(
+    name: str,
+    probe_fn: Callable[[], bool],
+    binaries: Optional[Sequence[str]] = None,
+    cache_file: Path = DEFAULT_CACHE_FILE,
+    refresh: bool = False
+) -> bool:
+    """
+    Ejecuta probe_fn solo si los binarios han cambiado desde la última vez
+
+    Args:
+        name: Clave de la comprobación en la caché
+        probe_fn: Función que hace la comprobación real
+        binaries: Ejecutables de los que depende (por defecto, name)
+        cache_file: Fichero JSON de caché
+        refresh: Ignorar la caché y volver a comprobar
+
+    Returns:
+        Resultado de la comprobación (cacheado o nuevo)
+    """
+    fingerprint = _fingerprint(binaries or [name])
+
+    # Sin binario en el PATH no hay nada con lo que invalidar la caché
+    if fingerprint is None:
+        return probe_fn()
+
+    cache_file = Path(cache_file)
+
+    if not refresh:
+        with _cache_lock:
+            entry = _load(cache_file).get(name)
+        if entry and entry.get('fingerprint') == fingerprint:
+            return entry['ok']
+
+    ok = bool(probe_fn())
+
+    with _cache_lock:
+        cache = _load(cache_file)
+        cache[name] = {'fingerprint': fingerprint, 'ok': ok}
+        _save(cache_file, cache)
+
+    return ok
@@ -0,0 +1,68 @@
+"""
+Sesión HTTP compartida por los módulos de red
+Un solo pool de conexiones para Nitter, syndication y la API de Twitter
+"""
+
+import threading
+from typing import Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# httpx con HTTP/2 es opcional: las peticiones simultáneas al mismo host
+# van multiplexadas sobre una sola conexión TLS
+try:
+    import httpx
+    import h2  # noqa: F401 (necesario para http2=True)
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# Conexiones abiertas a la vez por host (las sondas de Nitter van en paralelo)
+POOL_MAXSIZE = 16
+
+# Argumentos para que HEAD siga las redirecciones (httpx ya las sigue
+# porque el cliente se crea con follow_redirects=True)
+HEAD_KWARGS = {} if HTTPX_AVAILABLE else {'allow_redirects': True}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _create_httpx_client() -> 'httpx.Client':
+    limits = httpx.Limits(max_keepalive_connections=5, max_connections=POOL_MAXSIZE)
+    return httpx.Client(
+        transport=httpx.HTTPTransport(http1=True, http2=True, limits=limits, retries=3),
+        timeout=30,
+        follow_redirects=True
+    )
+
+
+def _create_requests_session() -> requests.Session:
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> Union[requests.Session, 'httpx.Client']:
+    """
+    Sesión única del proceso, creada al primer uso. Mantiene vivas las
+    conexiones TLS entre peticiones; con httpx usa HTTP/2 y, si no, una
+    sesión de requests que reintenta los 5xx con backoff.
+    Cada módulo manda sus propias cabeceras (autenticación, User-Agent)
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = _create_httpx_client() if HTTPX_AVAILABLE else _create_requests_session()
+
+    return _session
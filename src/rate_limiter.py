@@ -0,0 +1,80 @@
+"""
+Limitador de ritmo con backoff adaptativo
+Usado para espaciar las publicaciones en TikTok
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+
+class RateLimiter:
+    """
+    Ventana deslizante: como mucho max_rate llamadas cada time_period
+    segundos. backoff() alarga la ventana cuando el servicio limita y
+    relax() la devuelve poco a poco a la original
+    """
+
+    def __init__(
+        self,
+        max_rate: int,
+        time_period: float,
+        max_period: Optional[float] = None
+    ):
+        self.max_rate = max_rate
+        self.base_period = time_period
+        self.time_period = time_period
+        self.max_period = max_period or time_period * 64
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Registra una llamada si hay hueco en la ventana
+
+        Returns:
+            Segundos a esperar antes de reintentar (0 si se registró)
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            while self._calls and now - self._calls[0] >= self.time_period:
+                self._calls.popleft()
+
+            if len(self._calls) < self.max_rate:
+                self._calls.append(now)
+                return 0.0
+
+            return self._calls[0] + self.time_period - now
+
+    def acquire(self, sleep: Callable[[float], Any] = time.sleep) -> bool:
+        """
+        Espera hasta que haya hueco para una llamada más
+
+        Args:
+            sleep: Función de espera. Si devuelve True se deja de esperar
+                   (por ejemplo threading.Event.wait al pedir la parada)
+
+        Returns:
+            True si se obtuvo hueco, False si se interrumpió la espera
+        """
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return True
+            if sleep(delay):
+                return False
+
+    def backoff(self, factor: float = 2.0):
+        """Alarga la ventana tras un aviso de límite del servicio"""
+        with self._lock:
+            self.time_period = min(self.max_period, self.time_period * factor)
+        logger.warning(f"Límite de ritmo alcanzado, intervalo ampliado a {self.time_period:.0f}s")
+
+    def relax(self, factor: float = 0.5):
+        """Acerca la ventana a la original tras una llamada correcta"""
+        with self._lock:
+            self.time_period = max(self.base_period, self.time_period * factor)
@@ -0,0 +1,190 @@
+"""
+Registro persistente de tweets ya procesados
+Compartido por el monitor de scraping y el de la API oficial
+"""
+
+import os
+import json
+from collections import deque
+from pathlib import Path
+from typing import Iterable
+
+from loguru import logger
+
+# Filtro de Bloom opcional (pybloom-live): con él solo los IDs recientes se
+# guardan exactos en memoria y el resto cuesta un par de bytes por ID. Un
+# acierto del filtro fuera de los recientes se confirma en el log, así que
+# sus falsos positivos no hacen saltarse ningún tweet
+try:
+    from pybloom_live import ScalableBloomFilter
+    BLOOM_AVAILABLE = True
+except ImportError:
+    BLOOM_AVAILABLE = False
+
+# IDs recientes que se guardan exactos junto al filtro de Bloom
+RECENT_IDS = 5000
+
+
+class SeenTweetsStore:
+    """
+    Conjunto de IDs de tweets procesados guardado como log de solo
+    añadido (un ID por línea). Marcar un tweet escribe una línea en vez de
+    reescribir todo el fichero; compact() lo reescribe si crece de más
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._pending = []
+        self._log_lines = 0
+        self._count = 0
+
+        # Sin filtro de Bloom se guardan todos los IDs exactos
+        self._bloom = None
+        self._recent_order = deque()
+        self._max_recent = None
+        if BLOOM_AVAILABLE:
+            self._bloom = ScalableBloomFilter(initial_capacity=10_000, error_rate=1e-5)
+            self._max_recent = RECENT_IDS
+        self._recent = set()
+
+        self._load()
+        self._migrate_legacy()
+
+    def _load(self):
+        """Carga los IDs de tweets ya procesados"""
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                ids = f.read().split()
+        except Exception as e:
+            logger.warning(f"Error cargando tweets vistos: {e}")
+            return
+
+        # Todo el log de una vez: split() y el set se hacen en C, sin
+        # recorrer el fichero línea a línea en Python
+        self._log_lines = len(ids)
+        unique = dict.fromkeys(ids)
+        self._count = len(unique)
+
+        if self._bloom is None:
+            self._recent = set(unique)
+            return
+
+        for tweet_id in unique:
+            self._bloom.add(tweet_id)
+        self._recent_order.extend(list(unique)[-self._max_recent:])
+        self._recent = set(self._recent_order)
+
+    def _migrate_legacy(self):
+        """Pasa al log los IDs del formato antiguo (lista JSON reescrita en cada cambio)"""
+        legacy = self.path.with_suffix('.json')
+        if legacy == self.path or not legacy.exists():
+            return
+
+        try:
+            with open(legacy, 'r') as f:
+                self.update(json.load(f))
+            self.flush()
+            legacy.unlink()
+            logger.info(f"Tweets vistos migrados de {legacy.name} a {self.path.name}")
+        except Exception as e:
+            logger.warning(f"Error migrando tweets vistos: {e}")
+
+    def _remember(self, tweet_id: str):
+        """Añade un ID nuevo al filtro y a los recientes"""
+        self._count += 1
+        if self._bloom is not None:
+            self._bloom.add(tweet_id)
+
+        self._recent.add(tweet_id)
+        if self._max_recent:
+            # Solo hace falta el orden si los recientes tienen límite
+            self._recent_order.append(tweet_id)
+            if len(self._recent_order) > self._max_recent:
+                self._recent.discard(self._recent_order.popleft())
+
+    def _confirm(self, candidates: set) -> set:
+        """
+        De los IDs que el filtro da por vistos fuera de los recientes, los
+        que de verdad están en el log (o pendientes de guardar). Es una
+        pasada por el fichero, solo para aciertos del filtro: IDs antiguos
+        o falsos positivos (~1e-5)
+        """
+        found = candidates.intersection(self._pending)
+        remaining = candidates - found
+        if not remaining or not self.path.exists():
+            return found
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                tweet_id = line.strip()
+                if tweet_id in remaining:
+                    found.add(tweet_id)
+                    remaining.discard(tweet_id)
+                    if not remaining:
+                        break
+        return found
+
+    def __contains__(self, tweet_id: str) -> bool:
+        # Los recientes se resuelven exactos; el filtro descarta sin leer
+        # el log los que no se han visto nunca (no tiene falsos negativos)
+        if tweet_id in self._recent:
+            return True
+        if self._bloom is None or tweet_id not in self._bloom:
+            return False
+        return bool(self._confirm({tweet_id}))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def unseen(self, tweet_ids: Iterable[str]) -> set:
+        """IDs que aún no se han visto (diferencia de conjuntos con los recientes)"""
+        ids = set(tweet_ids) - self._recent
+        if ids and self._bloom is not None:
+            # Los aciertos del filtro se confirman todos en una sola pasada
+            hits = {tweet_id for tweet_id in ids if tweet_id in self._bloom}
+            if hits:
+                ids -= self._confirm(hits)
+        return ids
+
+    def add(self, tweet_id: str):
+        """Añade un ID en memoria (se guarda con flush)"""
+        if tweet_id not in self:
+            self._remember(tweet_id)
+            self._pending.append(tweet_id)
+
+    def update(self, tweet_ids: Iterable[str]):
+        """Añade varios IDs en memoria (se guardan con flush)"""
+        for tweet_id in tweet_ids:
+            self.add(tweet_id)
+
+    def flush(self):
+        """Añade al log los IDs pendientes"""
+        if not self._pending:
+            return
+
+        with open(self.path, 'a') as f:
+            f.write(''.join(f"{tweet_id}\n" for tweet_id in self._pending))
+        self._log_lines += len(self._pending)
+        self._pending = []
+
+        self.compact()
+
+    def compact(self):
+        """Reescribe el log sin duplicados si tiene más del doble de líneas que IDs"""
+        if self._log_lines <= 2 * self._count:
+            return
+
+        # No todos los IDs están en memoria: se deduplica leyendo el log
+        unique = set()
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(self.path, 'r') as src, open(tmp_path, 'w') as dst:
+            for line in src:
+                tweet_id = line.strip()
+                if tweet_id and tweet_id not in unique:
+                    unique.add(tweet_id)
+                    dst.write(f"{tweet_id}\n")
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(unique)
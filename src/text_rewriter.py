@@ -5,41 +5,354 @@ Reescribe las noticias de emergencias con un estilo propio
 
 import os
 import re
+import json
+import time
 import random
-from typing import Optional, List
+import asyncio
+import functools
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, List, Union
 from datetime import datetime
 
 from loguru import logger
 
 # Intentar importar OpenAI
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
+# RE2 (google-re2) es opcional: coincidencia en tiempo lineal para los
+# patrones de ubicación y detalles, que con re pueden hacer backtracking.
+# Los flags van en línea ((?i)) porque RE2 no acepta los de re
+try:
+    import re2 as re_engine
+    RE2_AVAILABLE = True
+except ImportError:
+    re_engine = re
+    RE2_AVAILABLE = False
+
+# Modelo de spaCy para reconocer lugares y organizaciones (opcional).
+# Si no está instalado se usan solo las expresiones regulares
+SPACY_MODEL = "es_core_news_sm"
+
+# Reformulación con IA
+AI_MODEL = "gpt-3.5-turbo"
+AI_PROMPT = """Eres el community manager de "Sucesos Hoy", una cuenta de TikTok que informa sobre emergencias en Madrid.
+
+Reformula esta noticia de emergencias para TikTok:
+"{original_text}"
+
+Reglas:
+1. Mantén la información esencial pero usa palabras diferentes
+2. Estilo directo e impactante, pero sin sensacionalismo
+3. Máximo 150 caracteres (es para descripción de TikTok)
+4. NO uses emojis
+5. NO copies frases textuales del original
+6. Añade hashtags relevantes al final: #sucesoshoy #madrid #emergencias
+
+Responde SOLO con el texto reformulado, nada más."""
+
+# La respuesta llega en streaming y se corta al llegar a esta longitud
+# (caption de 150 caracteres + hashtags)
+AI_STREAM_MAX_CHARS = 200
+
+# Peticiones simultáneas a OpenAI al reformular en lote
+AI_MAX_CONCURRENCY = 8
+
+# Días que se reutiliza una respuesta de la IA para el mismo texto
+AI_CACHE_TTL_DAYS = 7
+
+# Estados de un lote de la Batch API que aún no han terminado
+AI_BATCH_PENDING = ('validating', 'in_progress', 'finalizing')
+
+# Patrones compilados una sola vez (se usan en cada tweet)
+_URL_RE = re.compile(r'https?://\S+')
+
+# Menciones conocidas y su nombre completo (todas en una sola pasada)
+KNOWN_MENTIONS = {
+    'bomberosmad': 'Bomberos de Madrid',
+    'aborprl': 'Bomberos de Madrid',
+    'aborprl_mad': 'Bomberos de Madrid',
+    'emergenciasmad': 'Emergencias Madrid',
+    'samurpc': 'SAMUR Proteccion Civil',
+    'polaborprl': 'Policia Municipal',
+}
+_KNOWN_MENTION_RE = re.compile(r'@(BomberosMad|ABORPRL(?:_MAD)?|EmergenciasMad|SamurPC|polaborprl)\b', re.IGNORECASE)
+_MENTION_RE = re.compile(r'@\w+')
+_HASHTAG_RE = re.compile(r'#(\w+)')
+_EMOJI_RE = re.compile(r'[\U00010000-\U0010ffff]')
+_WS_RE = re.compile(r'\s+')
+
+
+def _strip_astral(text: str) -> str:
+    """Elimina emojis y demás caracteres fuera del plano básico (>= U+10000)"""
+    # Texto ASCII: no hay nada que quitar y la comprobación es inmediata
+    if text.isascii():
+        return text
+    return _EMOJI_RE.sub('', text)
+
+
+# Patrones comunes de ubicación
+_LOCATION_RES = [re_engine.compile('(?i)' + p) for p in [
+    r'(?:en|calle|c/|avda\.?|avenida|plaza|pº|paseo)\s+([A-Za-záéíóúñÁÉÍÓÚÑ\s,]+?)(?:\.|,|$|\d)',
+    r'(?:distrito|barrio)\s+(?:de\s+)?([A-Za-záéíóúñÁÉÍÓÚÑ\s]+)',
+    r'([A-Za-záéíóúñÁÉÍÓÚÑ]+)\s*(?:nº|número|num\.?)\s*\d+',
+]]
+
+_NUM_VEHICLES_RE = re_engine.compile(r'(?i)(\d+)\s*(?:vehículos?|coches?|personas?|heridos?)')
+_VEHICLES_RE = re_engine.compile(r'(?i)(?:moto|camión|autobús|furgoneta|turismo|coche)')
+
+# Calles, números y distritos en una sola pasada. Los nombres se capturan
+# dentro de lookaheads para que el texto que abarcan se siga analizando
+# (un número tras la calle, una calle dentro de un barrio...). RE2 no
+# admite lookaheads: este patrón se queda siempre en re
+_PLACES_RE = re.compile(
+    r'(?:calle|c/|avda\.?|avenida|plaza|paseo|pº)\s+'
+    r'(?=(?P<calle>[A-Za-záéíóúñÁÉÍÓÚÑ\s]+?)(?P<calle_end>\s*(?:nº|número|,|\.|$)))'
+    r'|(?:nº|número|num\.?)\s*(?P<numero>\d+)'
+    r'|(?:distrito|barrio)\s+(?=(?:de\s+)?(?P<lugar>[A-Za-záéíóúñÁÉÍÓÚÑ\s]+))',
+    re.IGNORECASE
+)
+
+# Sinónimos para verbos comunes
+VERB_SYNONYMS = {
+    'trabajan': ['intervienen', 'actúan', 'operan', 'están trabajando'],
+    'atienden': ['asisten', 'auxilian', 'socorren', 'prestan ayuda'],
+    'se ha producido': ['ha tenido lugar', 'se ha registrado', 'ha ocurrido'],
+    'se desplazan': ['acuden', 'se dirigen', 'van camino'],
+    'ha sido': ['fue', 'resultó', 'quedó'],
+    'hay': ['se registran', 'se reportan', 'existen'],
+}
+
+# Sinónimos para sustantivos (mismo género gramatical)
+NOUN_SYNONYMS = {
+    'incendio': ['fuego', 'siniestro'],
+    'accidente': ['siniestro vial', 'percance'],
+    'heridos': ['lesionados', 'afectados'],
+    'herido': ['lesionado', 'afectado'],
+    'vehículos': ['coches', 'automóviles'],
+    'vehículo': ['coche', 'automóvil'],
+    'edificio': ['inmueble', 'bloque'],
+    'vivienda': ['casa', 'vivienda'],  # mantener femenino
+    'persona': ['ciudadano', 'persona'],
+}
+
+
+
+def _alternation(words) -> str:
+    # Las más largas primero para que 'heridos' gane a 'herido'
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+# Entradillas y cierres del texto reformulado con plantillas
+INTRO_OPTIONS = (
+    "ATENCIÓN",
+    "ÚLTIMA HORA",
+    "URGENTE",
+    "ALERTA EN MADRID",
+    "SUCESO AHORA",
+    "ESTO ACABA DE PASAR",
+    "NOTICIA DE ÚLTIMA HORA",
+)
+
+CLOSING_OPTIONS = (
+    "Más información en breve.",
+    "Os mantendremos informados.",
+    "Seguimos pendientes.",
+    "Ampliamos información.",
+    "",
+)
+
+# Entidades conocidas que se mantienen tal cual en el texto
+KNOWN_ENTITIES = ('Bomberos de Madrid', 'SAMUR', 'Protección Civil', 'Policía Municipal',
+                  'Policía Nacional', 'Emergencias Madrid', 'SUMMA')
+
+# Se busca sobre el texto en minúsculas, todas en una pasada
+_ENTITY_RE = re.compile('|'.join(re.escape(entity.lower()) for entity in KNOWN_ENTITIES))
+
+# Palabras clave de cada tipo de suceso, en orden de prioridad
+EVENT_KEYWORDS = {
+    'incendio': ['incendio', 'fuego', 'llamas', 'humo', 'arde'],
+    'accidente': ['accidente', 'colisión', 'choque', 'atropello', 'vuelco'],
+    'emergencia_sanitaria': ['samur', 'sanitario', 'herido', 'atención médica'],
+    'rescate': ['rescate', 'atrapado', 'salvamento'],
+}
+
+# Un grupo con nombre por tipo: match.lastgroup es la categoría
+_EVENT_RE = re.compile('|'.join(
+    f'(?P<{event_type}>{_alternation(words)})' for event_type, words in EVENT_KEYWORDS.items()
+))
+
+# Verbos (en cualquier posición) y sustantivos (palabra completa) en una sola pasada
+_SYNONYM_RE = re.compile(
+    r'(?P<verb>' + _alternation(VERB_SYNONYMS) + r')|\b(?P<noun>' + _alternation(NOUN_SYNONYMS) + r')\b',
+    re.IGNORECASE
+)
+
 
 class TextRewriter:
     """Reformula textos de noticias para TikTok"""
 
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        cache_file: Union[str, Path] = "./data/ai_cache.jsonl"
+    ):
         self.openai_api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
-        self.client = None
 
-        if self.openai_api_key and OPENAI_AVAILABLE:
-            try:
-                self.client = OpenAI(api_key=self.openai_api_key)
-                logger.info("OpenAI configurado correctamente")
-            except Exception as e:
-                logger.warning(f"Error configurando OpenAI: {e}")
+        # El cliente de OpenAI se crea al primer uso (False = no disponible)
+        self._client = None
+
+        # Caché de respuestas de la IA (JSONL, una línea por respuesta)
+        self.cache_file = Path(cache_file)
+        self._cache_lock = threading.Lock()
+        self._ai_cache = self._load_ai_cache()
+
+        # spaCy se carga al primer uso (False = no disponible)
+        self._nlp = None
+        self._entities_cache = {}
+
+        # Los análisis solo dependen del texto (y de spaCy): caché por
+        # instancia, así no queda self retenido en una caché global
+        self._detect_event_type = functools.lru_cache(maxsize=512)(self._detect_event_type)
+        self._extract_location = functools.lru_cache(maxsize=512)(self._extract_location)
+        self._extract_details = functools.lru_cache(maxsize=512)(self._extract_details)
+        self._extract_proper_names = functools.lru_cache(maxsize=512)(self._extract_proper_names)
 
         # Plantillas para reformulación sin IA
         self.templates = self._load_templates()
 
+    @property
+    def client(self) -> Optional['OpenAI']:
+        """Cliente de OpenAI, o None si no hay API key o el paquete no está instalado"""
+        if self._client is None:
+            self._client = False
+            if self.openai_api_key and OPENAI_AVAILABLE:
+                try:
+                    self._client = OpenAI(api_key=self.openai_api_key)
+                    logger.info("OpenAI configurado correctamente")
+                except Exception as e:
+                    logger.warning(f"Error configurando OpenAI: {e}")
+
+        return self._client or None
+
+    @property
+    def nlp(self):
+        """Pipeline de spaCy para NER, o None si spaCy o el modelo no están instalados"""
+        if self._nlp is None:
+            try:
+                import spacy
+                self._nlp = spacy.load(
+                    SPACY_MODEL,
+                    disable=['parser', 'lemmatizer', 'morphologizer', 'attribute_ruler']
+                )
+                logger.info(f"spaCy cargado ({SPACY_MODEL})")
+            except Exception as e:
+                logger.debug(f"spaCy no disponible, se usan expresiones regulares: {e}")
+                self._nlp = False
+
+        return self._nlp or None
+
+    def _entities(self, text: str) -> list:
+        """Entidades (texto, etiqueta) que detecta spaCy; vacío sin spaCy"""
+        nlp = self.nlp
+        if nlp is None:
+            return []
+
+        if text not in self._entities_cache:
+            if len(self._entities_cache) > 256:
+                self._entities_cache.clear()
+            self._entities_cache[text] = [(ent.text, ent.label_) for ent in nlp(text).ents]
+
+        return self._entities_cache[text]
+
+    def _prefetch_entities(self, texts: List[str]):
+        """Pasa varios textos por spaCy de una vez (nlp.pipe) antes de usarlos"""
+        nlp = self.nlp
+        if nlp is None:
+            return
+
+        self._entities_cache = {
+            text: [(ent.text, ent.label_) for ent in doc.ents]
+            for text, doc in zip(texts, nlp.pipe(texts, batch_size=32))
+        }
+
+    def _load_ai_cache(self) -> dict:
+        """Carga las respuestas de la IA no caducadas"""
+        cache = {}
+        if not self.cache_file.exists():
+            return cache
+
+        expired = False
+        min_ts = time.time() - AI_CACHE_TTL_DAYS * 86400
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        expired = True
+                        continue
+                    if entry.get('ts', 0) < min_ts:
+                        expired = True
+                        continue
+                    cache[entry['key']] = (entry['text'], entry['ts'])
+        except Exception as e:
+            logger.warning(f"Error cargando caché de IA: {e}")
+            return {}
+
+        # Compactar el fichero si había entradas caducadas
+        if expired:
+            self._write_ai_cache(cache)
+
+        return cache
+
+    def _write_ai_cache(self, cache: dict):
+        """Reescribe el fichero de caché completo"""
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                for key, (text, ts) in cache.items():
+                    f.write(json.dumps({'key': key, 'text': text, 'ts': ts}, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.warning(f"Error guardando caché de IA: {e}")
+
+    @staticmethod
+    def _ai_cache_key(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_cached_ai(self, text: str) -> Optional[str]:
+        """Respuesta de la IA ya obtenida para este texto (si no ha caducado)"""
+        entry = self._ai_cache.get(self._ai_cache_key(text))
+        if entry and entry[1] >= time.time() - AI_CACHE_TTL_DAYS * 86400:
+            return entry[0]
+        return None
+
+    def _cache_ai(self, text: str, rewritten: str):
+        """Guarda una respuesta de la IA (en memoria y añadiendo una línea al fichero)"""
+        self._cache_ai_key(self._ai_cache_key(text), rewritten)
+
+    def _cache_ai_key(self, key: str, rewritten: str):
+        """_cache_ai con la clave ya calculada"""
+        ts = time.time()
+
+        with self._cache_lock:
+            self._ai_cache[key] = (rewritten, ts)
+            try:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.cache_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'text': rewritten, 'ts': ts}, ensure_ascii=False) + '\n')
+            except OSError as e:
+                logger.warning(f"Error guardando caché de IA: {e}")
+
     def _load_templates(self) -> dict:
-        """Carga plantillas de reformulación"""
+        """Carga plantillas de reformulación (tuplas: no se copian en cada uso)"""
         return {
-            'intro': [
+            'intro': (
                 "ATENCIÓN",
                 "ÚLTIMA HORA",
                 "URGENTE",
@@ -47,68 +360,66 @@ class TextRewriter:
                 "SUCESO EN MADRID",
                 "ESTO ACABA DE PASAR",
                 "INCREÍBLE LO QUE HA PASADO",
-            ],
-            'incendio': [
+            ),
+            'incendio': (
                 "Se ha producido un incendio {ubicacion}",
                 "Bomberos trabajan en un incendio {ubicacion}",
                 "Fuego declarado {ubicacion}",
                 "Importante incendio {ubicacion}",
-            ],
-            'accidente': [
+            ),
+            'accidente': (
                 "Accidente de tráfico {ubicacion}",
                 "Colisión {ubicacion}",
                 "Siniestro vial {ubicacion}",
                 "Accidente con {detalles} {ubicacion}",
-            ],
-            'emergencia_sanitaria': [
+            ),
+            'emergencia_sanitaria': (
                 "Emergencia sanitaria {ubicacion}",
                 "SAMUR atiende una emergencia {ubicacion}",
                 "Intervención de emergencias {ubicacion}",
-            ],
-            'rescate': [
+            ),
+            'rescate': (
                 "Rescate en marcha {ubicacion}",
                 "Bomberos realizan un rescate {ubicacion}",
                 "Operativo de rescate {ubicacion}",
-            ],
-            'generic': [
+            ),
+            'generic': (
                 "Suceso {ubicacion}",
                 "Intervención de emergencias {ubicacion}",
                 "Operativo en marcha {ubicacion}",
-            ],
-            'closing': [
+            ),
+            'closing': (
                 "Más información en breve.",
                 "Os mantendremos informados.",
                 "Pendientes de más detalles.",
                 "",  # A veces sin cierre
-            ]
+            )
         }
 
     def _detect_event_type(self, text: str) -> str:
         """Detecta el tipo de suceso basándose en palabras clave"""
-        text_lower = text.lower()
-
-        if any(word in text_lower for word in ['incendio', 'fuego', 'llamas', 'humo', 'arde']):
-            return 'incendio'
-        elif any(word in text_lower for word in ['accidente', 'colisión', 'choque', 'atropello', 'vuelco']):
-            return 'accidente'
-        elif any(word in text_lower for word in ['samur', 'sanitario', 'herido', 'atención médica']):
-            return 'emergencia_sanitaria'
-        elif any(word in text_lower for word in ['rescate', 'atrapado', 'salvamento']):
-            return 'rescate'
-        else:
-            return 'generic'
+        found = set()
+        for match in _EVENT_RE.finditer(text.lower()):
+            # Incendio tiene prioridad sobre el resto: no hace falta seguir
+            if match.lastgroup == 'incendio':
+                return 'incendio'
+            found.add(match.lastgroup)
+
+        for event_type in EVENT_KEYWORDS:
+            if event_type in found:
+                return event_type
+
+        return 'generic'
 
     def _extract_location(self, text: str) -> str:
         """Extrae la ubicación del texto"""
-        # Patrones comunes de ubicación
-        patterns = [
-            r'(?:en|calle|c/|avda\.?|avenida|plaza|pº|paseo)\s+([A-Za-záéíóúñÁÉÍÓÚÑ\s,]+?)(?:\.|,|$|\d)',
-            r'(?:distrito|barrio)\s+(?:de\s+)?([A-Za-záéíóúñÁÉÍÓÚÑ\s]+)',
-            r'([A-Za-záéíóúñÁÉÍÓÚÑ]+)\s*(?:nº|número|num\.?)\s*\d+',
-        ]
+        # Primero el NER de spaCy (si está disponible)
+        for ent_text, label in self._entities(text):
+            if label == 'LOC' and len(ent_text) > 3 and ent_text.lower() != 'madrid':
+                return f"en {ent_text}"
 
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in _LOCATION_RES:
+            match = pattern.search(text)
             if match:
                 location = match.group(1).strip()
                 if len(location) > 3:  # Evitar matches muy cortos
@@ -125,55 +436,154 @@ class TextRewriter:
         details = []
 
         # Buscar números de vehículos/personas afectadas
-        num_match = re.search(r'(\d+)\s*(?:vehículos?|coches?|personas?|heridos?)', text, re.IGNORECASE)
+        num_match = _NUM_VEHICLES_RE.search(text)
         if num_match:
             details.append(num_match.group(0))
 
         # Buscar tipos de vehículos
-        vehicles = re.findall(r'(?:moto|camión|autobús|furgoneta|turismo|coche)', text, re.IGNORECASE)
+        vehicles = _VEHICLES_RE.findall(text)
         if vehicles:
             details.extend(vehicles[:2])  # Máximo 2 vehículos
 
         return ' y '.join(details) if details else ""
 
+    def _ai_request(self, original_text: str) -> dict:
+        """Parámetros de la petición de reformulación a OpenAI"""
+        return {
+            'model': AI_MODEL,
+            'messages': [{"role": "user", "content": AI_PROMPT.format(original_text=original_text)}],
+            'max_tokens': 200,
+            'temperature': 0.7,
+        }
+
+    @staticmethod
+    def _stream_text(parts: List[str], truncated: bool) -> str:
+        """Une los fragmentos recibidos; si se cortó, hasta la última palabra completa"""
+        text = ''.join(parts)
+        if truncated:
+            cut = text.rfind(' ', 0, AI_STREAM_MAX_CHARS)
+            if cut > 0:
+                text = text[:cut]
+        return text.strip()
+
     def rewrite_with_ai(self, original_text: str) -> Optional[str]:
         """Reformula el texto usando OpenAI"""
         if not self.client:
             return None
 
-        try:
-            prompt = f"""Eres el community manager de "Sucesos Hoy", una cuenta de TikTok que informa sobre emergencias en Madrid.
-
-Reformula esta noticia de emergencias para TikTok:
-"{original_text}"
+        cached = self._get_cached_ai(original_text)
+        if cached:
+            logger.info(f"Texto reformulado (caché): {cached[:50]}...")
+            return cached
 
-Reglas:
-1. Mantén la información esencial pero usa palabras diferentes
-2. Estilo directo e impactante, pero sin sensacionalismo
-3. Máximo 150 caracteres (es para descripción de TikTok)
-4. NO uses emojis
-5. NO copies frases textuales del original
-6. Añade hashtags relevantes al final: #sucesoshoy #madrid #emergencias
+        try:
+            stream = self.client.chat.completions.create(**self._ai_request(original_text), stream=True)
+
+            # Dejar de leer en cuanto hay texto suficiente para el caption
+            parts, length, truncated = [], 0, False
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ''
+                parts.append(delta)
+                length += len(delta)
+                if length >= AI_STREAM_MAX_CHARS:
+                    truncated = True
+                    stream.close()
+                    break
+
+            rewritten = self._stream_text(parts, truncated)
+            logger.info(f"Texto reformulado con IA: {rewritten[:50]}...")
+            self._cache_ai(original_text, rewritten)
+            return rewritten
 
-Responde SOLO con el texto reformulado, nada más."""
+        except Exception as e:
+            logger.error(f"Error con OpenAI: {e}")
+            return None
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=200,
-                temperature=0.7
-            )
+    async def _rewrite_with_ai_async(
+        self,
+        aclient: 'AsyncOpenAI',
+        original_text: str,
+        semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
+        """Reformula un texto con el cliente asíncrono de OpenAI"""
+        cached = self._get_cached_ai(original_text)
+        if cached:
+            logger.info(f"Texto reformulado (caché): {cached[:50]}...")
+            return cached
 
-            rewritten = response.choices[0].message.content.strip()
+        try:
+            async with semaphore:
+                stream = await aclient.chat.completions.create(**self._ai_request(original_text), stream=True)
+
+                # Dejar de leer en cuanto hay texto suficiente para el caption
+                parts, length, truncated = [], 0, False
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ''
+                    parts.append(delta)
+                    length += len(delta)
+                    if length >= AI_STREAM_MAX_CHARS:
+                        truncated = True
+                        await stream.close()
+                        break
+
+            rewritten = self._stream_text(parts, truncated)
             logger.info(f"Texto reformulado con IA: {rewritten[:50]}...")
+            self._cache_ai(original_text, rewritten)
             return rewritten
 
         except Exception as e:
             logger.error(f"Error con OpenAI: {e}")
             return None
 
+    async def rewrite_batch_async(self, texts: List[str]) -> List[Optional[str]]:
+        """
+        Reformula varios textos con IA lanzando las peticiones a la vez
+
+        Returns:
+            Lista con el texto reformulado o None (sin IA o si falla)
+        """
+        if not self.client:
+            return [None] * len(texts)
+
+        # El cliente asíncrono va ligado al event loop: uno por lote
+        semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+        async with AsyncOpenAI(api_key=self.openai_api_key) as aclient:
+            return await asyncio.gather(
+                *(self._rewrite_with_ai_async(aclient, text, semaphore) for text in texts)
+            )
+
+    def _scan_places(self, text: str) -> tuple:
+        """
+        Recorre el texto una vez y devuelve (calles, números, lugares)
+
+        Cada tipo se queda sin solapamientos consigo mismo, igual que con
+        un findall por patrón
+        """
+        calles, numeros, lugares = [], [], []
+        calle_end = lugar_end = -1
+
+        for match in _PLACES_RE.finditer(text):
+            if match.group('calle') is not None:
+                if match.start() >= calle_end:
+                    calles.append(match.group('calle'))
+                    calle_end = match.end('calle_end')
+            elif match.group('numero') is not None:
+                numeros.append(match.group('numero'))
+            elif match.start() >= lugar_end:
+                lugares.append(match.group('lugar'))
+                lugar_end = match.end('lugar')
+
+        return calles, numeros, lugares
+
     def _extract_proper_names(self, text: str) -> dict:
-        """Extrae nombres propios del texto (calles, lugares, entidades)"""
+        """
+        Extrae nombres propios del texto (calles, lugares, entidades)
+        El resultado se cachea por texto: no modificarlo
+        """
         proper_names = {
             'calles': [],
             'lugares': [],
@@ -181,82 +591,56 @@ Responde SOLO con el texto reformulado, nada más."""
             'numeros': []
         }
 
-        # Extraer calles
-        calle_match = re.findall(r'(?:calle|c/|avda\.?|avenida|plaza|paseo|pº)\s+([A-Za-záéíóúñÁÉÍÓÚÑ\s]+?)(?:\s*(?:nº|número|,|\.|$))', text, re.IGNORECASE)
-        proper_names['calles'] = [c.strip() for c in calle_match if len(c.strip()) > 2]
-
-        # Extraer números de calle
-        num_match = re.findall(r'(?:nº|número|num\.?)\s*(\d+)', text, re.IGNORECASE)
-        proper_names['numeros'] = num_match
+        # Extraer calles, números de calle y distritos/barrios
+        calles, numeros, lugares = self._scan_places(text)
+        proper_names['calles'] = [c.strip() for c in calles if len(c.strip()) > 2]
+        proper_names['numeros'] = numeros
+        proper_names['lugares'] = [d.strip() for d in lugares]
 
-        # Extraer distritos/barrios
-        distrito_match = re.findall(r'(?:distrito|barrio)\s+(?:de\s+)?([A-Za-záéíóúñÁÉÍÓÚÑ\s]+)', text, re.IGNORECASE)
-        proper_names['lugares'] = [d.strip() for d in distrito_match]
+        # Extraer entidades conocidas (en el orden de KNOWN_ENTITIES)
+        found = {match.group(0) for match in _ENTITY_RE.finditer(text.lower())}
+        proper_names['entidades'] = [entidad for entidad in KNOWN_ENTITIES if entidad.lower() in found]
 
-        # Extraer entidades conocidas
-        entidades = ['Bomberos de Madrid', 'SAMUR', 'Protección Civil', 'Policía Municipal',
-                     'Policía Nacional', 'Emergencias Madrid', 'SUMMA']
-        for entidad in entidades:
-            if entidad.lower() in text.lower():
-                proper_names['entidades'].append(entidad)
+        # Completar con lugares y organizaciones que detecte spaCy
+        for ent_text, label in self._entities(text):
+            key = {'LOC': 'lugares', 'ORG': 'entidades'}.get(label)
+            if key and ent_text not in proper_names[key]:
+                proper_names[key].append(ent_text)
 
         return proper_names
 
     def _reformulate_sentence(self, text: str, proper_names: dict) -> str:
         """Reformula una oración manteniendo nombres propios"""
 
-        # Sinónimos para verbos comunes
-        verb_synonyms = {
-            'trabajan': ['intervienen', 'actúan', 'operan', 'están trabajando'],
-            'atienden': ['asisten', 'auxilian', 'socorren', 'prestan ayuda'],
-            'se ha producido': ['ha tenido lugar', 'se ha registrado', 'ha ocurrido'],
-            'se desplazan': ['acuden', 'se dirigen', 'van camino'],
-            'ha sido': ['fue', 'resultó', 'quedó'],
-            'hay': ['se registran', 'se reportan', 'existen'],
-        }
-
-        # Sinónimos para sustantivos (mismo género gramatical)
-        noun_synonyms = {
-            'incendio': ['fuego', 'siniestro'],
-            'accidente': ['siniestro vial', 'percance'],
-            'heridos': ['lesionados', 'afectados'],
-            'herido': ['lesionado', 'afectado'],
-            'vehículos': ['coches', 'automóviles'],
-            'vehículo': ['coche', 'automóvil'],
-            'edificio': ['inmueble', 'bloque'],
-            'vivienda': ['casa', 'vivienda'],  # mantener femenino
-            'persona': ['ciudadano', 'persona'],
-        }
+        # Sustantivos que forman parte de un nombre propio (no se tocan)
+        names_lower = [name.lower() for names in proper_names.values() for name in names]
+        protected = {noun for noun in NOUN_SYNONYMS if any(noun in name for name in names_lower)}
 
-        result = text
+        # Mismo sinónimo para todas las apariciones de una palabra
+        chosen = {}
 
-        # Reemplazar verbos
-        for original, synonyms in verb_synonyms.items():
-            if original in result.lower():
-                replacement = random.choice(synonyms)
-                result = re.sub(original, replacement, result, flags=re.IGNORECASE)
+        def replace(match: re.Match) -> str:
+            word = match.group(0).lower()
+            if match.lastgroup == 'verb':
+                synonyms = VERB_SYNONYMS[word]
+            elif word in protected:
+                return match.group(0)
+            else:
+                synonyms = NOUN_SYNONYMS[word]
 
-        # Reemplazar sustantivos (solo si no son nombres propios)
-        for original, synonyms in noun_synonyms.items():
-            if original in result.lower():
-                # Verificar que no es parte de un nombre propio
-                is_proper = False
-                for names in proper_names.values():
-                    for name in names:
-                        if original.lower() in name.lower():
-                            is_proper = True
-                            break
+            if word not in chosen:
+                chosen[word] = random.choice(synonyms)
+            return chosen[word]
 
-                if not is_proper:
-                    replacement = random.choice(synonyms)
-                    result = re.sub(r'\b' + original + r'\b', replacement, result, flags=re.IGNORECASE)
-
-        return result
+        return _SYNONYM_RE.sub(replace, text)
 
     def rewrite_with_templates(self, original_text: str) -> str:
         """Reformula el texto manteniendo nombres propios pero cambiando palabras"""
         # Limpiar texto primero
-        clean_text = self._clean_text(original_text)
+        return self._rewrite_clean_with_templates(self._clean_text(original_text))
+
+    def _rewrite_clean_with_templates(self, clean_text: str) -> str:
+        """rewrite_with_templates sobre un texto ya limpio"""
 
         # Extraer nombres propios que debemos mantener
         proper_names = self._extract_proper_names(clean_text)
@@ -269,17 +653,8 @@ Responde SOLO con el texto reformulado, nada más."""
         parts = []
 
         # Intro (variada)
-        intro_options = [
-            "ATENCIÓN",
-            "ÚLTIMA HORA",
-            "URGENTE",
-            "ALERTA EN MADRID",
-            "SUCESO AHORA",
-            "ESTO ACABA DE PASAR",
-            "NOTICIA DE ÚLTIMA HORA",
-        ]
         if random.random() > 0.2:
-            parts.append(random.choice(intro_options))
+            parts.append(random.choice(INTRO_OPTIONS))
 
         # Reformular el texto original en vez de usar plantillas fijas
         reformulated = self._reformulate_sentence(clean_text, proper_names)
@@ -291,18 +666,11 @@ Responde SOLO con el texto reformulado, nada más."""
         else:
             body = reformulated
 
-        body = re.sub(r'\s+', ' ', body).strip()
+        body = _WS_RE.sub(' ', body).strip()
         parts.append(body)
 
         # Cierre variado
-        closing_options = [
-            "Más información en breve.",
-            "Os mantendremos informados.",
-            "Seguimos pendientes.",
-            "Ampliamos información.",
-            "",
-        ]
-        closing = random.choice(closing_options)
+        closing = random.choice(CLOSING_OPTIONS)
         if closing:
             parts.append(closing)
 
@@ -314,6 +682,120 @@ Responde SOLO con el texto reformulado, nada más."""
 
         return text
 
+    def rewrite_batch_submit(self, texts: List[str], prefer_batch: bool = True) -> Optional[str]:
+        """
+        Envía textos a la Batch API de OpenAI (mitad de precio, hasta 24h).
+        Pensado para reprocesar atrasos; lo que va al momento sigue por streaming
+
+        Args:
+            texts: Textos originales de los tweets
+            prefer_batch: Si es False se reformulan ya con peticiones normales
+
+        Returns:
+            ID del lote, o None si no se envió ninguno
+        """
+        if not self.client:
+            return None
+
+        # Se envían los textos limpios, igual que en rewrite(), y sin repetir
+        # los que ya están en caché: custom_id es la clave de la caché
+        batch_texts = {}
+        for text in texts:
+            if not text:
+                continue
+            clean_text = self._clean_text(text)
+            key = self._ai_cache_key(clean_text)
+            if key not in batch_texts and not self._get_cached_ai(clean_text):
+                batch_texts[key] = clean_text
+
+        if not batch_texts:
+            return None
+
+        if not prefer_batch:
+            asyncio.run(self.rewrite_batch_async(list(batch_texts.values())))
+            return None
+
+        lines = [
+            json.dumps({
+                'custom_id': key,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': self._ai_request(clean_text),
+            }, ensure_ascii=False)
+            for key, clean_text in batch_texts.items()
+        ]
+
+        try:
+            batch_file = self.client.files.create(
+                file=('rewrites.jsonl', '\n'.join(lines).encode('utf-8')),
+                purpose='batch'
+            )
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h'
+            )
+            logger.info(f"Lote de {len(lines)} textos enviado a OpenAI: {batch.id}")
+            return batch.id
+
+        except Exception as e:
+            logger.error(f"Error enviando lote a OpenAI: {e}")
+            return None
+
+    def rewrite_batch_fetch(self, batch_id: str, poll_interval: float = 60, timeout: float = 0) -> dict:
+        """
+        Descarga los resultados de un lote y los guarda en la caché de IA,
+        de donde los toman rewrite() y rewrite_batch()
+
+        Args:
+            batch_id: ID devuelto por rewrite_batch_submit
+            poll_interval: Segundos entre consultas del estado
+            timeout: Máximo de segundos esperando a que termine (0 = consultar una vez)
+
+        Returns:
+            Diccionario custom_id (clave de caché del texto limpio) -> texto reformulado
+        """
+        if not self.client:
+            return {}
+
+        deadline = time.monotonic() + timeout
+
+        try:
+            batch = self.client.batches.retrieve(batch_id)
+            while batch.status in AI_BATCH_PENDING and time.monotonic() + poll_interval <= deadline:
+                time.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch_id)
+
+            if batch.status != 'completed' or not batch.output_file_id:
+                logger.info(f"Lote {batch_id} sin resultados (estado: {batch.status})")
+                return {}
+
+            content = self.client.files.content(batch.output_file_id).text
+
+        except Exception as e:
+            logger.error(f"Error consultando lote de OpenAI: {e}")
+            return {}
+
+        results = {}
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if response.get('status_code') != 200:
+                    continue
+                text = response['body']['choices'][0]['message']['content'] or ''
+            except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+                continue
+
+            # Mismo recorte que en streaming para que los captions sean iguales
+            rewritten = self._stream_text([text], len(text) >= AI_STREAM_MAX_CHARS)
+            if rewritten:
+                results[entry['custom_id']] = rewritten
+                self._cache_ai_key(entry['custom_id'], rewritten)
+
+        logger.info(f"Lote {batch_id}: {len(results)} textos reformulados")
+        return results
+
     def rewrite(self, original_text: str, prefer_ai: bool = True) -> str:
         """
         Reformula el texto de la noticia
@@ -338,7 +820,59 @@ Responde SOLO con el texto reformulado, nada más."""
                 return ai_result
 
         # Fallback a plantillas
-        return self.rewrite_with_templates(original_text)
+        return self._rewrite_clean_with_templates(original_text)
+
+    async def rewrite_async(self, original_text: str, prefer_ai: bool = True) -> str:
+        """Como rewrite, pero la petición a la IA espera en el event loop de quien llama"""
+        if not original_text:
+            return "#sucesoshoy #madrid #emergencias"
+
+        original_text = self._clean_text(original_text)
+
+        if prefer_ai and self.client:
+            ai_result = (await self.rewrite_batch_async([original_text]))[0]
+            if ai_result:
+                return ai_result
+
+        return self._rewrite_clean_with_templates(original_text)
+
+    def rewrite_batch(self, original_texts: List[str], prefer_ai: bool = True) -> List[str]:
+        """
+        Reformula varios textos de una vez (las peticiones a la IA van en paralelo)
+
+        Args:
+            original_texts: Textos originales de los tweets
+            prefer_ai: Si usar IA cuando esté disponible
+
+        Returns:
+            Textos reformulados, en el mismo orden
+        """
+        # Limpiar los textos originales (los vacíos solo llevan hashtags)
+        pending = [i for i, text in enumerate(original_texts) if text]
+        clean_texts = {i: self._clean_text(original_texts[i]) for i in pending}
+
+        # Intentar con IA primero, todas las peticiones a la vez
+        ai_results = {}
+        if prefer_ai and self.client and pending:
+            ai_list = asyncio.run(self.rewrite_batch_async([clean_texts[i] for i in pending]))
+            ai_results = dict(zip(pending, ai_list))
+
+        # Las que no tengan IA van a plantillas: NER de todas de una vez
+        fallback = [clean_texts[i] for i in pending if not ai_results.get(i)]
+        if fallback:
+            self._prefetch_entities(fallback)
+
+        results = []
+        for i in range(len(original_texts)):
+            if i not in clean_texts:
+                results.append("#sucesoshoy #madrid #emergencias")
+            elif ai_results.get(i):
+                results.append(ai_results[i])
+            else:
+                # Fallback a plantillas
+                results.append(self._rewrite_clean_with_templates(clean_texts[i]))
+
+        return results
 
     def _clean_text(self, text: str) -> str:
         """
@@ -349,27 +883,22 @@ Responde SOLO con el texto reformulado, nada más."""
         - #hashtag -> hashtag (se mantiene el contenido)
         """
         # Eliminar URLs
-        text = re.sub(r'https?://\S+', '', text)
+        text = _URL_RE.sub('', text)
 
         # Reemplazar menciones conocidas
-        text = re.sub(r'@BomberosMad\b', 'Bomberos de Madrid', text, flags=re.IGNORECASE)
-        text = re.sub(r'@ABORPRL\b', 'Bomberos de Madrid', text, flags=re.IGNORECASE)
-        text = re.sub(r'@EmergenciasMad\b', 'Emergencias Madrid', text, flags=re.IGNORECASE)
-        text = re.sub(r'@ABORPRL_MAD\b', 'Bomberos de Madrid', text, flags=re.IGNORECASE)
-        text = re.sub(r'@SamurPC\b', 'SAMUR Proteccion Civil', text, flags=re.IGNORECASE)
-        text = re.sub(r'@polaborprl\b', 'Policia Municipal', text, flags=re.IGNORECASE)
+        text = _KNOWN_MENTION_RE.sub(lambda m: KNOWN_MENTIONS[m.group(1).lower()], text)
 
         # Eliminar otras menciones @ desconocidas
-        text = re.sub(r'@\w+', '', text)
+        text = _MENTION_RE.sub('', text)
 
         # Convertir hashtags en palabras (quitar # pero mantener contenido)
-        text = re.sub(r'#(\w+)', r'\1', text)
+        text = _HASHTAG_RE.sub(r'\1', text)
 
         # Eliminar emojis
-        text = re.sub(r'[\U00010000-\U0010ffff]', '', text)
+        text = _strip_astral(text)
 
         # Limpiar espacios
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WS_RE.sub(' ', text).strip()
 
         return text
 
@@ -387,8 +916,32 @@ Responde SOLO con el texto reformulado, nada más."""
             include_hashtags: Si incluir hashtags
             max_length: Longitud máxima del texto (sin hashtags)
         """
-        rewritten = self.rewrite(original_text)
+        return self._format_caption(self.rewrite(original_text), include_hashtags, max_length)
+
+    async def generate_caption_async(
+        self,
+        original_text: str,
+        include_hashtags: bool = True,
+        max_length: int = 150
+    ) -> str:
+        """Genera el caption sin bloquear el event loop (ver generate_caption)"""
+        rewritten = await self.rewrite_async(original_text)
+        return self._format_caption(rewritten, include_hashtags, max_length)
+
+    def generate_captions(
+        self,
+        original_texts: List[str],
+        include_hashtags: bool = True,
+        max_length: int = 150
+    ) -> List[str]:
+        """Genera los captions de varios tweets a la vez (ver generate_caption)"""
+        return [
+            self._format_caption(rewritten, include_hashtags, max_length)
+            for rewritten in self.rewrite_batch(original_texts)
+        ]
 
+    def _format_caption(self, rewritten: str, include_hashtags: bool, max_length: int) -> str:
+        """Separa hashtags, trunca el texto y monta el caption final"""
         # Separar texto y hashtags
         if '#' in rewritten:
             parts = rewritten.split('#', 1)
@@ -7,57 +7,97 @@ import os
 import time
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union
 from datetime import datetime
+from urllib.parse import urlsplit
 
 from loguru import logger
 
 # Intentar importar Playwright
 try:
-    from playwright.sync_api import sync_playwright, Page, Browser
+    from playwright.sync_api import sync_playwright, Page, Browser, BrowserContext
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
     logger.warning("Playwright no instalado. Ejecuta: pip install playwright && playwright install")
 
+# orjson es opcional: más rápido que json para las cookies
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Caracteres del caption que se escriben en el editor de TikTok
+CAPTION_MAX_LENGTH = 100
+
+# Condición de la página de upload ya resuelta: o aparece el formulario
+# o TikTok redirige al login
+UPLOAD_OR_LOGIN_JS = """() => location.href.toLowerCase().includes('login')
+    || document.querySelector('[class*="upload"], [data-e2e*="upload"]') !== null"""
+
+# Condición de publicación terminada: se sale de la página de upload o
+# aparece alguno de los textos indicados
+PUBLISH_DONE_JS = """(texts) => !location.href.includes('/upload')
+    || texts.some(t => document.body.innerText.toLowerCase().includes(t))"""
+
+# Rutas de las peticiones de subida y publicación: un 429 solo cuenta como
+# límite en estas (no en analítica ni telemetría de la página)
+PUBLISH_ENDPOINTS = ('/upload', '/project/post', '/post/item')
+
 
 class TikTokUploader:
     """Sube videos a TikTok usando automatización de navegador"""
 
     def __init__(
         self,
-        cookies_file: str = "./data/tiktok_cookies.json",
+        cookies_file: Union[str, Path] = "./data/tiktok_cookies.json",
         headless: bool = False  # False para ver el navegador la primera vez
     ):
         self.cookies_file = Path(cookies_file)
         self.cookies_file.parent.mkdir(parents=True, exist_ok=True)
         self.headless = headless
+        self._playwright = None
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
 
     def _load_cookies(self) -> list:
         """Carga cookies guardadas"""
         if self.cookies_file.exists():
             try:
-                with open(self.cookies_file, 'r') as f:
-                    return json.load(f)
+                data = self.cookies_file.read_bytes()
+                return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
             except Exception as e:
                 logger.warning(f"Error cargando cookies: {e}")
         return []
 
     def _save_cookies(self, cookies: list):
-        """Guarda cookies para futuros usos"""
-        with open(self.cookies_file, 'w') as f:
-            json.dump(cookies, f)
+        """
+        Guarda cookies para futuros usos.
+        Se escribe a un temporal y se renombra para no dejar el fichero a medias.
+        """
+        data = orjson.dumps(cookies) if ORJSON_AVAILABLE else json.dumps(cookies).encode()
+
+        tmp_file = self.cookies_file.with_suffix('.tmp')
+        tmp_file.write_bytes(data)
+        tmp_file.replace(self.cookies_file)
         logger.info("Cookies guardadas")
 
-    def _init_browser(self):
-        """Inicializa el navegador"""
+    def get_or_create_context(self) -> Tuple['Browser', 'BrowserContext']:
+        """
+        Devuelve el navegador y el contexto compartidos.
+        Chromium se lanza solo la primera vez; las cookies se cargan al crear el contexto.
+        """
+        if self.context is not None:
+            return self.browser, self.context
+
         if not PLAYWRIGHT_AVAILABLE:
             raise RuntimeError("Playwright no está instalado")
 
-        playwright = sync_playwright().start()
-        self.browser = playwright.chromium.launch(
+        self._playwright = sync_playwright().start()
+        self.browser = self._playwright.chromium.launch(
             headless=self.headless,
             args=[
                 '--disable-blink-features=AutomationControlled',
@@ -65,7 +105,7 @@ class TikTokUploader:
             ]
         )
 
-        context = self.browser.new_context(
+        self.context = self.browser.new_context(
             viewport={'width': 1280, 'height': 800},
             user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         )
@@ -73,11 +113,71 @@ class TikTokUploader:
         # Cargar cookies si existen
         cookies = self._load_cookies()
         if cookies:
-            context.add_cookies(cookies)
+            self.context.add_cookies(cookies)
             logger.info("Cookies cargadas")
 
+        return self.browser, self.context
+
+    def _init_browser(self):
+        """Inicializa el navegador (solo la primera vez)"""
+        if self.page is not None:
+            return
+
+        _, context = self.get_or_create_context()
         self.page = context.new_page()
 
+    def __enter__(self) -> 'TikTokUploader':
+        """Abre el navegador una vez para varias subidas seguidas"""
+        self._init_browser()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _wait(self, wait_fn, *args, **kwargs) -> bool:
+        """
+        Ejecuta una espera de Playwright (wait_for_selector, wait_for_function...)
+
+        Returns:
+            False si venció el timeout en vez de cumplirse la condición
+        """
+        try:
+            wait_fn(*args, **kwargs)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+
+    def _find_file_input(self, page: 'Page', timeout: float = 15):
+        """Espera al input de archivo en la página o en sus iframes"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            # Intentar encontrar el input directamente
+            file_input = page.query_selector('input[type="file"]')
+            if file_input:
+                return file_input
+
+            # TikTok usa un iframe para el upload
+            for frame in page.frames:
+                file_input = frame.query_selector('input[type="file"]')
+                if file_input:
+                    return file_input
+
+            if time.monotonic() >= deadline:
+                return None
+            page.wait_for_timeout(250)
+
+    def warmup(self):
+        """Abre el navegador por adelantado para no pagar el arranque en la primera subida"""
+        if self.page:
+            return
+
+        try:
+            self._init_browser()
+            logger.info("Navegador listo")
+        except Exception as e:
+            logger.warning(f"No se pudo preparar el navegador: {e}")
+
     def login_manual(self) -> bool:
         """
         Abre el navegador para login manual.
@@ -99,7 +199,7 @@ class TikTokUploader:
 
         # Verificar si el login fue exitoso
         self.page.goto("https://www.tiktok.com/upload")
-        time.sleep(3)
+        self._wait(self.page.wait_for_function, UPLOAD_OR_LOGIN_JS, timeout=10000)
 
         if "login" in self.page.url.lower():
             logger.error("No se detectó sesión iniciada")
@@ -119,7 +219,7 @@ class TikTokUploader:
 
         try:
             self.page.goto("https://www.tiktok.com/upload", timeout=30000)
-            time.sleep(3)
+            self._wait(self.page.wait_for_function, UPLOAD_OR_LOGIN_JS, timeout=10000)
 
             # Si nos redirige a login, no estamos logueados
             if "login" in self.page.url.lower():
@@ -155,7 +255,8 @@ class TikTokUploader:
             'video_path': video_path,
             'caption': caption,
             'error': None,
-            'url': None
+            'url': None,
+            'rate_limited': False
         }
 
         if not Path(video_path).exists():
@@ -166,6 +267,7 @@ class TikTokUploader:
         if not self.page:
             self._init_browser()
 
+        page = None
         try:
             # Verificar login
             if not self.is_logged_in():
@@ -174,24 +276,26 @@ class TikTokUploader:
                     result['error'] = "No se pudo iniciar sesión"
                     return result
 
-            # Ir a la página de upload
-            logger.info("Navegando a página de upload...")
-            self.page.goto("https://www.tiktok.com/upload?lang=es", wait_until="networkidle")
-            time.sleep(3)
+            # Cada subida usa su propia pestaña en el contexto compartido
+            page = self.context.new_page()
 
-            # Buscar el input de archivo
-            # TikTok usa un iframe para el upload
-            file_input = None
+            # Respuestas 429 de TikTok a la subida o la publicación
+            throttled = []
 
-            # Intentar encontrar el input directamente
-            file_input = self.page.query_selector('input[type="file"]')
+            def on_response(response):
+                if response.status == 429 and any(
+                    endpoint in urlsplit(response.url).path for endpoint in PUBLISH_ENDPOINTS
+                ):
+                    throttled.append(response.url)
 
-            if not file_input:
-                # Buscar en iframes
-                for frame in self.page.frames:
-                    file_input = frame.query_selector('input[type="file"]')
-                    if file_input:
-                        break
+            page.on("response", on_response)
+
+            # Ir a la página de upload
+            logger.info("Navegando a página de upload...")
+            page.goto("https://www.tiktok.com/upload?lang=es", wait_until="networkidle")
+
+            # Buscar el input de archivo (en cuanto aparezca)
+            file_input = self._find_file_input(page)
 
             if not file_input:
                 result['error'] = "No se encontró el input de archivo"
@@ -202,10 +306,6 @@ class TikTokUploader:
             logger.info(f"Subiendo video: {video_path}")
             file_input.set_input_files(video_path)
 
-            # Esperar a que se procese el video
-            logger.info("Esperando procesamiento del video...")
-            time.sleep(10)  # TikTok tarda en procesar
-
             # Buscar el campo de caption
             caption_selectors = [
                 '[data-e2e="caption-input"]',
@@ -214,31 +314,28 @@ class TikTokUploader:
                 '[data-contents="true"]',
             ]
 
-            caption_field = None
-            for selector in caption_selectors:
-                caption_field = self.page.query_selector(selector)
-                if caption_field:
-                    break
+            # Esperar a que se procese el video (aparece el editor de caption).
+            # Un solo locator con todos los selectores: Playwright los busca
+            # en el navegador en vez de probarlos uno a uno
+            logger.info("Esperando procesamiento del video...")
+            caption_field = page.locator(', '.join(caption_selectors)).first
 
-            if caption_field:
+            if self._wait(caption_field.wait_for, state='visible', timeout=30000):
                 # Limpiar y escribir caption
                 caption_field.click()
-                self.page.keyboard.press('Control+A')
-                self.page.keyboard.press('Backspace')
+                page.keyboard.press('Control+A')
+                page.keyboard.press('Backspace')
                 time.sleep(0.5)
 
-                # Escribir el caption (TikTok a veces tiene problemas con type directo)
-                for char in caption:
-                    self.page.keyboard.type(char, delay=50)
-                    if len(caption) > 100:
-                        break  # Evitar captions muy largos
+                # Escribir el caption de una vez (evitar captions muy largos)
+                page.keyboard.insert_text(caption[:CAPTION_MAX_LENGTH])
 
                 logger.info("Caption añadido")
             else:
                 logger.warning("No se encontró campo de caption")
 
-            # Esperar un poco más para que todo se cargue
-            time.sleep(5)
+            # Esperar a que el botón de publicar se habilite
+            self._wait(page.wait_for_selector, '[data-e2e="post-button"]:not([disabled])', timeout=30000)
 
             # Buscar y hacer click en el botón de publicar
             publish_selectors = [
@@ -248,22 +345,12 @@ class TikTokUploader:
                 '[class*="post-button"]',
             ]
 
-            publish_button = None
-            for selector in publish_selectors:
-                try:
-                    publish_button = self.page.query_selector(selector)
-                    if publish_button and publish_button.is_visible():
-                        break
-                except:
-                    continue
+            publish_button = page.locator(', '.join(publish_selectors)).first
 
-            if publish_button:
+            if self._wait(publish_button.wait_for, state='visible', timeout=5000):
                 logger.info("Publicando video...")
                 publish_button.click()
 
-                # Esperar confirmación
-                time.sleep(10)
-
                 # Verificar si se publicó
                 success_indicators = [
                     'Publicado',
@@ -272,11 +359,39 @@ class TikTokUploader:
                     'subido',
                 ]
 
-                page_text = self.page.content().lower()
+                # Avisos de que se está publicando demasiado rápido
+                rate_limit_indicators = [
+                    'demasiadas',
+                    'too many',
+                    'inténtalo más tarde',
+                    'try again later',
+                ]
+
+                # Esperar confirmación (o aviso de límite)
+                self._wait(
+                    page.wait_for_function,
+                    PUBLISH_DONE_JS,
+                    arg=[ind.lower() for ind in success_indicators + rate_limit_indicators],
+                    timeout=30000
+                )
+
+                # Solo el texto visible: el HTML completo trae scripts y
+                # traducciones con estas mismas frases
+                page_text = page.inner_text('body').lower()
+
+                # El límite solo sirve para espaciar las siguientes subidas:
+                # si el video se publicó, sigue contando como publicado
+                result['rate_limited'] = bool(throttled) or any(
+                    ind in page_text for ind in rate_limit_indicators
+                )
+
                 if any(ind.lower() in page_text for ind in success_indicators):
                     result['success'] = True
-                    result['url'] = f"https://www.tiktok.com/@{self._get_username()}"
+                    result['url'] = f"https://www.tiktok.com/@{self._get_username(page)}"
                     logger.success("Video publicado exitosamente")
+                elif result['rate_limited']:
+                    result['error'] = "TikTok ha limitado las publicaciones"
+                    logger.warning(result['error'])
                 else:
                     # Puede que esté en proceso
                     result['success'] = True
@@ -289,14 +404,33 @@ class TikTokUploader:
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"Error subiendo video: {e}")
+        finally:
+            if page:
+                page.close()
 
         return result
 
-    def _get_username(self) -> str:
+    def upload_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sube varios videos seguidos con el mismo navegador
+
+        Args:
+            items: Lista de dicts con los argumentos de upload_video
+                   (video_path, caption y opcionalmente schedule_time)
+
+        Returns:
+            Resultados de cada subida, en el mismo orden
+        """
+        results = []
+        for item in items:
+            results.append(self.upload_video(**item))
+        return results
+
+    def _get_username(self, page: 'Page') -> str:
         """Intenta obtener el nombre de usuario actual"""
         try:
             # Buscar el username en la página
-            username_elem = self.page.query_selector('[data-e2e="profile-link"]')
+            username_elem = page.query_selector('[data-e2e="profile-link"]')
             if username_elem:
                 href = username_elem.get_attribute('href')
                 if href and '/@' in href:
@@ -305,11 +439,28 @@ class TikTokUploader:
             pass
         return "sucesoshoy"
 
+    def keepalive(self):
+        """Mantiene activa la sesión del navegador entre publicaciones"""
+        if not self.page:
+            return
+
+        try:
+            self.page.evaluate("1")
+        except Exception as e:
+            logger.debug(f"Keepalive del navegador falló: {e}")
+
     def close(self):
         """Cierra el navegador"""
         if self.browser:
             self.browser.close()
             logger.info("Navegador cerrado")
+        if self._playwright:
+            self._playwright.stop()
+
+        self._playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
 
 
 class TikTokUploaderAPI:
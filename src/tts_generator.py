@@ -4,21 +4,87 @@ Genera audio con voz sintetica para los videos
 """
 
 import os
+import re
 import sys
+import shutil
+import asyncio
+import hashlib
+import threading
 import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Union
 
 from loguru import logger
 
 # Intentar importar edge-tts (gratuito, voces de Microsoft)
 try:
     import edge_tts
-    import asyncio
     EDGE_TTS_AVAILABLE = True
 except ImportError:
     EDGE_TTS_AVAILABLE = False
 
+# mutagen es opcional: lee la duración del mp3 sin lanzar ffprobe
+try:
+    from mutagen.mp3 import MP3
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+# Conexiones simultáneas con edge-tts (por debajo del límite de abuso)
+TTS_MAX_CONCURRENCY = 8
+
+# Los textos más largos se generan frase a frase en paralelo
+TTS_SPLIT_MIN_CHARS = 200
+
+# Audios guardados en la caché por texto (se borran los menos usados)
+TTS_CACHE_MAX_FILES = 200
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+# URLs, menciones, hashtags y emojis en una sola pasada
+_CLEAN_RE = re.compile(r'https?://\S+|@\w+|#\w+|[\U00010000-\U0010ffff]')
+
+# Bitrates (kbps) de MPEG Layer III según la versión (MPEG1 / MPEG2 y 2.5)
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def _mp3_duration(audio_path: str) -> float:
+    """
+    Duración de un mp3 de bitrate constante (como los de edge-tts) a partir
+    del primer frame: tamaño * 8 / bitrate
+
+    Returns:
+        0 si no se encuentra un frame válido
+    """
+    with open(audio_path, 'rb') as f:
+        head = f.read(64 * 1024)
+        size = os.fstat(f.fileno()).st_size
+
+    # Saltar la etiqueta ID3v2 si la hay
+    start = 0
+    if head[:3] == b'ID3' and len(head) >= 10:
+        start = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+        with open(audio_path, 'rb') as f:
+            f.seek(start)
+            head = f.read(64 * 1024)
+
+    for i in range(len(head) - 3):
+        if head[i] != 0xFF or head[i + 1] & 0xE0 != 0xE0:
+            continue
+        version = (head[i + 1] >> 3) & 0x03
+        layer = (head[i + 1] >> 1) & 0x03
+        bitrate_index = head[i + 2] >> 4
+        if layer != 1 or version not in _MP3_BITRATES or not 0 < bitrate_index < 15:
+            continue
+        bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+        return (size - start - i) * 8 / bitrate
+
+    return 0
+
 
 class TTSGenerator:
     """Genera audio con voz sintetica"""
@@ -31,7 +97,7 @@ class TTSGenerator:
         'dalia': 'es-MX-DaliaNeural',       # Mujer mexicana
     }
 
-    def __init__(self, voice: str = 'elena', output_dir: str = "./audio"):
+    def __init__(self, voice: str = 'elena', output_dir: Union[str, Path] = "./audio"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -41,8 +107,46 @@ class TTSGenerator:
         else:
             self.voice = voice  # Permitir voz personalizada
 
+        # Event loop propio en un hilo, creado al primer audio y reutilizado
+        # en los siguientes (asyncio.run crearía y cerraría uno por llamada)
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
         logger.info(f"TTS configurado con voz: {self.voice}")
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self, coro):
+        """Ejecuta una corrutina en el event loop del generador y espera el resultado"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="tts-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """Detiene el event loop del generador"""
+        with self._loop_lock:
+            if self._loop is None:
+                return
+
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+            self._loop_thread = None
+
     def generate_audio(self, text: str, output_name: str = "tts_audio") -> Optional[str]:
         """
         Genera audio a partir de texto
@@ -54,10 +158,21 @@ class TTSGenerator:
         Returns:
             Ruta al archivo de audio generado o None si falla
         """
-        if not EDGE_TTS_AVAILABLE:
-            logger.warning("edge-tts no instalado. Instalar con: pip install edge-tts")
-            return None
+        output_path = self.output_dir / f"{output_name}.mp3"
 
+        # Con el audio ya en la caché no hace falta arrancar el event loop
+        clean_text = self._clean_text(text)
+        if clean_text and self._restore_cached(self._cache_path(clean_text), output_path):
+            logger.info(f"Audio reutilizado de la caché: {output_path.name}")
+            return str(output_path)
+
+        return self._run(self.generate_audio_async(text, output_name))
+
+    async def generate_audio_async(self, text: str, output_name: str = "tts_audio") -> Optional[str]:
+        """
+        Como generate_audio, pero en el event loop de quien llama: así la voz
+        se puede pedir a la vez que otras llamadas de red (asyncio.gather)
+        """
         output_path = self.output_dir / f"{output_name}.mp3"
 
         try:
@@ -68,14 +183,19 @@ class TTSGenerator:
                 logger.warning("Texto vacio, no se genera audio")
                 return None
 
+            # Un audio en la caché no necesita edge-tts
+            if self._restore_cached(self._cache_path(clean_text), output_path):
+                logger.info(f"Audio reutilizado de la caché: {output_path.name}")
+                return str(output_path)
+
+            if not EDGE_TTS_AVAILABLE:
+                logger.warning("edge-tts no instalado. Instalar con: pip install edge-tts")
+                return None
+
             logger.info(f"Generando audio para: {clean_text[:50]}...")
 
             # Generar audio usando edge-tts
-            async def generate():
-                communicate = edge_tts.Communicate(clean_text, self.voice)
-                await communicate.save(str(output_path))
-
-            asyncio.run(generate())
+            await self._generate_many([(clean_text, output_path)])
 
             if output_path.exists():
                 logger.success(f"Audio generado: {output_path}")
@@ -88,29 +208,167 @@ class TTSGenerator:
             logger.error(f"Error generando audio: {e}")
             return None
 
-    def _clean_text(self, text: str) -> str:
-        """Limpia el texto para TTS"""
-        import re
+    def generate_audio_batch(
+        self,
+        texts: List[str],
+        output_names: Optional[List[str]] = None
+    ) -> List[Optional[str]]:
+        """
+        Genera varios audios a la vez (edge-tts admite conexiones en paralelo)
+
+        Args:
+            texts: Textos a convertir en voz
+            output_names: Nombres de los archivos de salida (sin extension)
+
+        Returns:
+            Ruta de cada audio generado, o None si falla, en el mismo orden
+        """
+        if not EDGE_TTS_AVAILABLE:
+            logger.warning("edge-tts no instalado. Instalar con: pip install edge-tts")
+            return [None] * len(texts)
+
+        if output_names is None:
+            output_names = [f"tts_audio_{i}" for i in range(len(texts))]
+
+        results = [None] * len(texts)
+        jobs, indices = [], []
+        for i, (text, name) in enumerate(zip(texts, output_names)):
+            clean_text = self._clean_text(text)
+            if clean_text:
+                jobs.append((clean_text, self.output_dir / f"{name}.mp3"))
+                indices.append(i)
+
+        if not jobs:
+            logger.warning("Textos vacios, no se genera audio")
+            return results
+
+        logger.info(f"Generando {len(jobs)} audios...")
+        outcomes = self._run(self._generate_many(jobs, return_exceptions=True))
+
+        for i, (_, output_path), outcome in zip(indices, jobs, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Error generando audio {output_path.name}: {outcome}")
+            elif output_path.exists():
+                results[i] = str(output_path)
+
+        logger.success(f"Audios generados: {sum(r is not None for r in results)}/{len(texts)}")
+        return results
+
+    async def _generate_many(self, jobs: list, return_exceptions: bool = False) -> list:
+        """Genera los audios (texto limpio, ruta) con un máximo de conexiones a la vez"""
+        semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+        return await asyncio.gather(
+            *(self._generate_file(text, path, semaphore) for text, path in jobs),
+            return_exceptions=return_exceptions
+        )
+
+    async def _generate_file(self, clean_text: str, output_path: Path, semaphore: asyncio.Semaphore):
+        """
+        Genera un mp3. Los textos largos van frase a frase en paralelo y se
+        unen en orden (los frames MPEG de edge-tts se concatenan sin más).
+        Se escribe en temporales para no dejar un mp3 a medias
+        """
+        cache_path = self._cache_path(clean_text)
+        if self._restore_cached(cache_path, output_path):
+            logger.info(f"Audio reutilizado de la caché: {output_path.name}")
+            return
 
-        # Eliminar URLs
-        text = re.sub(r'https?://\S+', '', text)
+        sentences = [clean_text]
+        if len(clean_text) >= TTS_SPLIT_MIN_CHARS:
+            sentences = [s for s in _SENTENCE_RE.split(clean_text) if s]
 
-        # Eliminar menciones
-        text = re.sub(r'@\w+', '', text)
+        parts = [output_path.with_name(f"{output_path.name}.part{i}") for i in range(len(sentences))]
+        tmp_path = output_path.with_name(output_path.name + '.part')
 
-        # Eliminar hashtags
-        text = re.sub(r'#\w+', '', text)
+        try:
+            await asyncio.gather(*(
+                self._stream_to_file(sentence, part, semaphore)
+                for sentence, part in zip(sentences, parts)
+            ))
+
+            if len(parts) == 1:
+                os.replace(parts[0], output_path)
+            else:
+                with open(tmp_path, 'wb') as out:
+                    for part in parts:
+                        with open(part, 'rb') as f:
+                            shutil.copyfileobj(f, out)
+                os.replace(tmp_path, output_path)
+        finally:
+            for path in parts + [tmp_path]:
+                path.unlink(missing_ok=True)
+
+        self._store_cached(output_path, cache_path)
+
+    def _cache_path(self, clean_text: str) -> Path:
+        """Ruta en la caché del audio de este texto con esta voz"""
+        key = hashlib.blake2b(f"{self.voice}\n{clean_text}".encode('utf-8'), digest_size=16).hexdigest()
+        return self.output_dir / "cache" / f"{key}.mp3"
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path):
+        """Enlace duro si se puede (no copia bytes); si no, copia. Sustituye dst"""
+        tmp_path = dst.with_name(dst.name + '.link')
+        tmp_path.unlink(missing_ok=True)
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
 
-        # Eliminar emojis
-        text = re.sub(r'[\U00010000-\U0010ffff]', '', text)
+    def _restore_cached(self, cache_path: Path, output_path: Path) -> bool:
+        """Pone en output_path el audio cacheado, si existe"""
+        if not cache_path.exists():
+            return False
 
-        # Limpiar espacios multiples
-        text = re.sub(r'\s+', ' ', text).strip()
+        try:
+            self._link_or_copy(cache_path, output_path)
+            # Marcar como usado para la limpieza por antigüedad
+            os.utime(cache_path)
+            return True
+        except OSError as e:
+            logger.debug(f"No se pudo usar el audio cacheado: {e}")
+            return False
+
+    def _store_cached(self, output_path: Path, cache_path: Path):
+        """Guarda el audio generado en la caché y borra los menos usados"""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._link_or_copy(output_path, cache_path)
+
+            cached = sorted(cache_path.parent.glob('*.mp3'), key=lambda p: p.stat().st_mtime)
+            for path in cached[:-TTS_CACHE_MAX_FILES]:
+                path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.debug(f"No se pudo guardar el audio en la caché: {e}")
+
+    async def _stream_to_file(self, text: str, path: Path, semaphore: asyncio.Semaphore):
+        """Escribe el audio de edge-tts según llegan los fragmentos"""
+        async with semaphore:
+            communicate = edge_tts.Communicate(text, self.voice)
+            with open(path, 'wb') as f:
+                async for chunk in communicate.stream():
+                    if chunk["type"] == "audio":
+                        f.write(chunk["data"])
 
-        return text
+    def _clean_text(self, text: str) -> str:
+        """Limpia el texto para TTS"""
+        # Eliminar URLs, menciones, hashtags y emojis, y limpiar espacios
+        # multiples (split/join en C colapsa y recorta en un solo paso)
+        return ' '.join(_CLEAN_RE.sub('', text).split())
 
     def get_audio_duration(self, audio_path: str) -> float:
         """Obtiene la duracion del audio en segundos"""
+        # Leer la cabecera del mp3 es mucho más barato que lanzar ffprobe
+        try:
+            if MUTAGEN_AVAILABLE:
+                return MP3(audio_path).info.length
+            duration = _mp3_duration(audio_path)
+            if duration:
+                return duration
+        except Exception as e:
+            logger.debug(f"No se pudo leer la cabecera de {audio_path}: {e}")
+
         try:
             result = subprocess.run(
                 [
@@ -145,11 +403,11 @@ if __name__ == "__main__":
         print("Instala edge-tts: pip install edge-tts")
         sys.exit(1)
 
-    tts = TTSGenerator(voice='elena')
-    audio = tts.generate_audio(
-        "Bomberos del Ayuntamiento de Madrid trabajan en un incendio en la calle Alcala.",
-        "test_audio"
-    )
+    with TTSGenerator(voice='elena') as tts:
+        audio = tts.generate_audio(
+            "Bomberos del Ayuntamiento de Madrid trabajan en un incendio en la calle Alcala.",
+            "test_audio"
+        )
 
     if audio:
         print(f"Audio generado: {audio}")
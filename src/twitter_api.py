@@ -4,15 +4,46 @@ Requiere credenciales de desarrollador de Twitter/X
 """
 
 import os
-import json
 import time
+import random
+import threading
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Union
 
-import requests
 from loguru import logger
 
+# Relativo dentro del paquete src; los scripts (bot.py, test_tweet.py)
+# ponen src en sys.path e importan los módulos sueltos
+try:
+    from .http_session import get_session
+    from .rate_limiter import RateLimiter
+    from .seen_tweets import SeenTweetsStore
+except ImportError:
+    from http_session import get_session
+    from rate_limiter import RateLimiter
+    from seen_tweets import SeenTweetsStore
+
+# orjson es opcional: parsea el cuerpo de la respuesta directamente desde bytes
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Reintentos tras un 429 antes de rendirse
+MAX_RETRIES = 3
+
+# Límite de la API para leer timelines (450 peticiones cada 15 min),
+# compartido por todos los clientes para frenar antes de recibir un 429
+_API_LIMITER = RateLimiter(max_rate=450, time_period=900)
+
+# Peticiones en curso: si otro cliente pide lo mismo a la vez, espera a
+# la respuesta de la primera en vez de gastar otra llamada de la cuota
+_inflight: Dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
 
 class TwitterAPI:
     """Cliente para la API v2 de Twitter/X"""
@@ -26,7 +57,7 @@ class TwitterAPI:
         api_secret: Optional[str] = None,
         access_token: Optional[str] = None,
         access_token_secret: Optional[str] = None,
-        data_dir: str = "./data"
+        data_dir: Union[str, Path] = "./data"
     ):
         self.bearer_token = bearer_token or os.getenv('TWITTER_BEARER_TOKEN')
         self.api_key = api_key or os.getenv('TWITTER_API_KEY')
@@ -36,8 +67,8 @@ class TwitterAPI:
 
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.seen_tweets_file = self.data_dir / "seen_tweets.json"
-        self.seen_tweets = self._load_seen_tweets()
+        self.seen_tweets_file = self.data_dir / "seen_tweets.log"
+        self.seen_tweets = SeenTweetsStore(self.seen_tweets_file)
 
         # Cache de user_id
         self._user_id_cache = {}
@@ -45,25 +76,24 @@ class TwitterAPI:
         if not self.bearer_token:
             raise ValueError("Se requiere TWITTER_BEARER_TOKEN")
 
-    def _load_seen_tweets(self) -> set:
-        """Carga los IDs de tweets ya procesados"""
-        if self.seen_tweets_file.exists():
-            try:
-                with open(self.seen_tweets_file, 'r') as f:
-                    return set(json.load(f))
-            except Exception as e:
-                logger.warning(f"Error cargando tweets vistos: {e}")
-        return set()
-
-    def _save_seen_tweets(self):
-        """Guarda los IDs de tweets procesados"""
-        with open(self.seen_tweets_file, 'w') as f:
-            json.dump(list(self.seen_tweets), f)
+        # Sesión compartida con el resto de módulos (los 5xx se reintentan
+        # en la sesión, los 429 se tratan a mano)
+        self.session = get_session()
+        self._headers = self._get_headers()
 
     def mark_as_seen(self, tweet_id: str):
         """Marca un tweet como procesado"""
         self.seen_tweets.add(tweet_id)
-        self._save_seen_tweets()
+        self.seen_tweets.flush()
+
+    def mark_as_seen_bulk(self, tweet_ids):
+        """Marca varios tweets como procesados con una sola escritura"""
+        self.seen_tweets.update(tweet_ids)
+        self.seen_tweets.flush()
+
+    def flush(self):
+        """Guarda en disco los tweets vistos pendientes"""
+        self.seen_tweets.flush()
 
     def _get_headers(self) -> dict:
         """Genera headers para las peticiones"""
@@ -78,34 +108,74 @@ class TwitterAPI:
         params: Optional[dict] = None,
         method: str = "GET"
     ) -> Optional[dict]:
-        """Realiza una petición a la API"""
-        url = f"{self.BASE_URL}/{endpoint}"
+        """Realiza una petición a la API (las idénticas simultáneas se unen en una)"""
+        key = (self.bearer_token, method, endpoint, frozenset((params or {}).items()))
+
+        with _inflight_lock:
+            future = _inflight.get(key)
+            owner = future is None
+            if owner:
+                future = _inflight[key] = Future()
+
+        if not owner:
+            logger.debug(f"Esperando petición en curso: {endpoint}")
+            return future.result()
 
         try:
-            if method == "GET":
-                response = requests.get(
-                    url,
-                    headers=self._get_headers(),
-                    params=params,
-                    timeout=30
-                )
-            else:
-                response = requests.post(
-                    url,
-                    headers=self._get_headers(),
-                    json=params,
-                    timeout=30
-                )
+            result = self._request(endpoint, params, method)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+
+    def _request(
+        self,
+        endpoint: str,
+        params: Optional[dict],
+        method: str
+    ) -> Optional[dict]:
+        """Petición real a la API, con reintentos si hay rate limit"""
+        url = f"{self.BASE_URL}/{endpoint}"
 
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 429:
-                # Rate limit
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                _API_LIMITER.acquire()
+
+                if method == "GET":
+                    response = self.session.get(
+                        url,
+                        headers=self._headers,
+                        params=params,
+                        timeout=30
+                    )
+                else:
+                    response = self.session.post(
+                        url,
+                        headers=self._headers,
+                        json=params,
+                        timeout=30
+                    )
+
+                if response.status_code != 429:
+                    break
+
+                if attempt == MAX_RETRIES:
+                    logger.error("Rate limit alcanzado, sin más reintentos")
+                    return None
+
+                # Rate limit: esperar al reset con algo de jitter para no
+                # reintentar todos a la vez justo en el mismo segundo
                 reset_time = int(response.headers.get('x-rate-limit-reset', time.time() + 60))
-                wait_time = reset_time - int(time.time()) + 1
-                logger.warning(f"Rate limit alcanzado. Esperando {wait_time}s...")
+                wait_time = max(1, reset_time - time.time()) + random.uniform(0, 2)
+                logger.warning(f"Rate limit alcanzado. Esperando {wait_time:.0f}s...")
                 time.sleep(wait_time)
-                return self._make_request(endpoint, params, method)
+
+            if response.status_code == 200:
+                return orjson.loads(response.content) if ORJSON_AVAILABLE else response.json()
             else:
                 logger.error(f"Error API {response.status_code}: {response.text}")
                 return None
@@ -220,9 +290,12 @@ class TwitterAPI:
         """
         tweets = self.get_user_tweets(username, max_results=10, since_minutes=120)
 
+        # Una diferencia de conjuntos en vez de consultar ID a ID
+        new_ids = self.seen_tweets.unseen(tweet['id'] for tweet in tweets)
+
         new_tweets = []
         for tweet in tweets:
-            if tweet['id'] not in self.seen_tweets:
+            if tweet['id'] in new_ids:
                 new_tweets.append(tweet)
                 logger.info(f"Nuevo tweet con video: {tweet['id']}")
 
@@ -239,7 +312,7 @@ class TwitterMonitorAPI:
         self,
         username: str = "EmergenciasMad",
         bearer_token: Optional[str] = None,
-        data_dir: str = "./data"
+        data_dir: Union[str, Path] = "./data"
     ):
         self.username = username
         self.api = TwitterAPI(
@@ -255,6 +328,14 @@ class TwitterMonitorAPI:
         """Marca un tweet como procesado"""
         self.api.mark_as_seen(tweet_id)
 
+    def mark_as_seen_bulk(self, tweet_ids):
+        """Marca varios tweets como procesados con una sola escritura"""
+        self.api.mark_as_seen_bulk(tweet_ids)
+
+    def flush(self):
+        """Guarda en disco los tweets vistos pendientes"""
+        self.api.flush()
+
     def get_tweet_url(self, tweet_id: str) -> str:
         """Construye la URL del tweet"""
         return f"https://twitter.com/{self.username}/status/{tweet_id}"
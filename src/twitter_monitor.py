@@ -7,15 +7,34 @@ import os
 import re
 import json
 import time
+import random
 import hashlib
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Union
 
-import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from loguru import logger
 
+# Relativo dentro del paquete src; los scripts (bot.py, test_tweet.py)
+# ponen src en sys.path e importan los módulos sueltos
+try:
+    from .http_session import HEAD_KWARGS, get_session
+    from .seen_tweets import SeenTweetsStore
+except ImportError:
+    from http_session import HEAD_KWARGS, get_session
+    from seen_tweets import SeenTweetsStore
+
+# orjson es opcional: más rápido que json para la salida de yt-dlp
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Instancias de Nitter públicas (alternativa a la API de Twitter)
 NITTER_INSTANCES = [
     "https://nitter.poast.org",
@@ -25,111 +44,218 @@ NITTER_INSTANCES = [
     "https://nitter.unixfox.eu",
 ]
 
+_STATUS_RE = re.compile(r'/status/(\d+)')
+
+# User-Agents de navegadores reales: cada petición lleva uno al azar para
+# que los sondeos no parezcan siempre el mismo cliente
+_UA_POOL = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+)
+
+
+def _browser_headers() -> dict:
+    """Cabeceras de navegador con un User-Agent del pool"""
+    return {
+        "User-Agent": random.choice(_UA_POOL),
+        "Accept": "text/html,application/xhtml+xml,*/*",
+        "Accept-Language": "es-ES,es;q=0.9",
+    }
+
+
+# Segundos que se espera a la fuente más lenta para unir sus tweets
+HEDGE_MERGE_WINDOW = 0.1
+
 
 class TwitterMonitor:
     """Monitorea una cuenta de Twitter/X para detectar nuevos tweets con video"""
 
-    def __init__(self, username: str, data_dir: str = "./data"):
+    def __init__(self, username: str, data_dir: Union[str, Path] = "./data"):
         self.username = username
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.seen_tweets_file = self.data_dir / "seen_tweets.json"
-        self.seen_tweets = self._load_seen_tweets()
+        self.seen_tweets_file = self.data_dir / "seen_tweets.log"
+        self.seen_tweets = SeenTweetsStore(self.seen_tweets_file)
         self.working_instance = None
 
-    def _load_seen_tweets(self) -> set:
-        """Carga los IDs de tweets ya procesados"""
-        if self.seen_tweets_file.exists():
-            try:
-                with open(self.seen_tweets_file, 'r') as f:
-                    return set(json.load(f))
-            except Exception as e:
-                logger.warning(f"Error cargando tweets vistos: {e}")
-        return set()
+        # Sesión compartida: mantiene vivas las conexiones entre sondeos
+        self.session = get_session()
 
-    def _save_seen_tweets(self):
-        """Guarda los IDs de tweets procesados"""
-        with open(self.seen_tweets_file, 'w') as f:
-            json.dump(list(self.seen_tweets), f)
+        # Por URL: (ETag, Last-Modified, tweets parseados) de la última
+        # respuesta, para pedir solo si cambió y no volver a parsear
+        self._page_cache = {}
+
+        # Una consulta a Nitter que perdió la carrera sigue en marcha y
+        # puede escribir la instancia y la caché durante el siguiente sondeo
+        self._state_lock = threading.Lock()
 
     def mark_as_seen(self, tweet_id: str):
         """Marca un tweet como procesado"""
         self.seen_tweets.add(tweet_id)
-        self._save_seen_tweets()
+        self.seen_tweets.flush()
+
+    def mark_as_seen_bulk(self, tweet_ids):
+        """Marca varios tweets como procesados con una sola escritura"""
+        self.seen_tweets.update(tweet_ids)
+        self.seen_tweets.flush()
+
+    def flush(self):
+        """Guarda en disco los tweets vistos pendientes"""
+        self.seen_tweets.flush()
+
+    def _probe_instance(self, instance: str) -> bool:
+        """Comprueba con un HEAD (sin descargar la página) si la instancia responde"""
+        url = f"{instance}/{self.username}"
+        response = self.session.head(url, headers=_browser_headers(), timeout=5, **HEAD_KWARGS)
+        if response.status_code == 405:
+            # Instancia que no acepta HEAD
+            response = self.session.get(url, headers=_browser_headers(), timeout=5)
+        return response.status_code == 200
+
+    def _confirm_instance(self, instance: str) -> bool:
+        """Comprueba con un GET que la instancia devuelve el timeline"""
+        response = self.session.get(f"{instance}/{self.username}", headers=_browser_headers(), timeout=10)
+        return response.status_code == 200 and "timeline" in response.text.lower()
 
     def _find_working_instance(self) -> Optional[str]:
         """Encuentra una instancia de Nitter que funcione"""
-        if self.working_instance:
+        with self._state_lock:
+            current = self.working_instance
+
+        if current:
             # Verificar si la instancia actual sigue funcionando
             try:
-                response = requests.get(
-                    f"{self.working_instance}/{self.username}",
-                    timeout=10,
-                    headers={"User-Agent": "Mozilla/5.0"}
-                )
-                if response.status_code == 200:
-                    return self.working_instance
+                if self._probe_instance(current):
+                    return current
             except:
                 pass
 
-        # Buscar una nueva instancia
-        for instance in NITTER_INSTANCES:
-            try:
-                logger.info(f"Probando instancia: {instance}")
-                response = requests.get(
-                    f"{instance}/{self.username}",
-                    timeout=10,
-                    headers={"User-Agent": "Mozilla/5.0"}
-                )
-                if response.status_code == 200 and "timeline" in response.text.lower():
-                    self.working_instance = instance
-                    logger.success(f"Instancia funcionando: {instance}")
-                    return instance
-            except Exception as e:
-                logger.debug(f"Instancia {instance} falló: {e}")
-                continue
+        # Buscar una nueva instancia: se prueban todas a la vez y se queda
+        # la primera que responda y sirva el timeline
+        logger.info(f"Probando {len(NITTER_INSTANCES)} instancias de Nitter...")
+        executor = ThreadPoolExecutor(max_workers=len(NITTER_INSTANCES))
+        probes = {executor.submit(self._probe_instance, instance): instance for instance in NITTER_INSTANCES}
+
+        try:
+            pending = set(probes)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    instance = probes[future]
+                    try:
+                        if future.result() and self._confirm_instance(instance):
+                            with self._state_lock:
+                                self.working_instance = instance
+                            logger.success(f"Instancia funcionando: {instance}")
+                            return instance
+                    except Exception as e:
+                        logger.debug(f"Instancia {instance} falló: {e}")
+        finally:
+            # No esperar a las instancias más lentas
+            executor.shutdown(wait=False, cancel_futures=True)
 
         return None
 
+    def _fetch_via_nitter(self) -> Optional[List[Dict[str, Any]]]:
+        """Tweets del timeline en Nitter, o None si no hay instancia que responda"""
+        instance = self._find_working_instance()
+        if not instance:
+            return None
+
+        try:
+            tweets = self._fetch_tweets(
+                f"{instance}/{self.username}",
+                self._parse_nitter_page,
+                timeout=15,
+                headers=_browser_headers()
+            )
+            if tweets is not None:
+                logger.info(f"Encontrados {len(tweets)} tweets en Nitter")
+            return tweets
+
+        except Exception as e:
+            logger.error(f"Error con Nitter: {e}")
+            return None
+
+    def _fetch_tweets(self, url: str, parse_fn, **kwargs) -> Optional[List[Dict[str, Any]]]:
+        """
+        GET condicional de una página de tweets. Si no ha cambiado (304 o
+        mismo ETag) se devuelven los tweets ya parseados sin descargar ni
+        parsear de nuevo
+
+        Returns:
+            Tweets de la página, o None si la petición no fue bien
+        """
+        with self._state_lock:
+            cached = self._page_cache.get(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached:
+            etag, modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+
+        response = self.session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached:
+            logger.debug(f"Sin cambios en {url}")
+            return cached[2]
+
+        if response.status_code != 200:
+            return None
+
+        etag = response.headers.get('ETag')
+        if cached and etag and etag == cached[0]:
+            return cached[2]
+
+        tweets = parse_fn(response.text)
+        with self._state_lock:
+            self._page_cache[url] = (etag, response.headers.get('Last-Modified'), tweets)
+        return tweets
+
     def _parse_nitter_page(self, html: str) -> List[Dict[str, Any]]:
         """Parsea la página de Nitter para extraer tweets"""
-        soup = BeautifulSoup(html, 'html.parser')
+        tree = LexborHTMLParser(html)
         tweets = []
 
-        # Buscar todos los tweets en el timeline
-        timeline_items = soup.select('.timeline-item, .tweet-body')
+        # Buscar todos los tweets en el timeline (css() repite los nodos
+        # que cumplen varios selectores del grupo)
+        timeline_items = dict.fromkeys(tree.css('.timeline-item, .tweet-body'))
 
         for item in timeline_items:
             try:
                 tweet_data = {}
 
                 # Obtener enlace del tweet (contiene el ID)
-                tweet_link = item.select_one('.tweet-link, a[href*="/status/"]')
+                tweet_link = item.css_first('.tweet-link, a[href*="/status/"]')
                 if tweet_link:
-                    href = tweet_link.get('href', '')
+                    href = tweet_link.attributes.get('href') or ''
                     # Extraer ID del tweet de la URL
-                    match = re.search(r'/status/(\d+)', href)
+                    match = _STATUS_RE.search(href)
                     if match:
                         tweet_data['id'] = match.group(1)
 
                 # Obtener texto del tweet
-                tweet_content = item.select_one('.tweet-content, .content')
+                tweet_content = item.css_first('.tweet-content, .content')
                 if tweet_content:
-                    tweet_data['text'] = tweet_content.get_text(strip=True)
+                    tweet_data['text'] = tweet_content.text(strip=True)
 
                 # Verificar si tiene video
-                has_video = bool(item.select_one('.attachments video, .video-container, [class*="video"]'))
+                has_video = item.css_first('.attachments video, .video-container, [class*="video"]') is not None
                 tweet_data['has_video'] = has_video
 
                 # Obtener URL del video si existe
-                video_elem = item.select_one('video source, .attachments video')
+                video_elem = item.css_first('video source, .attachments video')
                 if video_elem:
-                    tweet_data['video_url'] = video_elem.get('src', '')
+                    tweet_data['video_url'] = video_elem.attributes.get('src') or ''
 
                 # Obtener fecha
-                date_elem = item.select_one('.tweet-date a, time')
+                date_elem = item.css_first('.tweet-date a, time')
                 if date_elem:
-                    tweet_data['date'] = date_elem.get('title', date_elem.get_text(strip=True))
+                    tweet_data['date'] = date_elem.attributes.get('title', date_elem.text(strip=True))
 
                 # Solo añadir si tiene ID
                 if tweet_data.get('id'):
@@ -142,86 +268,95 @@ class TwitterMonitor:
 
         return tweets
 
-    def _fetch_via_syndication(self) -> List[Dict[str, Any]]:
-        """Método alternativo usando syndication de Twitter"""
+    def _fetch_via_syndication(self) -> Optional[List[Dict[str, Any]]]:
+        """Método alternativo usando syndication de Twitter (None si falla)"""
         try:
             # Twitter syndication API (público, sin autenticación)
             url = f"https://syndication.twitter.com/srv/timeline-profile/screen-name/{self.username}"
 
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "Accept": "text/html,application/xhtml+xml",
-            }
-
-            response = requests.get(url, headers=headers, timeout=15)
-
-            if response.status_code == 200:
-                # Parsear el HTML embebido
-                soup = BeautifulSoup(response.text, 'html.parser')
-                tweets = []
-
-                # Buscar tweets en el timeline
-                for article in soup.select('article, [data-tweet-id]'):
-                    tweet_id = article.get('data-tweet-id')
-                    if tweet_id:
-                        tweets.append({
-                            'id': tweet_id,
-                            'url': f"https://twitter.com/{self.username}/status/{tweet_id}",
-                            'text': article.get_text(strip=True)[:500],
-                            'has_video': 'video' in str(article).lower()
-                        })
-
-                return tweets
+            return self._fetch_tweets(url, self._parse_syndication_page, headers=_browser_headers(), timeout=15)
 
         except Exception as e:
             logger.debug(f"Syndication falló: {e}")
+            return None
+
+    def _parse_syndication_page(self, html: str) -> List[Dict[str, Any]]:
+        """Parsea el HTML embebido de syndication"""
+        tree = LexborHTMLParser(html)
+        tweets = []
 
-        return []
+        # Buscar tweets en el timeline (sin repetir nodos)
+        for article in dict.fromkeys(tree.css('article, [data-tweet-id]')):
+            tweet_id = article.attributes.get('data-tweet-id')
+            if tweet_id:
+                tweets.append({
+                    'id': tweet_id,
+                    'url': f"https://twitter.com/{self.username}/status/{tweet_id}",
+                    'text': article.text(strip=True)[:500],
+                    'has_video': article.css_first('video, [class*="video"]') is not None
+                })
+
+        return tweets
 
     def check_new_tweets(self) -> List[Dict[str, Any]]:
         """
         Comprueba si hay nuevos tweets con video
         Retorna lista de tweets nuevos no procesados
         """
-        new_tweets = []
-
-        # Intentar con Nitter primero
-        instance = self._find_working_instance()
-
-        if instance:
-            try:
-                response = requests.get(
-                    f"{instance}/{self.username}",
-                    timeout=15,
-                    headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-                )
-
-                if response.status_code == 200:
-                    tweets = self._parse_nitter_page(response.text)
-                    logger.info(f"Encontrados {len(tweets)} tweets en Nitter")
+        tweets = self._fetch_timeline()
 
-                    for tweet in tweets:
-                        if tweet.get('id') not in self.seen_tweets:
-                            if tweet.get('has_video', False):
-                                new_tweets.append(tweet)
-                                logger.info(f"Nuevo tweet con video: {tweet.get('id')}")
-
-                    return new_tweets
-
-            except Exception as e:
-                logger.error(f"Error con Nitter: {e}")
-
-        # Fallback: usar syndication
-        logger.info("Intentando método alternativo (syndication)...")
-        tweets = self._fetch_via_syndication()
+        # Una diferencia de conjuntos en vez de consultar ID a ID
+        new_ids = self.seen_tweets.unseen(tweet.get('id') for tweet in tweets)
+        if not new_ids:
+            return []
 
+        new_tweets = []
         for tweet in tweets:
-            if tweet.get('id') not in self.seen_tweets:
-                if tweet.get('has_video', False):
-                    new_tweets.append(tweet)
+            if tweet.get('id') in new_ids and tweet.get('has_video', False):
+                new_tweets.append(tweet)
+                logger.info(f"Nuevo tweet con video: {tweet.get('id')}")
 
         return new_tweets
 
+    def _fetch_timeline(self) -> List[Dict[str, Any]]:
+        """
+        Lanza Nitter y syndication a la vez y se queda con la primera que
+        traiga tweets. Si la otra llega justo después, se unen las dos. Una
+        lista vacía no gana la carrera (syndication puede devolver la página
+        sin tweets antes de que Nitter acabe de buscar instancia): se sigue
+        esperando a la otra fuente
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures = {
+            executor.submit(self._fetch_via_nitter): "Nitter",
+            executor.submit(self._fetch_via_syndication): "syndication",
+        }
+
+        tweets = None
+        try:
+            pending = set(futures)
+            while pending and not tweets:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result and not tweets:
+                        tweets = result
+                        logger.debug(f"Timeline obtenido de {futures[future]}")
+
+            # Dar un margen corto a la otra fuente para tener más cobertura
+            if tweets and pending:
+                done, pending = wait(pending, timeout=HEDGE_MERGE_WINDOW)
+                for future in done:
+                    result = future.result()
+                    if result:
+                        known = {tweet.get('id') for tweet in tweets}
+                        tweets = tweets + [t for t in result if t.get('id') not in known]
+        finally:
+            # No esperar a la fuente más lenta
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return tweets or []
+
     def get_tweet_url(self, tweet_id: str) -> str:
         """Construye la URL del tweet"""
         return f"https://twitter.com/{self.username}/status/{tweet_id}"
@@ -233,19 +368,16 @@ def get_tweet_info_ytdlp(tweet_url: str) -> Optional[Dict[str, Any]]:
     Usa yt-dlp para obtener información del tweet
     Más fiable que scraping pero más lento
     """
-    import subprocess
-    import json
-
     try:
         result = subprocess.run(
             ['yt-dlp', '--dump-json', '--no-download', tweet_url],
             capture_output=True,
-            text=True,
             timeout=30
         )
 
         if result.returncode == 0:
-            info = json.loads(result.stdout)
+            # Se parsean los bytes tal cual, sin decodificar antes a str
+            info = orjson.loads(result.stdout) if ORJSON_AVAILABLE else json.loads(result.stdout)
             return {
                 'id': info.get('id'),
                 'text': info.get('description', ''),
@@ -5,147 +5,774 @@ Descarga videos de Twitter/X usando yt-dlp
 
 import os
 import sys
+import asyncio
+import time
+import shutil
+import socket
+import hashlib
+import functools
 import subprocess
+import threading
 import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator, Union
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
 
 from loguru import logger
 
+# API de yt-dlp en el mismo proceso (sin lanzar un intérprete por llamada)
+try:
+    import yt_dlp
+    YTDLP_AVAILABLE = True
+except ImportError:
+    YTDLP_AVAILABLE = False
 
+# orjson es opcional: más rápido que json para la salida de yt-dlp y la
+# caché de metadatos
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+VIDEO_EXTENSIONS = ['.mp4', '.webm', '.mkv', '.mov']
+
+# aria2c (si está en el PATH) baja el MP4 por varias conexiones a la vez
+# en trozos de 1 MB; solo para HTTP directo, los HLS siguen con yt-dlp
+ARIA2C_ARGS = ['-x', '8', '-s', '8', '-k', '1M', '--enable-http-keep-alive=true']
+
+# Tiempo máximo de una descarga con subprocess (5 minutos)
+DOWNLOAD_TIMEOUT = 300
+
+# Caché de DNS del proceso: cada extracción resuelve twitter.com, x.com,
+# video.twimg.com... una y otra vez. uninstall_dns_cache() vuelve al
+# resolver normal (por ejemplo en pruebas)
+DNS_CACHE_TTL = 300
+
+_dns_cache = {}
+_dns_cache_lock = threading.Lock()
+_original_getaddrinfo = socket.getaddrinfo
+
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    """socket.getaddrinfo con las respuestas guardadas DNS_CACHE_TTL segundos"""
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+
+    with _dns_cache_lock:
+        entry = _dns_cache.get(key)
+    if entry and now - entry[1] < DNS_CACHE_TTL:
+        return entry[0]
+
+    # Los errores no se cachean: el siguiente intento vuelve a resolver
+    result = _original_getaddrinfo(host, port, *args, **kwargs)
+    with _dns_cache_lock:
+        _dns_cache[key] = (result, now)
+    return result
+
+
+def install_dns_cache():
+    """Activa la caché de DNS para todo el proceso"""
+    socket.getaddrinfo = _cached_getaddrinfo
+
+
+def uninstall_dns_cache():
+    """Vuelve al getaddrinfo original y vacía la caché"""
+    socket.getaddrinfo = _original_getaddrinfo
+    with _dns_cache_lock:
+        _dns_cache.clear()
+
+
+# Solo compensa con yt-dlp en el mismo proceso: los subprocess no la comparten
+if YTDLP_AVAILABLE:
+    install_dns_cache()
+
+# Opciones de yt-dlp en el mismo proceso; output_name se pasa por
+# extra_info en cada descarga (id si falta)
+YDL_OPTS = {
+    'format': 'best[ext=mp4]/best',  # Preferir MP4
+    'noplaylist': True,
+    'socket_timeout': 30,
+    'retries': 3,
+    'quiet': True,
+    'no_warnings': True,
+}
+
+
+@functools.lru_cache(maxsize=1)
 def get_ytdlp_command() -> List[str]:
-    """Devuelve el comando para ejecutar yt-dlp"""
-    # Intentar como comando directo primero
-    try:
-        result = subprocess.run(
-            ['yt-dlp', '--version'],
-            capture_output=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            return ['yt-dlp']
-    except:
-        pass
+    """Devuelve el comando para ejecutar yt-dlp (se busca una sola vez)"""
+    # Buscar el ejecutable en el PATH, sin lanzar ningún proceso
+    if shutil.which('yt-dlp'):
+        return ['yt-dlp']
 
     # Usar como modulo de Python
     return [sys.executable, '-m', 'yt_dlp']
 
 
+# Campos de la info de yt-dlp que se guardan en la caché de metadatos
+METADATA_FIELDS = (
+    'duration', 'title', 'description', 'uploader', 'upload_date',
+    'view_count', 'width', 'height',
+)
+
+# Lo único que se pide a yt-dlp por stdout: la info completa (formatos,
+# miniaturas...) pesa cientos de KB y solo se usan estos campos
+PRINTED_FIELDS = ('filepath',) + METADATA_FIELDS
+
+# Hosts de Twitter/X (sin www. ni mobile.) que apuntan al mismo tweet
+_TWITTER_HOSTS = {'twitter.com', 'x.com', 'nitter.net'}
+
+
+def canonical_tweet_url(url: str) -> str:
+    """
+    Forma única de la URL de un tweet: https://x.com/<usuario>/status/<id>,
+    sin parámetros de seguimiento (?s=20, &t=...) ni barras sobrantes.
+    Las URLs de otros sitios solo cambian el host a minúsculas
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = f"https://{url}"
+
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    bare_host = host.removeprefix('www.').removeprefix('mobile.')
+
+    if bare_host not in _TWITTER_HOSTS:
+        return urlunsplit((parts.scheme, host, parts.path, parts.query, parts.fragment))
+
+    path = '/' + '/'.join(part for part in parts.path.split('/') if part)
+    return urlunsplit(('https', 'x.com', path, '', ''))
+
+
+@dataclass(slots=True)
+class VideoDownloadResult:
+    """Resultado de una descarga"""
+    file_path: str
+    filename: str
+    duration: Optional[float]
+    title: str
+    description: str
+    uploader: str
+    upload_date: str
+    view_count: Optional[int]
+    tweet_url: str
+    width: Optional[int]
+    height: Optional[int]
+
+
+class _MetadataCache:
+    """
+    Caché de metadatos por URL de tweet: en memoria (LRU) y en disco
+    (un JSON por URL, caducado por fecha de modificación). Los ficheros
+    caducados se borran al leerlos y con prune(), que put() lanza como
+    mucho una vez por ttl para que el directorio no crezca sin límite
+    """
+
+    def __init__(self, cache_dir: Path, maxsize: int = 2048, ttl: float = 3600):
+        self.cache_dir = Path(cache_dir)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        key = canonical_tweet_url(url)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return dict(entry[1])
+                del self._memory[key]
+
+        path = self._disk_path(key)
+        try:
+            mtime = path.stat().st_mtime
+            if now - mtime >= self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            data = path.read_bytes()
+            info = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, info, mtime + self.ttl)
+        return dict(info)
+
+    def put(self, url: str, info: Dict[str, Any]):
+        key = canonical_tweet_url(url)
+        info = {field: info[field] for field in METADATA_FIELDS if field in info}
+        self._remember(key, info, time.time() + self.ttl)
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(key)
+            # Temporal por hilo: dos descargas del mismo tweet no se pisan
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            if ORJSON_AVAILABLE:
+                tmp_path.write_bytes(orjson.dumps(info))
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(info, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"No se pudo guardar la caché de metadatos: {e}")
+
+        if time.time() - self._last_prune >= self.ttl:
+            self.prune()
+
+    def _remember(self, key: str, info: Dict[str, Any], expires: float):
+        with self._lock:
+            self._memory[key] = (expires, info)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def prune(self) -> int:
+        """Borra del disco las entradas caducadas (y temporales huérfanos)"""
+        now = time.time()
+        self._last_prune = now
+        removed = 0
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                stale = [
+                    entry.path for entry in entries
+                    if entry.is_file(follow_symlinks=False) and now - entry.stat().st_mtime >= self.ttl
+                ]
+        except OSError:
+            return 0
+
+        for path in stale:
+            try:
+                os.unlink(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for path in self.cache_dir.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
 class VideoDownloader:
     """Descarga videos de Twitter/X y otras plataformas"""
 
-    def __init__(self, download_dir: str = "./downloads"):
+    def __init__(
+        self,
+        download_dir: Union[str, Path] = "./downloads",
+        use_aria2c: bool = True,
+        max_filesize_mb: int = 512,
+        min_free_mb: int = 1024
+    ):
         self.download_dir = Path(download_dir)
         self.download_dir.mkdir(parents=True, exist_ok=True)
 
+        # Un video enorme (p. ej. un directo de horas) se corta antes de
+        # bajarlo, y no se empieza a descargar con el disco casi lleno
+        self.max_filesize_mb = max_filesize_mb
+        self.min_free_mb = min_free_mb
+
+        # Plantillas de ruta ya formadas: en cada descarga basta un %
+        download_prefix = str(self.download_dir) + os.sep
+        self._outtmpl_pattern = download_prefix + '%s.%%(ext)s'
+        self._infojson_pattern = download_prefix + '%s.info.json'
+
+        # Sin aria2c instalado se usa el descargador propio de yt-dlp
+        self._has_aria2 = use_aria2c and shutil.which('aria2c') is not None
+        if self._has_aria2:
+            logger.debug("Usando aria2c para las descargas HTTP")
+
+        # YoutubeDL no es thread-safe: una instancia por hilo, reutilizada
+        # entre llamadas (extractor, cookies y conexiones HTTP)
+        self._local = threading.local()
+
+        # Metadatos ya resueltos por URL (no cambian en la vida de un lote)
+        self._cache = _MetadataCache(self.download_dir / '.metadata_cache')
+
+    def clear_metadata_cache(self):
+        """Borra la caché de metadatos (memoria y disco)"""
+        self._cache.clear()
+
+    @property
+    def _ydl(self) -> 'yt_dlp.YoutubeDL':
+        """
+        Instancia de YoutubeDL del hilo actual. Con requests instalado,
+        yt-dlp usa su manejador basado en requests, con una sesión (y su
+        pool de conexiones keep-alive) por instancia: mientras viva el
+        hilo, las peticiones a Twitter reutilizan la conexión TLS
+        """
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = self._new_ydl(self._has_aria2)
+        return ydl
+
+    @property
+    def _native_ydl(self) -> 'yt_dlp.YoutubeDL':
+        """
+        Instancia del hilo actual sin aria2c: max_filesize solo lo aplica el
+        descargador propio de yt-dlp (con el Content-Length), así que los
+        videos de tamaño desconocido bajan con este
+        """
+        if not self._has_aria2:
+            return self._ydl
+        ydl = getattr(self._local, 'native_ydl', None)
+        if ydl is None:
+            ydl = self._local.native_ydl = self._new_ydl(False)
+        return ydl
+
+    def _new_ydl(self, aria2: bool) -> 'yt_dlp.YoutubeDL':
+        return yt_dlp.YoutubeDL({
+            **YDL_OPTS,
+            **(self._aria2_opts() if aria2 else {}),
+            'max_filesize': self.max_filesize_mb * 1024 * 1024,
+            'outtmpl': str(self.download_dir / '%(output_name,id)s.%(ext)s'),
+        })
+
+    def _ydl_for(self, video_info: Dict[str, Any], tweet_url: str) -> Optional['yt_dlp.YoutubeDL']:
+        """
+        Elige con qué instancia descargar el formato ya seleccionado en
+        video_info, o None si su tamaño (real o estimado) supera el límite
+        """
+        size = video_info.get('filesize') or video_info.get('filesize_approx')
+        if size and self.max_filesize_mb and size > self.max_filesize_mb * 1024 * 1024:
+            self._log_skipped(tweet_url)
+            return None
+        if size or not self.max_filesize_mb:
+            return self._ydl
+        return self._native_ydl
+
+    def _aria2_opts(self) -> Dict[str, Any]:
+        """Opciones de YoutubeDL para descargar con aria2c (vacías si no hay)"""
+        if not self._has_aria2:
+            return {}
+        return {
+            'external_downloader': {'http': 'aria2c'},
+            'external_downloader_args': {'aria2c': ARIA2C_ARGS},
+        }
+
+    def _has_free_space(self) -> bool:
+        """Comprueba que quedan al menos min_free_mb libres en download_dir"""
+        free_mb = shutil.disk_usage(self.download_dir).free // (1024 * 1024)
+        if free_mb < self.min_free_mb:
+            logger.error(f"Sin espacio para descargar: {free_mb} MB libres (mínimo {self.min_free_mb} MB)")
+            return False
+        return True
+
+    def _log_skipped(self, tweet_url: str):
+        """
+        yt-dlp termina sin error pero sin fichero cuando la descarga se
+        aborta por --max-filesize: se avisa de eso en vez de un fallo genérico
+        """
+        logger.warning(f"Video descartado, supera el límite de {self.max_filesize_mb} MB: {tweet_url}")
+
     def download_twitter_video(
         self,
         tweet_url: str,
-        output_name: Optional[str] = None
-    ) -> Optional[Dict[str, Any]]:
+        output_name: Optional[str] = None,
+        keep_sidecar: bool = False
+    ) -> Optional[VideoDownloadResult]:
         """
         Descarga un video de Twitter/X
 
         Args:
             tweet_url: URL del tweet
             output_name: Nombre del archivo (sin extensión). Si no se da, usa timestamp
+            keep_sidecar: Guardar también la info en <output_name>.info.json
+                          (la info ya llega en memoria; solo para quien quiera el fichero)
 
         Returns:
-            Dict con info del video descargado o None si falla
+            VideoDownloadResult del video descargado o None si falla
         """
+        tweet_url = canonical_tweet_url(tweet_url)
         if not output_name:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_name = f"video_{timestamp}"
 
-        output_template = str(self.download_dir / f"{output_name}.%(ext)s")
-        json_file = self.download_dir / f"{output_name}.info.json"
+        if not self._has_free_space():
+            return None
+
+        if YTDLP_AVAILABLE:
+            return self._download_in_process(tweet_url, output_name, keep_sidecar)
 
         try:
-            # Primero obtener info del video
-            logger.info(f"Obteniendo info del video: {tweet_url}")
-
-            ytdlp_cmd = get_ytdlp_command()
-            info_result = subprocess.run(
-                ytdlp_cmd + [
-                    '--dump-json',
-                    '--no-download',
-                    tweet_url
-                ],
+            logger.info(f"Descargando video: {tweet_url}")
+            download_result = subprocess.run(
+                self._download_args(tweet_url, output_name, keep_sidecar),
                 capture_output=True,
-                text=True,
-                timeout=60
+                timeout=DOWNLOAD_TIMEOUT
+            )
+            return self._subprocess_result(
+                tweet_url, output_name,
+                download_result.returncode, download_result.stdout, download_result.stderr
             )
 
-            video_info = {}
-            if info_result.returncode == 0:
-                video_info = json.loads(info_result.stdout)
-                logger.info(f"Duración del video: {video_info.get('duration', 'desconocida')}s")
+        except subprocess.TimeoutExpired:
+            logger.error("Timeout descargando el video")
+            return None
+        except Exception as e:
+            logger.error(f"Error inesperado: {e}")
+            return None
 
-            # Descargar el video
-            logger.info(f"Descargando video...")
+    def _download_args(self, tweet_url: str, output_name: str, keep_sidecar: bool = False) -> List[str]:
+        """
+        Comando de descarga en una sola pasada: yt-dlp descarga y, ya movido
+        el fichero, vuelca por stdout los campos usados de la info del video
+        (con su ruta final)
+        """
+        extra = ['--write-info-json'] if keep_sidecar else []
+        # Aquí no se sabe el tamaño antes de descargar, y con aria2c
+        # --max-filesize no se aplicaría: con límite, descargador propio
+        if self._has_aria2 and not self.max_filesize_mb:
+            extra += ['--downloader', 'http:aria2c', '--downloader-args', f"aria2c:{' '.join(ARIA2C_ARGS)}"]
+        return get_ytdlp_command() + extra + [
+            '--format', 'best[ext=mp4]/best',  # Preferir MP4
+            '--output', self._outtmpl_pattern % output_name,
+            '--print', f"after_move:%(.{{{','.join(PRINTED_FIELDS)}}})j",
+            '--no-simulate',
+            '--no-playlist',
+            '--socket-timeout', '30',
+            '--retries', '3',
+            # Sin --no-part: una descarga cortada (timeout) deja un .part y no
+            # un video truncado con el nombre final, que se daría por bueno
+            '--max-filesize', f"{self.max_filesize_mb}M",
+            tweet_url
+        ]
+
+    def _subprocess_result(
+        self,
+        tweet_url: str,
+        output_name: str,
+        returncode: int,
+        stdout: bytes,
+        stderr: bytes
+    ) -> Optional[VideoDownloadResult]:
+        """Interpreta la salida de un yt-dlp lanzado como subprocess"""
+        if returncode != 0:
+            # Solo se decodifica lo que se registra: el final, donde yt-dlp deja el ERROR
+            logger.error(f"Error descargando: {stderr[-1024:].decode('utf-8', errors='replace').strip()}")
+            return None
 
-            download_result = subprocess.run(
-                ytdlp_cmd + [
-                    '--format', 'best[ext=mp4]/best',  # Preferir MP4
-                    '--output', output_template,
-                    '--write-info-json',  # Guardar metadata
-                    '--no-playlist',
-                    '--socket-timeout', '30',
-                    '--retries', '3',
-                    tweet_url
-                ],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutos máximo
-            )
+        # La info es la última línea JSON de la salida; sin ella, yt-dlp no
+        # llegó a mover ningún fichero (descarga abortada por tamaño)
+        lines = stdout.strip().splitlines()
+        if not lines:
+            self._log_skipped(tweet_url)
+            return None
 
-            if download_result.returncode != 0:
-                logger.error(f"Error descargando: {download_result.stderr}")
-                return None
+        video_info = orjson.loads(lines[-1]) if ORJSON_AVAILABLE else json.loads(lines[-1])
+        self._cache.put(tweet_url, video_info)
 
-            # Buscar el archivo descargado
-            downloaded_files = list(self.download_dir.glob(f"{output_name}.*"))
-            video_file = None
+        # yt-dlp ya dice dónde dejó el video; buscarlo solo si no lo dice
+        video_file = None
+        if video_info.get('filepath'):
+            video_file = Path(video_info['filepath'])
+        if not video_file or not video_file.exists():
+            video_file = self._find_downloaded_file(output_name)
 
-            for f in downloaded_files:
-                if f.suffix.lower() in ['.mp4', '.webm', '.mkv', '.mov']:
-                    video_file = f
-                    break
+        if not video_file:
+            logger.error("No se encontró el video descargado")
+            return None
 
-            if not video_file:
-                logger.error("No se encontró el video descargado")
-                return None
+        logger.info(f"Duración del video: {video_info.get('duration', 'desconocida')}s")
+        logger.success(f"Video descargado: {video_file}")
+        return self._build_result(video_file, video_info, tweet_url)
 
-            # Cargar info guardada
-            if json_file.exists():
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    video_info = json.load(f)
-
-            result = {
-                'file_path': str(video_file),
-                'filename': video_file.name,
-                'duration': video_info.get('duration'),
-                'title': video_info.get('title', ''),
-                'description': video_info.get('description', ''),
-                'uploader': video_info.get('uploader', ''),
-                'upload_date': video_info.get('upload_date', ''),
-                'view_count': video_info.get('view_count'),
-                'tweet_url': tweet_url,
-                'width': video_info.get('width'),
-                'height': video_info.get('height'),
-            }
+    def download_batch(
+        self,
+        tweet_urls: List[str],
+        output_names: List[str]
+    ) -> List[Optional[VideoDownloadResult]]:
+        """
+        Descarga varios videos con una sola instancia de yt-dlp
 
-            logger.success(f"Video descargado: {video_file}")
-            return result
+        Args:
+            tweet_urls: URLs de los tweets
+            output_names: Nombre de archivo (sin extensión) para cada URL
 
-        except subprocess.TimeoutExpired:
-            logger.error("Timeout descargando el video")
+        Returns:
+            Lista con la info de cada video (None en los que fallen), en el mismo orden
+        """
+        return list(self.iter_download_batch(tweet_urls, output_names))
+
+    def iter_download_batch(
+        self,
+        tweet_urls: List[str],
+        output_names: List[str]
+    ) -> Iterator[Optional[VideoDownloadResult]]:
+        """
+        Igual que download_batch pero devuelve cada resultado en cuanto
+        termina su descarga. El extractor, las cookies y las conexiones
+        HTTP de yt-dlp se reutilizan entre todas las URLs.
+        """
+        for tweet_url, output_name in zip(tweet_urls, output_names):
+            yield self.download_twitter_video(tweet_url, output_name=output_name)
+
+    def download_many(
+        self,
+        tweet_urls: List[str],
+        output_names: Optional[List[str]] = None,
+        max_workers: int = 4
+    ) -> List[Optional[VideoDownloadResult]]:
+        """
+        Descarga varios videos a la vez. Con la API de yt-dlp va en pools
+        de hilos (cada hilo con su YoutubeDL; la espera de red no retiene
+        el GIL), con la extracción de info y las descargas en etapas
+        separadas. Sin ella, los subprocess se lanzan desde un bucle
+        asyncio y no hace falta un hilo por descarga
+
+        Args:
+            tweet_urls: URLs de los tweets
+            output_names: Nombre de archivo para cada URL (por defecto, timestamp e índice)
+            max_workers: Descargas simultáneas (el doble para extraer info)
+
+        Returns:
+            Lista con la info de cada video (None en los que fallen), en el mismo
+            orden. Las URLs repetidas (p. ej. twitter.com y x.com del mismo tweet)
+            se descargan una vez y comparten resultado
+        """
+        if not tweet_urls:
+            return []
+
+        if output_names is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_names = [f"video_{timestamp}_{i}" for i in range(len(tweet_urls))]
+
+        if not self._has_free_space():
+            return [None] * len(tweet_urls)
+
+        # Primera aparición de cada tweet, con su nombre de archivo
+        canonical = [canonical_tweet_url(url) for url in tweet_urls]
+        unique = {}
+        for url, output_name in zip(canonical, output_names):
+            unique.setdefault(url, output_name)
+        urls, names = list(unique), list(unique.values())
+
+        if not YTDLP_AVAILABLE:
+            results = asyncio.run(self.download_many_async(urls, names, max_workers))
+        else:
+            results = self._download_pipeline(urls, names, max_workers * 2, max_workers)
+
+        by_url = dict(zip(urls, results))
+        return [by_url[url] for url in canonical]
+
+    def _download_pipeline(
+        self,
+        tweet_urls: List[str],
+        output_names: List[str],
+        info_workers: int,
+        download_workers: int
+    ) -> List[Optional[VideoDownloadResult]]:
+        """
+        Descarga en dos etapas con pools separados: la extracción de info
+        (ligera) alimenta a las descargas en cuanto termina cada URL, así
+        los videos empiezan a bajar mientras aún se resuelven los demás.
+        process_ie_result descarga a partir de la info ya extraída, sin
+        volver a pedir la página del tweet
+        """
+        results = [None] * len(tweet_urls)
+        download_futures = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, info_workers), thread_name_prefix='ytdlp-info') as info_pool, \
+                ThreadPoolExecutor(max_workers=max(1, download_workers), thread_name_prefix='download') as download_pool:
+            info_futures = {
+                info_pool.submit(self._extract_for_download, tweet_url, output_name): i
+                for i, (tweet_url, output_name) in enumerate(zip(tweet_urls, output_names))
+            }
+
+            for future in as_completed(info_futures):
+                i = info_futures[future]
+                try:
+                    video_info = future.result()
+                except Exception as e:
+                    logger.error(f"Error obteniendo info de {tweet_urls[i]}: {e}")
+                    continue
+                if not video_info:
+                    logger.error(f"Error descargando: {tweet_urls[i]}")
+                    continue
+
+                download_future = download_pool.submit(self._download_extracted, video_info)
+                download_futures[download_future] = i
+
+            for future in as_completed(download_futures):
+                i = download_futures[future]
+                try:
+                    downloaded = future.result()
+                    if downloaded is not None:
+                        results[i] = self._in_process_result(tweet_urls[i], output_names[i], downloaded)
+                except Exception as e:
+                    logger.error(f"Error descargando {tweet_urls[i]}: {e}")
+
+        return results
+
+    def _extract_for_download(self, tweet_url: str, output_name: str) -> Optional[Dict[str, Any]]:
+        """Etapa 1: info del video (primer video si el tweet tiene varios)"""
+        logger.info(f"Obteniendo info del video: {tweet_url}")
+        video_info = self._ydl.extract_info(tweet_url, download=False)
+        if video_info and video_info.get('entries'):
+            video_info = video_info['entries'][0]
+        if video_info:
+            video_info['output_name'] = output_name
+        return video_info
+
+    def _download_extracted(self, video_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Etapa 2: descarga el video de una info ya extraída (None si se
+        descarta por tamaño, sin llegar a pedir el fichero)
+        """
+        tweet_url = video_info.get('webpage_url', video_info.get('id'))
+        ydl = self._ydl_for(video_info, tweet_url)
+        if ydl is None:
             return None
+        logger.info(f"Descargando video: {tweet_url}")
+        return ydl.process_ie_result(video_info, download=True)
+
+    async def download_many_async(
+        self,
+        tweet_urls: List[str],
+        output_names: List[str],
+        max_workers: int = 4
+    ) -> List[Optional[VideoDownloadResult]]:
+        """
+        Descarga varios videos con subprocess asíncronos de yt-dlp, como
+        mucho max_workers a la vez. Mismo orden que tweet_urls
+        """
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def download_one(tweet_url: str, output_name: str) -> Optional[VideoDownloadResult]:
+            async with semaphore:
+                logger.info(f"Descargando video: {tweet_url}")
+                proc = await asyncio.create_subprocess_exec(
+                    *self._download_args(tweet_url, output_name),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(), DOWNLOAD_TIMEOUT)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    logger.error("Timeout descargando el video")
+                    return None
+                return self._subprocess_result(tweet_url, output_name, proc.returncode, stdout, stderr)
+
+        results = await asyncio.gather(
+            *(download_one(url, name) for url, name in zip(tweet_urls, output_names)),
+            return_exceptions=True
+        )
+
+        # Un fallo en una descarga no tumba el lote
+        for tweet_url, result in zip(tweet_urls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error descargando {tweet_url}: {result}")
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    def _download_in_process(
+        self,
+        tweet_url: str,
+        output_name: str,
+        keep_sidecar: bool = False
+    ) -> Optional[VideoDownloadResult]:
+        """
+        Descarga con la API de yt-dlp: una sola extracción, y el tamaño del
+        formato elegido se comprueba antes de bajar nada
+        """
+        try:
+            video_info = self._extract_for_download(tweet_url, output_name)
+            if not video_info:
+                logger.error(f"Error descargando: {tweet_url}")
+                return None
+
+            video_info = self._download_extracted(video_info)
+            if video_info is None:
+                return None
+            return self._in_process_result(tweet_url, output_name, video_info, keep_sidecar)
+
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
+            logger.error(f"Error descargando {tweet_url}: {e}")
+            return None
+
+    def _in_process_result(
+        self,
+        tweet_url: str,
+        output_name: str,
+        video_info: Optional[Dict[str, Any]],
+        keep_sidecar: bool = False
+    ) -> Optional[VideoDownloadResult]:
+        """Localiza el video que dejó extract_info/process_ie_result"""
+        # Tweets con varios videos: quedarse con el primero
+        if video_info and video_info.get('entries'):
+            video_info = video_info['entries'][0]
+
+        if not video_info:
+            logger.error(f"Error descargando: {tweet_url}")
             return None
 
+        video_file = None
+        requested = video_info.get('requested_downloads') or []
+        if requested and requested[0].get('filepath'):
+            video_file = Path(requested[0]['filepath'])
+        elif requested:
+            # Formato elegido pero sin fichero: abortada por tamaño
+            self._log_skipped(tweet_url)
+            return None
+        if not video_file or not video_file.exists():
+            video_file = self._find_downloaded_file(output_name)
+
+        if not video_file:
+            logger.error("No se encontró el video descargado")
+            return None
+
+        self._cache.put(tweet_url, video_info)
+        if keep_sidecar:
+            sidecar = self._infojson_pattern % output_name
+            with open(sidecar, 'w', encoding='utf-8') as f:
+                json.dump(yt_dlp.YoutubeDL.sanitize_info(video_info), f, ensure_ascii=False)
+
+        logger.success(f"Video descargado: {video_file}")
+        return self._build_result(video_file, video_info, tweet_url)
+
+    def _find_downloaded_file(self, output_name: str) -> Optional[Path]:
+        """Busca el archivo de video descargado con el nombre dado"""
+        for f in self.download_dir.glob(f"{output_name}.*"):
+            if f.suffix.lower() in VIDEO_EXTENSIONS:
+                return f
+        return None
+
+    def _build_result(
+        self,
+        video_file: Path,
+        video_info: Dict[str, Any],
+        tweet_url: str
+    ) -> VideoDownloadResult:
+        """Construye el resultado de una descarga"""
+        return VideoDownloadResult(
+            file_path=str(video_file),
+            filename=video_file.name,
+            duration=video_info.get('duration'),
+            title=video_info.get('title', ''),
+            description=video_info.get('description', ''),
+            uploader=video_info.get('uploader', ''),
+            upload_date=video_info.get('upload_date', ''),
+            view_count=video_info.get('view_count'),
+            tweet_url=tweet_url,
+            width=video_info.get('width'),
+            height=video_info.get('height'),
+        )
+
     def get_video_info(self, tweet_url: str) -> Optional[Dict[str, Any]]:
         """
         Obtiene información del video sin descargarlo
@@ -156,21 +783,16 @@ class VideoDownloader:
         Returns:
             Dict con info del video o None
         """
+        tweet_url = canonical_tweet_url(tweet_url)
+        info = self._cache.get(tweet_url)
+
         try:
-            ytdlp_cmd = get_ytdlp_command()
-            result = subprocess.run(
-                ytdlp_cmd + [
-                    '--dump-json',
-                    '--no-download',
-                    tweet_url
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            if info is None:
+                info = self._extract_info(tweet_url)
+                if info:
+                    self._cache.put(tweet_url, info)
 
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
+            if info:
                 return {
                     'duration': info.get('duration'),
                     'title': info.get('title', ''),
@@ -185,37 +807,83 @@ class VideoDownloader:
 
         return None
 
+    def _extract_info(self, tweet_url: str) -> Optional[Dict[str, Any]]:
+        """Info completa de yt-dlp sin descargar (en proceso o con subprocess)"""
+        if YTDLP_AVAILABLE:
+            info = self._ydl.extract_info(tweet_url, download=False)
+            if info and info.get('entries'):
+                info = info['entries'][0]
+            return info
+
+        ytdlp_cmd = get_ytdlp_command()
+        result = subprocess.run(
+            ytdlp_cmd + [
+                '--dump-json',
+                '--no-download',
+                tweet_url
+            ],
+            capture_output=True,
+            timeout=30
+        )
+        if result.returncode == 0:
+            return orjson.loads(result.stdout) if ORJSON_AVAILABLE else json.loads(result.stdout)
+        return None
+
     def cleanup_old_downloads(self, max_age_hours: int = 24):
         """Elimina descargas antiguas para ahorrar espacio"""
-        from datetime import timedelta
+        cutoff = time.time() - max_age_hours * 3600
+
+        # La caché de metadatos es un subdirectorio: se limpia aparte
+        pruned = self._cache.prune()
+        if pruned:
+            logger.debug(f"Eliminadas {pruned} entradas caducadas de la caché de metadatos")
+
+        # scandir da el tipo de cada entrada sin un stat aparte; la fecha
+        # se compara como número, sin crear un datetime por fichero
+        with os.scandir(self.download_dir) as entries:
+            stale = [
+                entry.path for entry in entries
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff
+            ]
+
+        if not stale:
+            return
+
+        # Los unlink sueltan el GIL: en discos de red se solapan las esperas
+        with ThreadPoolExecutor(max_workers=min(8, len(stale)), thread_name_prefix='cleanup') as pool:
+            removed = sum(pool.map(_try_unlink, stale))
 
-        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+        logger.info(f"Eliminados {removed} archivos antiguos de {self.download_dir}")
 
-        for file in self.download_dir.iterdir():
-            if file.is_file():
-                mtime = datetime.fromtimestamp(file.stat().st_mtime)
-                if mtime < cutoff:
-                    try:
-                        file.unlink()
-                        logger.info(f"Eliminado archivo antiguo: {file.name}")
-                    except Exception as e:
-                        logger.warning(f"No se pudo eliminar {file.name}: {e}")
+
+def _try_unlink(path: str) -> bool:
+    """Borra un fichero; False (y aviso) si no se pudo"""
+    try:
+        os.unlink(path)
+        return True
+    except OSError as e:
+        logger.warning(f"No se pudo eliminar {os.path.basename(path)}: {e}")
+        return False
 
 
+@functools.lru_cache(maxsize=1)
 def check_ytdlp_installed() -> bool:
-    """Verifica si yt-dlp está instalado"""
-    import sys
+    """Verifica si yt-dlp está instalado (se comprueba una sola vez)"""
+    # Importable en este proceso: la versión se lee sin lanzar nada
+    if YTDLP_AVAILABLE:
+        logger.info(f"yt-dlp versión (módulo): {yt_dlp.version.__version__}")
+        return True
 
     # Intentar como comando directo
     try:
         result = subprocess.run(
             ['yt-dlp', '--version'],
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             timeout=10
         )
         if result.returncode == 0:
-            logger.info(f"yt-dlp versión: {result.stdout.strip()}")
+            logger.info(f"yt-dlp versión: {result.stdout.decode(errors='replace').strip()}")
             return True
     except FileNotFoundError:
         pass
@@ -226,12 +894,12 @@ def check_ytdlp_installed() -> bool:
     try:
         result = subprocess.run(
             [sys.executable, '-m', 'yt_dlp', '--version'],
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             timeout=10
         )
         if result.returncode == 0:
-            logger.info(f"yt-dlp versión (módulo): {result.stdout.strip()}")
+            logger.info(f"yt-dlp versión (módulo): {result.stdout.decode(errors='replace').strip()}")
             return True
     except Exception as e:
         logger.debug(f"Error con yt-dlp módulo: {e}")
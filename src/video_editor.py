@@ -4,15 +4,31 @@ Detecta y extrae los fragmentos más impactantes del video
 """
 
 import os
+import re
+import json
+import copy
+import heapq
 import random
+import shutil
+import textwrap
+import functools
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Union
 from dataclasses import dataclass
 
 import numpy as np
 from loguru import logger
 
+# Relativo dentro del paquete src; los scripts (bot.py, test_tweet.py)
+# ponen src en sys.path e importan los módulos sueltos
+try:
+    from .deps_cache import probe_cached
+except ImportError:
+    from deps_cache import probe_cached
+
 try:
     from moviepy.editor import VideoFileClip, concatenate_videoclips, TextClip, CompositeVideoClip
     MOVIEPY_AVAILABLE = True
@@ -26,6 +42,53 @@ try:
 except ImportError:
     CV2_AVAILABLE = False
 
+# Numba es opcional: compila la diferencia entre frames a un bucle nativo
+# en paralelo, sin los temporales int16 de NumPy
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Con ffmpeg el análisis de movimiento no pasa frame a frame por Python
+FFMPEG_AVAILABLE = bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+
+# Argumentos de salida de video para cada codificador soportado
+VIDEO_ENCODER_ARGS = {
+    'libx264': ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23'],
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '23'],
+    'h264_videotoolbox': ['-c:v', 'h264_videotoolbox', '-b:v', '4M'],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-global_quality', '23'],
+}
+
+# Para los pasos intermedios que se vuelven a codificar después: rápido y
+# casi sin pérdida, la calidad final la da la última codificación
+INTERMEDIATE_ENCODER_ARGS = {
+    'libx264': ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-tune', 'fastdecode'],
+}
+
+# Codificadores por hardware que prueba encoder="auto", por orden de preferencia
+HW_ENCODERS = ('h264_nvenc', 'h264_videotoolbox', 'h264_qsv')
+
+
+# Hilos de ffmpeg por vídeo al procesar en paralelo: x264 ya reparte cada
+# codificación entre varios núcleos, así no se pisan los procesos
+BATCH_FFMPEG_THREADS = 2
+
+# Resultados de ffprobe que se guardan por editor (uno por video)
+PROBE_CACHE_SIZE = 256
+
+# Ancho al que se reducen los frames muestreados antes de compararlos
+# (80x45 en 16:9): la puntuación es una sola media por frame y el
+# promediado espacial de INTER_AREA/flags=area conserva el movimiento
+ANALYSIS_WIDTH = 80
+
+# Limpieza del texto superpuesto: URLs, caracteres que rompen drawtext y espacios
+_URL_RE = re.compile(r'https?://\S+')
+_DRAWTEXT_UNSAFE = str.maketrans('', '', "'\";:\\")
+_SPACES_RE = re.compile(r'\s+')
+
 
 @dataclass
 class VideoSegment:
@@ -36,15 +99,232 @@ class VideoSegment:
     reason: str
 
 
+def _analysis_size(width: int, height: int) -> Tuple[int, int]:
+    """Tamaño (ancho, alto) de los frames de análisis, como mucho ANALYSIS_WIDTH de ancho"""
+    scale = min(1.0, ANALYSIS_WIDTH / width)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+if NUMBA_AVAILABLE:
+    @numba.njit(parallel=True, cache=True)
+    def _frame_diffs(frames):
+        """Diferencia media absoluta con el frame anterior, un frame por hilo"""
+        n, h, w = frames.shape
+        out = np.zeros(n)
+        for i in numba.prange(1, n):
+            total = 0
+            for y in range(h):
+                for x in range(w):
+                    total += abs(np.int32(frames[i, y, x]) - np.int32(frames[i - 1, y, x]))
+            out[i] = total / (h * w)
+        return out
+
+
+def _motion_scores(frames: np.ndarray, chunk: int = 256) -> np.ndarray:
+    """
+    Diferencia media absoluta de cada frame (N, H, W) con el anterior; la
+    primera muestra vale 0. Con Numba es un bucle compilado; si no, se
+    calcula por bloques para no pasar todo el video a int16 de golpe
+    """
+    if NUMBA_AVAILABLE and len(frames) > 1:
+        scores = _frame_diffs(frames)
+    else:
+        scores = np.zeros(len(frames))
+        for start in range(1, len(frames), chunk):
+            block = frames[start - 1:start + chunk].astype(np.int16)
+            scores[start:start + chunk] = np.abs(np.diff(block, axis=0)).mean(axis=(1, 2))
+
+    # Bonus por cambios muy bruscos (posible cambio de escena)
+    return np.where(scores > 30, scores * 1.5, scores)
+
+
+def _open_capture(video_path: str) -> 'cv2.VideoCapture':
+    """
+    Abre el video con el backend FFmpeg de OpenCV pidiendo decodificación
+    por hardware (CUDA/VAAPI/D3D11 si hay); OpenCV decodifica por software
+    si no hay ninguna. Sin soporte en esta versión de OpenCV, apertura normal
+    """
+    if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+            cv2.CAP_PROP_HW_DEVICE, 0,
+        ])
+        if cap.isOpened():
+            return cap
+        cap.release()
+
+    return cv2.VideoCapture(video_path)
+
+
+def _segments_from_scores(times: np.ndarray, scores: np.ndarray, duration: float) -> List[VideoSegment]:
+    """Agrupa las muestras consecutivas con puntuación alta en segmentos"""
+    if not len(scores):
+        return []
+
+    # Segmentos con puntuación por encima de la media + 0.5 std
+    threshold = np.mean(scores) + 0.5 * np.std(scores)
+
+    # Tramos de muestras seguidas por encima del umbral: +1 donde empieza
+    # uno y -1 en la primera muestra que ya no lo supera
+    mask = np.concatenate(([False], scores > threshold, [False]))
+    edges = np.diff(mask.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Un tramo que llega al final del video no tiene muestra de cierre;
+    # del resto valen los de al menos 2 segundos
+    closed = ends < len(scores)
+    starts, ends = starts[closed], ends[closed]
+    long_enough = times[ends] - times[starts] >= 2
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    # Media de cada tramo con sumas acumuladas, sin recorrer las muestras
+    cumulative = np.concatenate(([0.0], np.cumsum(scores, dtype=np.float64)))
+    means = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+    return [
+        VideoSegment(
+            start=max(0, segment_start - 1),
+            end=min(duration, segment_end + 1),
+            score=score,
+            reason="high_motion"
+        )
+        for segment_start, segment_end, score in zip(
+            times[starts].tolist(), times[ends].tolist(), means.tolist()
+        )
+    ]
+
+
+# Vertical 9:16 (1080x1920) con CROP: escala para llenar toda la pantalla
+# y recorta el exceso, SIN barras negras. force_original_aspect_ratio
+# elige por sí solo si manda el ancho o el alto, sin probar el video antes
+VERTICAL_FILTER = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
+
+
+def _overlay_lines(text: str) -> List[str]:
+    """
+    Parte el texto en lineas cortas estilo TikTok
+    - Lineas de max 18 caracteres, en MAYUSCULAS
+    - Max 7 lineas
+    """
+    # Limpiar texto - quitar URLs y caracteres problematicos para ffmpeg
+    # NOTA: NO quitar @ ni # aqui porque ya vienen procesados del text_rewriter
+    # @BomberosMad ya es "Bomberos de Madrid", #Carabanchel ya es "Carabanchel"
+    clean_text = _URL_RE.sub('', text)
+    # Solo quitar caracteres que rompen ffmpeg
+    clean_text = clean_text.translate(_DRAWTEXT_UNSAFE)
+    clean_text = _SPACES_RE.sub(' ', clean_text).strip()
+
+    # Dividir en lineas CORTAS (max 18 chars) para video vertical 9:16,
+    # max 7 lineas y en MAYUSCULAS para impacto
+    lines = [
+        line.upper()
+        for line in textwrap.wrap(clean_text, width=18, break_long_words=True)[:7]
+    ]
+
+    if lines:
+        logger.info(f"Texto en {len(lines)} lineas:")
+        for line in lines:
+            logger.info(f"  -> {line}")
+
+    return lines
+
+
+def _filter_path(path: Path) -> str:
+    """
+    Ruta lista para ir como valor de una opción dentro de un filtergraph.
+    ffmpeg la desescapa dos veces: primero el filtergraph (\\ ' [ ] , ;)
+    y luego las opciones del filtro (\\ ' :), así que 'C:/...' o una
+    coma en la ruta romperían el filtro sin escapar
+    """
+    value = Path(path).as_posix()
+    for char in "\\':":
+        value = value.replace(char, '\\' + char)
+    for char in "\\'[],;":
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def _text_filters(lines: List[str], textfile: Optional[Path] = None) -> List[str]:
+    """
+    Filtros drawtext para las lineas: texto blanco con borde negro, centrado
+    en 1080x1920. Con textfile y un ffmpeg con text_align, las lineas se
+    escriben en ese fichero y se dibujan con un solo drawtext; si no, un
+    drawtext por linea
+    """
+    options = _drawtext_options()
+    if textfile is not None and 'text_align' in options:
+        Path(textfile).write_text('\n'.join(lines), encoding='utf-8')
+        # 46px de fuente + 9px de interlineado = los ~55px por linea de abajo
+        text_filter = (
+            f"drawtext=textfile={_filter_path(textfile)}:"
+            f"reload=0:"
+            f"expansion=none:"
+            f"{'text_shaping=0:' if 'text_shaping' in options else ''}"
+            f"line_spacing=9:"
+            f"text_align=C:"
+            f"fontsize=46:"
+            f"fontcolor=white:"
+            f"borderw=5:"
+            f"bordercolor=black:"
+            f"x=(w-text_w)/2:"
+            f"y=(h-text_h)/2"
+        )
+        return [text_filter]
+
+    filter_parts = []
+
+    # Centro vertical: 1920/2 = 960
+    # Cada linea tiene ~55px de alto
+    total_text_height = len(lines) * 55
+    y_start = (1920 - total_text_height) // 2
+
+    for i, line in enumerate(lines):
+        y_pos = y_start + (i * 55)
+        safe_line = line.replace("'", "").replace('"', '')
+
+        # drawtext con texto centrado
+        text_filter = (
+            f"drawtext=text='{safe_line}':"
+            f"fontsize=46:"
+            f"fontcolor=white:"
+            f"borderw=5:"
+            f"bordercolor=black:"
+            f"x=(w-text_w)/2:"
+            f"y={y_pos}"
+        )
+        filter_parts.append(text_filter)
+
+    return filter_parts
+
+
+@functools.lru_cache(maxsize=1)
+def _drawtext_options() -> str:
+    """Ayuda del filtro drawtext de ffmpeg, para ver qué opciones admite"""
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-h', 'filter=drawtext'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        return result.stdout
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return ''
+
+
 class VideoEditor:
     """Editor automático de videos para TikTok"""
 
     def __init__(
         self,
-        output_dir: str = "./processed",
+        output_dir: Union[str, Path] = "./processed",
         min_duration: int = 15,
         max_duration: int = 60,
-        target_aspect_ratio: Tuple[int, int] = (9, 16)  # TikTok vertical
+        target_aspect_ratio: Tuple[int, int] = (9, 16),  # TikTok vertical
+        hwaccel: str = "none",
+        encoder: str = "libx264",
+        ffmpeg_threads: Optional[int] = None
     ):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -52,6 +332,47 @@ class VideoEditor:
         self.max_duration = max_duration
         self.target_aspect_ratio = target_aspect_ratio
 
+        # Aceleración por hardware: NVDEC para decodificar y NVENC para codificar
+        if hwaccel == 'cuda' and encoder == 'libx264':
+            encoder = 'h264_nvenc'
+        if encoder == 'auto':
+            encoder = next((enc for enc in HW_ENCODERS if check_encoder_available(enc)), 'libx264')
+            logger.info(f"Codificador de video: {encoder}")
+        elif encoder in HW_ENCODERS and not check_encoder_available(encoder):
+            logger.warning(f"{encoder} no disponible en ffmpeg, usando codificación por CPU")
+            if hwaccel == 'cuda':
+                hwaccel = 'none'
+            encoder = 'libx264'
+        self.hwaccel = hwaccel
+        self.encoder = encoder
+        self.ffmpeg_threads = ffmpeg_threads
+
+        # Ruta -> ((mtime, tamaño), resultado de _probe_video)
+        self._probe_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+        # Ruta -> VideoFileClip abierto, para no relanzar el lector de
+        # moviepy en cada segmento del mismo video (se cierran con close_clips)
+        self._moviepy_clips: Dict[str, Any] = {}
+
+    def _decode_args(self) -> List[str]:
+        """Argumentos de entrada de ffmpeg (van antes de -i)"""
+        if self.hwaccel in ('cuda', 'auto'):
+            return ['-hwaccel', self.hwaccel]
+        return []
+
+    def _encode_args(self, intermediate: bool = False) -> List[str]:
+        """
+        Argumentos de codificación de video para el codificador configurado
+
+        Args:
+            intermediate: Es un paso que se recodifica después (reparto rápido)
+        """
+        args = INTERMEDIATE_ENCODER_ARGS.get(self.encoder) if intermediate else None
+        args = list(args or VIDEO_ENCODER_ARGS.get(self.encoder, ['-c:v', self.encoder]))
+        if self.ffmpeg_threads:
+            args += ['-threads', str(self.ffmpeg_threads)]
+        return args
+
     def analyze_video_intensity(self, video_path: str) -> List[VideoSegment]:
         """
         Analiza el video para encontrar los momentos más intensos/impactantes
@@ -60,120 +381,135 @@ class VideoEditor:
         - Cambios bruscos de escena
         - Movimiento
         - Cambios de audio (si hay)
-        """
-        segments = []
 
-        if not CV2_AVAILABLE:
-            logger.warning("OpenCV no disponible, usando análisis básico")
+        Con ffmpeg en el PATH, ffmpeg decodifica, muestrea y reduce los
+        frames (en C y con varios hilos); si no, se hace con OpenCV
+        """
+        samplers = []
+        if FFMPEG_AVAILABLE:
+            samplers.append(self._sample_with_ffmpeg)
+        if CV2_AVAILABLE:
+            samplers.append(self._sample_with_cv2)
+
+        if not samplers:
+            logger.warning("Ni ffmpeg ni OpenCV disponibles, usando análisis básico")
             return self._basic_segment_analysis(video_path)
 
-        try:
-            cap = cv2.VideoCapture(video_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = total_frames / fps if fps > 0 else 0
+        for sampler in samplers:
+            try:
+                sampled = sampler(video_path)
+            except Exception as e:
+                logger.error(f"Error analizando video: {e}")
+                continue
 
-            if duration == 0:
+            if sampled is None:
                 logger.error("No se pudo determinar la duración del video")
                 return []
 
-            # Analizar cada segundo del video
-            frame_scores = []
-            prev_frame = None
-            sample_rate = max(1, int(fps / 2))  # Analizar 2 frames por segundo
+            times, thumbs, duration = sampled
 
-            frame_idx = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
+            # Puntuación de cada muestra: diferencia media con la anterior
+            # (movimiento/cambio de escena), calculada para todas a la vez
+            scores = _motion_scores(thumbs) if len(thumbs) else np.empty(0)
+            segments = _segments_from_scores(times, scores, duration)
 
-                if frame_idx % sample_rate == 0:
-                    # Convertir a escala de grises para análisis
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Si no encontramos segmentos destacados, usar el inicio
+            if not segments:
+                segments = self._basic_segment_analysis(video_path)
 
-                    score = 0
+            logger.info(f"Encontrados {len(segments)} segmentos impactantes")
+            return segments
 
-                    if prev_frame is not None:
-                        # Detectar cambios entre frames (movimiento/cambio de escena)
-                        diff = cv2.absdiff(prev_frame, gray)
-                        score = np.mean(diff)
+        return self._basic_segment_analysis(video_path)
 
-                        # Bonus por cambios muy bruscos (posible cambio de escena)
-                        if score > 30:
-                            score *= 1.5
+    def _sample_with_ffmpeg(self, video_path: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """
+        Muestrea 2 frames por segundo en gris y a ANALYSIS_WIDTH con ffmpeg,
+        leídos como vídeo raw por la tubería
 
-                    frame_scores.append({
-                        'frame': frame_idx,
-                        'time': frame_idx / fps,
-                        'score': score
-                    })
+        Returns:
+            (tiempos, frames (N, H, W) uint8, duración) o None si no hay duración
+        """
+        probe = self._probe_video(video_path)
+        if not probe.get('width'):
+            raise RuntimeError("ffprobe no devolvió el stream de video")
 
-                    prev_frame = gray
+        fps = probe['fps']
+        duration = probe['duration'] or 0
+        if fps <= 0 or duration <= 0:
+            return None
 
-                frame_idx += 1
+        sample_rate = max(1, int(fps / 2))  # Analizar 2 frames por segundo
+        width, height = _analysis_size(probe['width'], probe['height'])
 
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error'] + self._decode_args() + [
+                '-i', video_path,
+                '-an',
+                '-vf', f"fps={fps / sample_rate:.6f},scale={width}:{height}:flags=area,format=gray",
+                '-f', 'rawvideo',
+                'pipe:1'
+            ],
+            capture_output=True,
+            timeout=300
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors='replace').strip())
+
+        frame_bytes = width * height
+        count = len(result.stdout) // frame_bytes
+        thumbs = np.frombuffer(result.stdout, dtype=np.uint8, count=count * frame_bytes)
+        thumbs = thumbs.reshape(count, height, width)
+        times = np.arange(count) * sample_rate / fps
+        return times, thumbs, duration
+
+    def _sample_with_cv2(self, video_path: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """Igual que _sample_with_ffmpeg pero decodificando con OpenCV"""
+        cap = _open_capture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / fps if fps > 0 else 0
+
+        if duration == 0:
             cap.release()
+            return None
 
-            # Encontrar los picos de intensidad
-            if frame_scores:
-                scores = [f['score'] for f in frame_scores]
-                avg_score = np.mean(scores)
-                std_score = np.std(scores)
-
-                # Segmentos con puntuación por encima de la media + 0.5 std
-                threshold = avg_score + 0.5 * std_score
-
-                # Agrupar frames consecutivos con alta puntuación
-                current_segment_start = None
-                current_segment_scores = []
-
-                for fs in frame_scores:
-                    if fs['score'] > threshold:
-                        if current_segment_start is None:
-                            current_segment_start = fs['time']
-                        current_segment_scores.append(fs['score'])
-                    else:
-                        if current_segment_start is not None:
-                            segment_end = fs['time']
-                            if segment_end - current_segment_start >= 2:  # Mínimo 2 segundos
-                                segments.append(VideoSegment(
-                                    start=max(0, current_segment_start - 1),
-                                    end=min(duration, segment_end + 1),
-                                    score=np.mean(current_segment_scores),
-                                    reason="high_motion"
-                                ))
-                        current_segment_start = None
-                        current_segment_scores = []
+        thumbs = []
+        sample_frames = []
+        sample_rate = max(1, int(fps / 2))  # Analizar 2 frames por segundo
 
-            # Si no encontramos segmentos destacados, usar el inicio
-            if not segments:
-                segments = self._basic_segment_analysis(video_path)
+        frame_idx = 0
+        analysis_size = None
+        while True:
+            # grab() solo avanza el decodificador: los frames que no se
+            # muestrean no se convierten a BGR ni se copian
+            if not cap.grab():
+                break
 
-            logger.info(f"Encontrados {len(segments)} segmentos impactantes")
-            return segments
+            if frame_idx % sample_rate == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
 
-        except Exception as e:
-            logger.error(f"Error analizando video: {e}")
-            return self._basic_segment_analysis(video_path)
+                # Reducir a ANALYSIS_WIDTH y pasar a escala de grises
+                if analysis_size is None:
+                    analysis_size = _analysis_size(frame.shape[1], frame.shape[0])
+                if analysis_size != (frame.shape[1], frame.shape[0]):
+                    frame = cv2.resize(frame, analysis_size, interpolation=cv2.INTER_AREA)
+                thumbs.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                sample_frames.append(frame_idx)
+
+            frame_idx += 1
+
+        cap.release()
+
+        thumbs = np.stack(thumbs) if thumbs else np.empty((0, 0, 0), dtype=np.uint8)
+        return np.asarray(sample_frames) / fps, thumbs, duration
 
     def _basic_segment_analysis(self, video_path: str) -> List[VideoSegment]:
         """Análisis básico cuando no hay OpenCV disponible"""
         try:
-            # Obtener duración con ffprobe
-            result = subprocess.run(
-                [
-                    'ffprobe', '-v', 'error',
-                    '-show_entries', 'format=duration',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
-                    video_path
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            duration = float(result.stdout.strip()) if result.returncode == 0 else 60
+            duration = self._probe_video(video_path).get('duration') or 60
 
             # Estrategia básica: usar el inicio del video
             # (los videos de emergencias suelen tener lo importante al principio)
@@ -213,8 +549,8 @@ class VideoEditor:
             )
 
         # Elegir aleatoriamente entre los mejores segmentos (no siempre el #1)
-        sorted_segments = sorted(segments, key=lambda x: x.score, reverse=True)
-        top_segments = sorted_segments[:min(3, len(sorted_segments))]
+        # nlargest hace una sola pasada sin ordenar la lista entera
+        top_segments = heapq.nlargest(3, segments, key=attrgetter('score'))
         best = random.choice(top_segments)
 
         # Aplicar offset aleatorio al inicio
@@ -249,7 +585,9 @@ class VideoEditor:
         video_path: str,
         segment: VideoSegment,
         output_name: Optional[str] = None,
-        add_watermark: bool = False
+        add_watermark: bool = False,
+        stream_copy: bool = False,
+        intermediate: bool = False
     ) -> Optional[str]:
         """
         Extrae un clip del video
@@ -259,6 +597,10 @@ class VideoEditor:
             segment: Segmento a extraer
             output_name: Nombre del archivo de salida
             add_watermark: Si añadir marca de agua "SUCESOS HOY"
+            stream_copy: Copiar los streams sin recodificar; el inicio se
+                         adelanta al keyframe anterior (y segment.start con
+                         él, para que el segmento sea el del clip)
+            intermediate: El clip se va a recodificar después
         """
         if not output_name:
             output_name = f"clip_{Path(video_path).stem}"
@@ -269,7 +611,10 @@ class VideoEditor:
             if MOVIEPY_AVAILABLE and add_watermark:
                 return self._extract_with_moviepy(video_path, segment, str(output_path))
             else:
-                return self._extract_with_ffmpeg(video_path, segment, str(output_path))
+                return self._extract_with_ffmpeg(
+                    video_path, segment, str(output_path),
+                    stream_copy=stream_copy, intermediate=intermediate
+                )
 
         except Exception as e:
             logger.error(f"Error extrayendo clip: {e}")
@@ -279,22 +624,39 @@ class VideoEditor:
         self,
         video_path: str,
         segment: VideoSegment,
-        output_path: str
+        output_path: str,
+        stream_copy: bool = False,
+        intermediate: bool = False
     ) -> Optional[str]:
         """Extrae clip usando ffmpeg (más rápido)"""
 
+        if stream_copy:
+            keyframe = self._keyframe_before(video_path, segment.start)
+            # Desde el keyframe el clip no puede pasar de max_duration; si
+            # pasaría, se recodifica con el inicio exacto
+            if keyframe is not None and segment.end - keyframe > self.max_duration:
+                logger.debug(f"Keyframe en {keyframe:.1f}s: el clip superaría {self.max_duration}s")
+                keyframe = None
+            if keyframe is not None:
+                copied = self._copy_with_ffmpeg(video_path, keyframe, segment.end, output_path)
+                if copied:
+                    if keyframe < segment.start:
+                        logger.info(f"Inicio adelantado al keyframe: {segment.start:.1f}s -> {keyframe:.1f}s")
+                        segment.start = keyframe
+                    return copied
+            logger.debug("Sin corte por keyframe, se recodifica el clip")
+
         duration = segment.end - segment.start
 
         try:
             # Comando ffmpeg para extraer y recodificar
             cmd = [
                 'ffmpeg', '-y',
+                *self._decode_args(),
                 '-ss', str(segment.start),
                 '-i', video_path,
                 '-t', str(duration),
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
+                *self._encode_args(intermediate),
                 '-c:a', 'aac',
                 '-b:a', '128k',
                 '-movflags', '+faststart',
@@ -319,6 +681,72 @@ class VideoEditor:
             logger.error(f"Error con ffmpeg: {e}")
             return None
 
+    def _keyframe_before(self, video_path: str, start: float) -> Optional[float]:
+        """Instante del último keyframe de vídeo en o antes de start"""
+        # Solo se leen los paquetes de los 10s anteriores al corte
+        window_start = max(0.0, start - 10)
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-read_intervals', f"{window_start:.3f}%{start + 0.05:.3f}",
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        except Exception as e:
+            logger.debug(f"ffprobe falló buscando keyframes: {e}")
+            return None
+
+        keyframe = None
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' not in flags:
+                continue
+            try:
+                pts = float(pts_time)
+            except ValueError:
+                continue
+            if pts <= start + 1e-3 and (keyframe is None or pts > keyframe):
+                keyframe = pts
+
+        return keyframe
+
+    def _copy_with_ffmpeg(
+        self,
+        video_path: str,
+        start: float,
+        end: float,
+        output_path: str
+    ) -> Optional[str]:
+        """Corta copiando los streams tal cual (sin decodificar ni codificar)"""
+        cmd = [
+            'ffmpeg', '-y',
+            '-ss', str(start),
+            '-i', video_path,
+            '-t', str(end - start),
+            '-map', '0:v:0', '-map', '0:a?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            output_path
+        ]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        except Exception as e:
+            logger.debug(f"Error copiando streams: {e}")
+            return None
+
+        if result.returncode == 0 and Path(output_path).exists():
+            logger.success(f"Clip extraído sin recodificar: {output_path}")
+            return output_path
+
+        logger.debug(f"Error ffmpeg copiando streams: {result.stderr[-400:]}")
+        return None
+
     def _extract_with_moviepy(
         self,
         video_path: str,
@@ -328,7 +756,9 @@ class VideoEditor:
         """Extrae clip usando moviepy (permite efectos)"""
 
         try:
-            clip = VideoFileClip(video_path)
+            clip = self._moviepy_clips.get(video_path)
+            if clip is None:
+                clip = self._moviepy_clips[video_path] = VideoFileClip(video_path)
             subclip = clip.subclip(segment.start, segment.end)
 
             # Escribir el video
@@ -341,8 +771,7 @@ class VideoEditor:
                 logger=None  # Silenciar logs
             )
 
-            clip.close()
-            subclip.close()
+            # El subclip comparte el lector con el clip cacheado: no se cierra aquí
 
             if Path(output_path).exists():
                 logger.success(f"Clip extraído con moviepy: {output_path}")
@@ -353,14 +782,27 @@ class VideoEditor:
 
         return None
 
+    def close_clips(self):
+        """Cierra los VideoFileClip que _extract_with_moviepy mantiene abiertos"""
+        for clip in self._moviepy_clips.values():
+            try:
+                clip.close()
+            except Exception as e:
+                logger.debug(f"Error cerrando clip de moviepy: {e}")
+        self._moviepy_clips.clear()
+
     def convert_to_vertical(
         self,
         video_path: str,
-        output_name: Optional[str] = None
+        output_name: Optional[str] = None,
+        intermediate: bool = False
     ) -> Optional[str]:
         """
         Convierte video a formato vertical (9:16) para TikTok
         Hace CROP (recorta) para llenar toda la pantalla SIN barras negras
+
+        Args:
+            intermediate: El video se va a recodificar después (texto)
         """
         if not output_name:
             output_name = f"vertical_{Path(video_path).stem}"
@@ -368,45 +810,12 @@ class VideoEditor:
         output_path = self.output_dir / f"{output_name}.mp4"
 
         try:
-            # Detectar dimensiones actuales
-            probe_cmd = [
-                'ffprobe', '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height',
-                '-of', 'csv=p=0',
-                video_path
-            ]
-
-            result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=30)
-            width, height = map(int, result.stdout.strip().split(','))
-
-            # Dimensiones objetivo 9:16
-            target_width = 1080
-            target_height = 1920
-            target_ratio = target_width / target_height  # 0.5625
-
-            current_ratio = width / height
-
-            # Estrategia: escalar para llenar y luego recortar el exceso
-            # Esto elimina las barras negras y hace zoom al contenido
-            if current_ratio > target_ratio:
-                # Video mas ancho que 9:16 -> escalar por altura y recortar lados
-                scale_filter = f"scale=-1:{target_height}"
-                crop_filter = f"crop={target_width}:{target_height}"
-            else:
-                # Video mas alto que 9:16 -> escalar por ancho y recortar arriba/abajo
-                scale_filter = f"scale={target_width}:-1"
-                crop_filter = f"crop={target_width}:{target_height}"
-
-            filter_complex = f"{scale_filter},{crop_filter}"
-
             cmd = [
                 'ffmpeg', '-y',
+                *self._decode_args(),
                 '-i', video_path,
-                '-vf', filter_complex,
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
+                '-vf', VERTICAL_FILTER,
+                *self._encode_args(intermediate),
                 '-c:a', 'aac',
                 '-b:a', '128k',
                 str(output_path)
@@ -442,81 +851,21 @@ class VideoEditor:
 
         output_path = self.output_dir / f"{output_name}.mp4"
 
-        import re
-        # Limpiar texto - quitar URLs y caracteres problematicos para ffmpeg
-        # NOTA: NO quitar @ ni # aqui porque ya vienen procesados del text_rewriter
-        # @BomberosMad ya es "Bomberos de Madrid", #Carabanchel ya es "Carabanchel"
-        clean_text = text
-        clean_text = re.sub(r'https?://\S+', '', clean_text)
-        # Solo quitar caracteres que rompen ffmpeg
-        clean_text = re.sub(r"['\";:\\]", '', clean_text)
-        clean_text = re.sub(r'\s+', ' ', clean_text).strip()
-
-        # Dividir en lineas CORTAS (max 18 chars) para video vertical 9:16
-        words = clean_text.split()
-        lines = []
-        current_line = ""
-
-        for word in words:
-            # Si palabra muy larga, cortarla
-            if len(word) > 16:
-                word = word[:16]
-
-            if len(current_line + " " + word) <= 18:
-                current_line = (current_line + " " + word).strip()
-            else:
-                if current_line:
-                    lines.append(current_line.upper())  # MAYUSCULAS para impacto
-                current_line = word
-
-        if current_line:
-            lines.append(current_line.upper())
-
-        # Max 7 lineas
-        lines = lines[:7]
-
+        lines = _overlay_lines(text)
         if not lines:
             logger.warning("No hay texto para superponer")
             return video_path
 
-        logger.info(f"Texto en {len(lines)} lineas:")
-        for line in lines:
-            logger.info(f"  -> {line}")
-
+        textfile = output_path.with_suffix('.txt')
         try:
-            # Crear un filtro por cada linea de texto
-            filter_parts = []
-
-            # Centro vertical: 1920/2 = 960
-            # Cada linea tiene ~55px de alto
-            total_text_height = len(lines) * 55
-            y_start = (1920 - total_text_height) // 2
-
-            for i, line in enumerate(lines):
-                y_pos = y_start + (i * 55)
-                safe_line = line.replace("'", "").replace('"', '')
-
-                # drawtext con texto centrado
-                text_filter = (
-                    f"drawtext=text='{safe_line}':"
-                    f"fontsize=46:"
-                    f"fontcolor=white:"
-                    f"borderw=5:"
-                    f"bordercolor=black:"
-                    f"x=(w-text_w)/2:"
-                    f"y={y_pos}"
-                )
-                filter_parts.append(text_filter)
-
-            full_filter = ','.join(filter_parts)
+            full_filter = ','.join(_text_filters(lines, textfile))
 
             cmd = [
                 'ffmpeg', '-y',
+                *self._decode_args(),
                 '-i', video_path,
                 '-vf', full_filter,
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
+                *self._encode_args(),
                 '-c:a', 'copy',
                 str(output_path)
             ]
@@ -535,6 +884,9 @@ class VideoEditor:
             logger.error(f"Error añadiendo texto: {e}")
             return video_path
 
+        finally:
+            textfile.unlink(missing_ok=True)
+
     def add_audio_overlay(
         self,
         video_path: str,
@@ -607,56 +959,159 @@ class VideoEditor:
             logger.error(f"Error añadiendo audio: {e}")
             return video_path
 
-    def process_video(
-        self,
-        video_path: str,
-        output_name: Optional[str] = None,
-        force_vertical: bool = True,
-        overlay_text: Optional[str] = None,
-        tts_audio_path: Optional[str] = None
-    ) -> Optional[Dict[str, Any]]:
+    def _probe_video(self, video_path: str) -> Dict[str, Any]:
         """
-        Proceso completo: analiza, extrae el mejor fragmento, convierte,
-        añade texto y voz
-
-        Args:
-            video_path: Ruta al video original
-            output_name: Nombre base para los archivos de salida
-            force_vertical: Si convertir a formato vertical
-            overlay_text: Texto a superponer en el video
-            tts_audio_path: Ruta al audio TTS para añadir
-
-        Returns:
-            Dict con información del video procesado
+        Duración, ancho, alto, fps y si hay pista de audio (vacío si ffprobe
+        falla). Se cachea por ruta mientras el fichero no cambie: el análisis,
+        el recorte y el render comparten una sola llamada a ffprobe
         """
-        logger.info(f"Procesando video: {video_path}")
+        try:
+            st = os.stat(video_path)
+            key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return {}
+
+        cached = self._probe_cache.get(video_path)
+        if cached and cached[0] == key:
+            return cached[1]
 
-        # Obtener duración
         try:
             result = subprocess.run(
                 [
                     'ffprobe', '-v', 'error',
-                    '-show_entries', 'format=duration',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
+                    '-show_entries', 'format=duration:stream=codec_type,width,height,avg_frame_rate',
+                    '-of', 'json',
                     video_path
                 ],
                 capture_output=True,
-                text=True,
                 timeout=30
             )
-            video_duration = float(result.stdout.strip())
-        except:
-            video_duration = 60
+            info = json.loads(result.stdout)
+        except Exception as e:
+            logger.debug(f"ffprobe falló para {video_path}: {e}")
+            return {}
+
+        streams = info.get('streams', [])
+        video = next((st for st in streams if st.get('codec_type') == 'video'), {})
+        num, _, den = video.get('avg_frame_rate', '0/1').partition('/')
+        duration = info.get('format', {}).get('duration')
+        probe = {
+            'duration': float(duration) if duration else None,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': float(num) / float(den) if float(den or 0) else 0.0,
+            'has_audio': any(st.get('codec_type') == 'audio' for st in streams),
+        }
 
-        # Analizar video
-        segments = self.analyze_video_intensity(video_path)
+        if len(self._probe_cache) >= PROBE_CACHE_SIZE:
+            self._probe_cache.pop(next(iter(self._probe_cache)))
+        self._probe_cache[video_path] = (key, probe)
+        return probe
 
-        # Seleccionar mejor segmento
-        best_segment = self.select_best_segment(segments, video_duration)
-        logger.info(f"Mejor segmento: {best_segment.start:.1f}s - {best_segment.end:.1f}s (score: {best_segment.score:.2f})")
+    def _render_single_pass(
+        self,
+        video_path: str,
+        segment: VideoSegment,
+        output_name: Optional[str],
+        probe: Dict[str, Any],
+        force_vertical: bool,
+        overlay_text: Optional[str],
+        tts_audio_path: Optional[str]
+    ) -> Optional[str]:
+        """
+        Corta el segmento, lo pasa a vertical, mezcla la voz y superpone el
+        texto con un único filter_complex: una decodificación y una
+        codificación en vez de una por paso
+        """
+        # Solo hay que cortar: sin recodificar
+        if not (force_vertical or overlay_text or tts_audio_path):
+            return self.extract_clip(video_path, segment, output_name, stream_copy=True)
+
+        if not output_name:
+            output_name = f"clip_{Path(video_path).stem}"
+        output_path = self.output_dir / f"{output_name}.mp4"
+        textfile = output_path.with_suffix('.txt')
+
+        video_filters = []
+        if force_vertical:
+            video_filters.append(VERTICAL_FILTER)
+        if overlay_text:
+            video_filters.extend(_text_filters(_overlay_lines(overlay_text), textfile))
+
+        graph = []
+        video_map = '0:v:0'
+        if video_filters:
+            graph.append(f"[0:v:0]{','.join(video_filters)}[vout]")
+            video_map = '[vout]'
+
+        audio_args = ['-c:a', 'aac', '-b:a', '128k']
+        audio_map = ['-map', '0:a?']
+        if tts_audio_path:
+            if probe.get('has_audio'):
+                # Mezclar audio original (bajo) con TTS (alto)
+                graph.append(
+                    "[0:a]volume=0.2[a0];"
+                    "[1:a]volume=1.0[a1];"
+                    "[a0][a1]amix=inputs=2:duration=first[aout]"
+                )
+            else:
+                # Sin audio original: la voz, rellenada con silencio hasta el final
+                graph.append("[1:a]apad[aout]")
+            audio_map = ['-map', '[aout]']
+            audio_args = ['-c:a', 'aac', '-b:a', '192k', '-shortest']
+
+        cmd = [
+            'ffmpeg', '-y',
+            *self._decode_args(),
+            '-ss', str(segment.start),
+            '-t', str(segment.end - segment.start),
+            '-i', video_path,
+        ]
+        if tts_audio_path:
+            cmd += ['-i', tts_audio_path]
+        if graph:
+            cmd += ['-filter_complex', ';'.join(graph)]
+        cmd += [
+            '-map', video_map,
+            *audio_map,
+            *self._encode_args(),
+            *audio_args,
+            '-movflags', '+faststart',
+            str(output_path)
+        ]
 
-        # Extraer clip
-        clip_path = self.extract_clip(video_path, best_segment, output_name)
+        try:
+            logger.info("Renderizando video en una sola pasada...")
+            result = subprocess.run(cmd, capture_output=True, timeout=300)
+        except Exception as e:
+            logger.error(f"Error con ffmpeg: {e}")
+            return None
+        finally:
+            textfile.unlink(missing_ok=True)
+
+        if result.returncode == 0 and output_path.exists():
+            logger.success(f"Video procesado: {output_path}")
+            return str(output_path)
+
+        logger.warning(f"Error en el render de una pasada: {result.stderr[-400:].decode(errors='replace')}")
+        return None
+
+    def _render_in_steps(
+        self,
+        video_path: str,
+        segment: VideoSegment,
+        output_name: Optional[str],
+        force_vertical: bool,
+        overlay_text: Optional[str],
+        tts_audio_path: Optional[str]
+    ) -> Optional[str]:
+        """Corte, vertical, voz y texto con una llamada a ffmpeg por paso"""
+        # Extraer clip (sin recodificar si no se va a pasar a vertical; si
+        # se pasa, rápido, porque el paso vertical lo vuelve a codificar)
+        clip_path = self.extract_clip(
+            video_path, segment, output_name,
+            stream_copy=not force_vertical, intermediate=force_vertical
+        )
 
         if not clip_path:
             return None
@@ -664,7 +1119,7 @@ class VideoEditor:
         # Convertir a vertical si es necesario
         final_path = clip_path
         if force_vertical:
-            vertical_path = self.convert_to_vertical(clip_path)
+            vertical_path = self.convert_to_vertical(clip_path, intermediate=bool(overlay_text))
             if vertical_path:
                 final_path = vertical_path
 
@@ -680,6 +1135,59 @@ class VideoEditor:
             if text_path:
                 final_path = text_path
 
+        return final_path
+
+    def process_video(
+        self,
+        video_path: str,
+        output_name: Optional[str] = None,
+        force_vertical: bool = True,
+        overlay_text: Optional[str] = None,
+        tts_audio_path: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Proceso completo: analiza, extrae el mejor fragmento, convierte,
+        añade texto y voz
+
+        Args:
+            video_path: Ruta al video original
+            output_name: Nombre base para los archivos de salida
+            force_vertical: Si convertir a formato vertical
+            overlay_text: Texto a superponer en el video
+            tts_audio_path: Ruta al audio TTS para añadir
+
+        Returns:
+            Dict con información del video procesado
+        """
+        logger.info(f"Procesando video: {video_path}")
+
+        # Duración, tamaño y si trae audio, en una sola llamada a ffprobe
+        probe = self._probe_video(video_path)
+        video_duration = probe.get('duration') or 60
+
+        # Analizar video
+        segments = self.analyze_video_intensity(video_path)
+
+        # Seleccionar mejor segmento
+        best_segment = self.select_best_segment(segments, video_duration)
+        logger.info(f"Mejor segmento: {best_segment.start:.1f}s - {best_segment.end:.1f}s (score: {best_segment.score:.2f})")
+
+        # Corte, vertical, voz y texto en una sola codificación
+        final_path = self._render_single_pass(
+            video_path, best_segment, output_name, probe,
+            force_vertical, overlay_text, tts_audio_path
+        )
+
+        # Si el grafo completo falla, paso a paso como antes
+        if not final_path:
+            final_path = self._render_in_steps(
+                video_path, best_segment, output_name,
+                force_vertical, overlay_text, tts_audio_path
+            )
+
+        if not final_path:
+            return None
+
         return {
             'original_path': video_path,
             'processed_path': final_path,
@@ -693,6 +1201,72 @@ class VideoEditor:
             'original_duration': video_duration
         }
 
+    def process_videos_batch(
+        self,
+        paths: List[str],
+        workers: Optional[int] = None,
+        output_names: Optional[List[Optional[str]]] = None,
+        **kwargs
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Procesa varios videos en paralelo, cada uno en su propio proceso
+
+        Args:
+            paths: Rutas de los videos
+            workers: Procesos simultáneos (por defecto, la mitad de los núcleos)
+            output_names: Nombre de salida para cada video (opcional)
+            **kwargs: Resto de argumentos de process_video
+
+        Returns:
+            Resultado de process_video para cada ruta, en el mismo orden
+        """
+        if not paths:
+            return []
+
+        if output_names is None:
+            output_names = [None] * len(paths)
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        workers = min(workers, len(paths))
+
+        if workers == 1:
+            return [
+                self.process_video(path, output_name=name, **kwargs)
+                for path, name in zip(paths, output_names)
+            ]
+
+        # Cada proceso recibe una copia del editor con pocos hilos de ffmpeg
+        editor = copy.copy(self)
+        editor.ffmpeg_threads = self.ffmpeg_threads or BATCH_FFMPEG_THREADS
+        editor._moviepy_clips = {}
+
+        logger.info(f"Procesando {len(paths)} videos con {workers} procesos")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_process_in_worker, editor, path, name, kwargs)
+                for path, name in zip(paths, output_names)
+            ]
+
+            results = []
+            for path, future in zip(paths, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error procesando {path}: {e}")
+                    results.append(None)
+
+        return results
+
+
+def _process_in_worker(
+    editor: VideoEditor,
+    video_path: str,
+    output_name: Optional[str],
+    kwargs: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Punto de entrada de process_videos_batch en cada proceso"""
+    return editor.process_video(video_path, output_name=output_name, **kwargs)
+
 
 def check_ffmpeg_installed() -> bool:
     """Verifica si ffmpeg y ffprobe están instalados"""
@@ -713,6 +1287,55 @@ def check_ffmpeg_installed() -> bool:
     return True
 
 
+@functools.lru_cache(maxsize=None)
+def check_encoder_available(encoder: str) -> bool:
+    """Verifica si ffmpeg incluye el codificador (h264_nvenc, h264_qsv...)"""
+    return probe_cached(f"encoder:{encoder}", functools.partial(_probe_encoder, encoder), binaries=['ffmpeg'])
+
+
+def check_nvenc_available() -> bool:
+    """Verifica si ffmpeg incluye el codificador NVENC (GPUs NVIDIA)"""
+    return check_encoder_available('h264_nvenc')
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_encoders() -> str:
+    """Lista de codificadores de ffmpeg (vacía si no se puede ejecutar)"""
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        return result.stdout if result.returncode == 0 else ''
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return ''
+
+
+def _probe_encoder(encoder: str) -> bool:
+    """Busca el codificador en la lista de ffmpeg y comprueba que abre"""
+    if not re.search(rf"^\s*V\S*\s+{re.escape(encoder)}\s", _ffmpeg_encoders(), re.MULTILINE):
+        return False
+
+    # Estar compilado no basta: sin GPU/driver el codificador no inicializa
+    try:
+        result = subprocess.run(
+            [
+                'ffmpeg', '-v', 'error',
+                '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+                *VIDEO_ENCODER_ARGS.get(encoder, ['-c:v', encoder]),
+                '-frames:v', '1',
+                '-f', 'null', '-'
+            ],
+            capture_output=True,
+            timeout=30
+        )
+        return result.returncode == 0
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
+
+
 if __name__ == "__main__":
     import sys
 
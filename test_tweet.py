@@ -4,153 +4,326 @@ Script para probar con un tweet especifico
 Con texto superpuesto y voz TTS
 """
 
+import re
 import sys
+import json
+import asyncio
+import argparse
+from dataclasses import asdict
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from loguru import logger
+
+# Solo config se importa al arrancar: el resto de módulos (yt-dlp, OpenCV,
+# OpenAI, Playwright...) se cargan cuando se usan, y TikTokUploader solo
+# si se decide publicar
 from config import load_config
-from video_downloader import VideoDownloader
-from video_editor import VideoEditor
-from text_rewriter import TextRewriter
-from tiktok_uploader import TikTokUploader
+
+if TYPE_CHECKING:
+    from text_rewriter import TextRewriter
+    from tts_generator import TTSGenerator
+    from video_downloader import VideoDownloader, VideoDownloadResult
+    from video_editor import VideoEditor
 
 # Configurar logging
 logger.remove()
-logger.add(sys.stderr, level="INFO", format="<green>{time:HH:mm:ss}</green> | <level>{message}</level>")
-
-# Tweet a procesar
+# Con la salida redirigida (lotes, CI) el formato va sin marcas de color
+_COLOR = sys.stderr.isatty()
+logger.add(
+    sys.stderr,
+    level="INFO",
+    format="<green>{time:HH:mm:ss}</green> | <level>{message}</level>" if _COLOR else "{time:HH:mm:ss} | {message}",
+    colorize=_COLOR
+)
+
+# Tweet a procesar por defecto (se puede pasar otra URL como argumento)
 TWEET_URL = "https://x.com/EmergenciasMad/status/2006966926791290942"
-TWEET_ID = "2006966926791290942"
 
+_STATUS_ID_RE = re.compile(r'/status/(\d+)')
 
-def generate_tts_audio(text: str, output_dir: Path) -> str:
-    """Genera audio TTS para el texto"""
-    try:
-        from tts_generator import TTSGenerator
-        tts = TTSGenerator(voice='elena', output_dir=str(output_dir))
-        audio_path = tts.generate_audio(text, f"tts_{TWEET_ID}")
-        return audio_path
-    except ImportError:
-        logger.warning("TTS no disponible. Instalando edge-tts...")
-        import subprocess
-        subprocess.run([sys.executable, '-m', 'pip', 'install', 'edge-tts'], capture_output=True)
-
-        # Reintentar
-        from tts_generator import TTSGenerator
-        tts = TTSGenerator(voice='elena', output_dir=str(output_dir))
-        return tts.generate_audio(text, f"tts_{TWEET_ID}")
-
-
-def main():
-    config = load_config()
 
-    logger.info(f"Procesando tweet: {TWEET_URL}")
+async def generate_tts_audio(tts: Optional['TTSGenerator'], text: str, tweet_id: str) -> Optional[str]:
+    """Genera audio TTS para el texto (en el event loop de process_tweet)"""
+    if tts is None:
+        return None
+    return await tts.generate_audio_async(text, f"tts_{tweet_id}")
+
+
+def download_once(
+    downloader: 'VideoDownloader',
+    downloads_dir: Path,
+    tweet_url: str,
+    tweet_id: str
+) -> Optional['VideoDownloadResult']:
+    """
+    Descarga el video del tweet, o reutiliza el de una ejecución anterior:
+    junto al video se guarda el resultado de la descarga en test_<id>.json
+    """
+    from video_downloader import VideoDownloadResult
+
+    meta_path = downloads_dir / f"test_{tweet_id}.json"
+
+    if meta_path.exists():
+        try:
+            cached = VideoDownloadResult(**json.loads(meta_path.read_text(encoding='utf-8')))
+            video = Path(cached.file_path)
+            if video.exists() and video.stat().st_size > 0:
+                logger.info(f"Video ya descargado, se reutiliza: {video}")
+                return cached
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f"Info de descarga previa no válida: {e}")
+
+    download_result = downloader.download_twitter_video(
+        tweet_url,
+        output_name=f"test_{tweet_id}"
+    )
+
+    if download_result:
+        meta_path.write_text(json.dumps(asdict(download_result), ensure_ascii=False), encoding='utf-8')
+
+    return download_result
+
+
+async def process_tweet(
+    tweet_url: str,
+    tweet_id: str,
+    config,
+    downloader: 'VideoDownloader',
+    rewriter: 'TextRewriter',
+    editor: 'VideoEditor',
+    tts: Optional['TTSGenerator'] = None,
+    interactive: bool = True,
+    fallback_text: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Descarga, pone voz y texto y edita un tweet
+
+    Args:
+        tts: Generador de voz compartido (None si no hay edge-tts)
+        interactive: Preguntar el texto si el tweet no lo trae
+        fallback_text: Texto a usar si el tweet no lo trae (sin preguntar)
+
+    Returns:
+        (ruta del video editado, caption) o None si algo falla
+    """
+    logger.info(f"Procesando tweet: {tweet_url}")
 
     # 1. Descargar video
     logger.info("\n=== DESCARGANDO VIDEO ===")
-    downloader = VideoDownloader(download_dir=str(config.bot.downloads_dir))
-    download_result = downloader.download_twitter_video(
-        TWEET_URL,
-        output_name=f"test_{TWEET_ID}"
+    download_result = await asyncio.to_thread(
+        download_once, downloader, config.bot.downloads_dir, tweet_url, tweet_id
     )
 
     if not download_result:
         logger.error("Error descargando video")
-        return
+        return None
 
-    video_path = download_result['file_path']
-    original_text = download_result.get('description', '') or download_result.get('title', '')
+    video_path = download_result.file_path
+    original_text = download_result.description or download_result.title
 
     logger.success(f"Video descargado: {video_path}")
     logger.info(f"Texto original: {original_text[:200] if original_text else 'No disponible'}...")
 
-    # Si no hay texto, pedir al usuario
+    # Si no hay texto, pedir al usuario (en paralelo no se puede preguntar)
+    if not original_text:
+        original_text = fallback_text
     if not original_text:
+        if not interactive:
+            logger.error(f"[{tweet_id}] No se pudo extraer el texto del tweet")
+            return None
         print("\nNo se pudo extraer el texto del tweet.")
         original_text = input("Escribe el texto de la noticia: ")
 
     # Limpiar texto: @BomberosMad -> Bomberos de Madrid, #Carabanchel -> Carabanchel
-    rewriter = TextRewriter(openai_api_key=config.bot.openai_api_key)
     cleaned_text = rewriter._clean_text(original_text)
     logger.info(f"Texto limpiado: {cleaned_text[:150]}...")
 
-    # 2. Generar audio TTS
-    logger.info("\n=== GENERANDO VOZ ===")
-    audio_path = generate_tts_audio(cleaned_text, config.bot.processed_dir)
+    # La voz (edge-tts) y el caption (OpenAI) solo esperan a la red: van a
+    # la vez en este event loop, y mientras tanto se lee la info del video
+    caption_task = asyncio.create_task(rewriter.generate_caption_async(original_text, True))
+    try:
+        # 2. Generar audio TTS
+        logger.info("\n=== GENERANDO VOZ ===")
+        audio_path, _ = await asyncio.gather(
+            generate_tts_audio(tts, cleaned_text, tweet_id),
+            # ffprobe queda cacheado para process_video
+            asyncio.to_thread(editor._probe_video, video_path)
+        )
 
-    if audio_path:
-        logger.success(f"Audio generado: {audio_path}")
-    else:
-        logger.warning("No se pudo generar audio TTS")
+        if audio_path:
+            logger.success(f"Audio generado: {audio_path}")
+        else:
+            logger.warning("No se pudo generar audio TTS")
+
+        # 3. Editar video (corte aleatorio + texto + voz); el caption sigue en curso
+        logger.info("\n=== EDITANDO VIDEO ===")
+        edit_result = await asyncio.to_thread(
+            editor.process_video,
+            video_path,
+            output_name=f"final_{tweet_id}",
+            force_vertical=True,
+            overlay_text=cleaned_text,  # Texto superpuesto (ya limpiado)
+            tts_audio_path=audio_path   # Voz
+        )
 
-    # 3. Editar video (corte aleatorio + texto + voz)
-    logger.info("\n=== EDITANDO VIDEO ===")
-    editor = VideoEditor(
-        output_dir=str(config.bot.processed_dir),
-        min_duration=config.video.min_duration,
-        max_duration=config.video.max_duration
-    )
+        if not edit_result:
+            logger.error("Error editando video")
+            return None
+
+        processed_path = edit_result['processed_path']
+        logger.success(f"Video editado: {processed_path}")
+        logger.info(f"Duracion original: {edit_result['original_duration']:.1f}s")
+        logger.info(f"Segmento cortado: {edit_result['segment']['start']:.1f}s - {edit_result['segment']['end']:.1f}s")
+
+        # 4. Generar caption para TikTok (ya pedido en paralelo)
+        logger.info("\n=== GENERANDO CAPTION ===")
+        caption = await caption_task
+    finally:
+        # Si algo falla antes de usar el caption, la tarea no se deja suelta
+        if not caption_task.done():
+            caption_task.cancel()
+        elif not caption_task.cancelled():
+            caption_task.exception()
 
-    edit_result = editor.process_video(
-        video_path,
-        output_name=f"final_{TWEET_ID}",
-        force_vertical=True,
-        overlay_text=cleaned_text,  # Texto superpuesto (ya limpiado)
-        tts_audio_path=audio_path   # Voz
+    logger.success(f"Caption generado:")
+    print(f"\n{caption}\n")
+
+    # 5. Mostrar resultado (una sola escritura en la consola)
+    separator = "=" * 60
+    duration = edit_result['segment']['end'] - edit_result['segment']['start']
+    print(
+        f"\n{separator}\n"
+        f"RESULTADO:\n"
+        f"{separator}\n"
+        f"VIDEO: {processed_path}\n"
+        f"DURACION: {duration:.1f}s\n"
+        f"\nCAPTION:\n{caption}\n"
+        f"{separator}"
     )
 
-    if not edit_result:
-        logger.error("Error editando video")
-        return
+    return processed_path, caption
 
-    processed_path = edit_result['processed_path']
-    logger.success(f"Video editado: {processed_path}")
-    logger.info(f"Duracion original: {edit_result['original_duration']:.1f}s")
-    logger.info(f"Segmento cortado: {edit_result['segment']['start']:.1f}s - {edit_result['segment']['end']:.1f}s")
 
-    # 4. Generar caption para TikTok
-    logger.info("\n=== GENERANDO CAPTION ===")
-    caption = rewriter.generate_caption(original_text, include_hashtags=True)
-    logger.success(f"Caption generado:")
-    print(f"\n{caption}\n")
+def publish(results: List[Tuple[str, str]], config, answer: Optional[bool] = None):
+    """
+    Pregunta por cada video editado si publicarlo y sube los elegidos
 
-    # 5. Mostrar resultado
-    print("\n" + "="*60)
-    print("RESULTADO:")
-    print("="*60)
-    print(f"VIDEO: {processed_path}")
-    print(f"DURACION: {edit_result['segment']['end'] - edit_result['segment']['start']:.1f}s")
-    print(f"\nCAPTION:\n{caption}")
-    print("="*60)
-
-    # Abrir carpeta con el video
-    import subprocess
-    subprocess.run(['explorer', '/select,', processed_path], shell=True)
-
-    # Preguntar si publicar
-    respuesta = input("\n¿Publicar en TikTok? (s/n): ")
-
-    if respuesta.lower() == 's':
-        logger.info("\n=== PUBLICANDO EN TIKTOK ===")
-        uploader = TikTokUploader(
-            cookies_file=str(config.bot.data_dir / "tiktok_cookies.json"),
-            headless=False
-        )
+    Args:
+        answer: True/False para publicar o no todos sin preguntar
+    """
+    to_upload = []
+    for processed_path, caption in results:
+        publish_this = answer
+        if publish_this is None:
+            # Abrir carpeta con el video (Explorador de Windows, sin pasar por cmd.exe)
+            if sys.platform == 'win32':
+                import subprocess
+                subprocess.Popen(f'explorer /select,"{Path(processed_path).resolve()}"')
 
-        result = uploader.upload_video(processed_path, caption)
+            # Preguntar si publicar
+            respuesta = input(f"\n¿Publicar en TikTok {Path(processed_path).name}? (s/n): ")
+            publish_this = respuesta.lower() == 's'
 
-        if result['success']:
-            logger.success("VIDEO PUBLICADO!")
+        if publish_this:
+            to_upload.append((processed_path, caption))
         else:
-            logger.error(f"Error: {result.get('error')}")
+            logger.info("Publicacion cancelada")
+            logger.info(f"El video editado esta en: {processed_path}")
+
+    if not to_upload:
+        return
 
-        uploader.close()
+    logger.info("\n=== PUBLICANDO EN TIKTOK ===")
+    from tiktok_uploader import TikTokUploader
+    with TikTokUploader(
+        cookies_file=config.bot.data_dir / "tiktok_cookies.json",
+        headless=False
+    ) as uploader:
+        for processed_path, caption in to_upload:
+            result = uploader.upload_video(processed_path, caption)
+
+            if result['success']:
+                logger.success(f"VIDEO PUBLICADO: {processed_path}")
+            else:
+                logger.error(f"Error: {result.get('error')}")
+
+
+def main(
+    tweet_urls: Optional[List[str]] = None,
+    concurrent: int = 1,
+    publish_answer: Optional[bool] = None,
+    fallback_text: Optional[str] = None
+):
+    config = load_config()
+
+    tweets = []
+    for tweet_url in tweet_urls or [TWEET_URL]:
+        match = _STATUS_ID_RE.search(tweet_url)
+        if match:
+            tweets.append((tweet_url, match.group(1)))
+        else:
+            logger.error(f"URL de tweet no válida: {tweet_url}")
+
+    if not tweets:
+        return
+
+    # Un solo descargador, reescritor, editor y voz para todos los tweets
+    from video_downloader import VideoDownloader
+    from text_rewriter import TextRewriter
+    from video_editor import VideoEditor
+    from tts_generator import TTSGenerator, EDGE_TTS_AVAILABLE
+
+    downloader = VideoDownloader(download_dir=config.bot.downloads_dir)
+    # Misma caché de IA que el bot: repetir la prueba no vuelve a llamar a OpenAI
+    rewriter = TextRewriter(
+        openai_api_key=config.bot.openai_api_key,
+        cache_file=config.bot.data_dir / "ai_cache.jsonl"
+    )
+    editor = VideoEditor(
+        output_dir=config.bot.processed_dir,
+        min_duration=config.video.min_duration,
+        max_duration=config.video.max_duration
+    )
+    tts = None
+    if EDGE_TTS_AVAILABLE:
+        tts = TTSGenerator(voice='elena', output_dir=config.bot.processed_dir)
     else:
-        logger.info("Publicacion cancelada")
-        logger.info(f"El video editado esta en: {processed_path}")
+        logger.warning("TTS no disponible. Instalar con: pip install edge-tts")
+
+    async def run_all():
+        # Un solo event loop para todos los tweets: con --concurrent se
+        # solapan descargas, voz y caption de varios a la vez
+        semaphore = asyncio.Semaphore(max(concurrent, 1))
+
+        async def run(tweet):
+            async with semaphore:
+                return await process_tweet(
+                    *tweet, config, downloader, rewriter, editor, tts,
+                    interactive=concurrent <= 1 and publish_answer is None,
+                    fallback_text=fallback_text
+                )
+
+        return await asyncio.gather(*(run(tweet) for tweet in tweets))
+
+    results = asyncio.run(run_all())
+
+    # Fuera del event loop: la API síncrona de Playwright no funciona dentro
+    publish([result for result in results if result], config, publish_answer)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Procesa tweets concretos con texto y voz")
+    parser.add_argument('urls', nargs='*', help="URLs de los tweets (por defecto, el de ejemplo)")
+    parser.add_argument('--concurrent', type=int, default=1, metavar='N',
+                        help="Tweets procesados a la vez")
+    parser.add_argument('--text', help="Texto a usar si el tweet no trae ninguno")
+    answer = parser.add_mutually_exclusive_group()
+    answer.add_argument('--yes', dest='publish', action='store_const', const=True,
+                        help="Publicar sin preguntar")
+    answer.add_argument('--no-publish', dest='publish', action='store_const', const=False,
+                        help="No publicar ni preguntar")
+    args = parser.parse_args()
+    main(args.urls, args.concurrent, args.publish, args.text)